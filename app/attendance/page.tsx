@@ -62,6 +62,9 @@ export default function AttendancePage() {
     });
 
     socketRef.current.on("recognition_result", (data) => {
+      // Frames the server skipped to keep up leave the last result on screen
+      if (data.skipped) return;
+
       if (data.error) {
         console.error("Recognition error:", data.error);
         return;
@@ -172,7 +175,8 @@ export default function AttendancePage() {
       socketRef.current.emit("process_frame", { 
         frame: imageSrc,
         session_id: selectedSession.id,
-        department: selectedSession.department
+        department: selectedSession.department,
+        captured_at: Date.now() // lets the server count time queued before it got the frame
       });
     }
 
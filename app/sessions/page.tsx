@@ -14,6 +14,7 @@ interface Session {
   start_time: string;
   end_time: string;
   duration_minutes: number;
+  recognition_mode?: string;
 }
 
 interface Filters {
@@ -38,6 +39,7 @@ export default function SessionsPage() {
     year: "",
     start_time: "",
     end_time: "",
+    recognition_mode: "identity",
   });
 
   useEffect(() => {
@@ -132,6 +134,7 @@ export default function SessionsPage() {
         year: "",
         start_time: "",
         end_time: "",
+        recognition_mode: "identity",
       });
     } catch (error) {
       console.error("Error creating session:", error);
@@ -348,6 +351,21 @@ export default function SessionsPage() {
               />
             </div>
 
+            <div>
+              <label className="block text-sm font-medium text-gray-700 mb-2">
+                Recognition
+              </label>
+              <select
+                name="recognition_mode"
+                value={formData.recognition_mode}
+                onChange={handleInputChange}
+                className="w-full px-3 py-2 border border-gray-300 rounded-md focus:outline-none focus:ring-2 focus:ring-blue-500"
+              >
+                <option value="identity">Attendance (identify students)</option>
+                <option value="headcount">Headcount only (exams, events)</option>
+              </select>
+            </div>
+
             <div>
               <label className="block text-sm font-medium text-gray-700 mb-2">
                 Department *
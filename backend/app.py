@@ -1,24 +1,44 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-import mysql.connector
-import face_recognition
-import cv2
 import numpy as np
 import os
 import base64
 import json
 from datetime import datetime, timedelta
 from io import BytesIO
-from PIL import Image
 import threading
 import time
 import shutil
+from batch_scheduler import RECOGNITION_BATCHING, RecognitionBatcher, nearest_matches
+from cascade_matcher import CASCADE_DIMS, cascade_matcher
+from encoding_cache import EncodingCache
+from gallery_snapshot import (GALLERY_SNAPSHOT_DIR, ENCODING_DIM, current_generation, load_current_gallery,
+                              save_gallery_snapshot)
+from hot_set import HOT_SET_SIZE, HotSetCache
+from movement_intervals import (ARCHIVE_TABLE_SQL, INTERVALS_TABLE_SQL, MOVEMENT_ARCHIVE_RAW,
+                                MOVEMENT_DEBOUNCE_SECONDS, absence_minutes)
+from occupancy import (NO_SAMPLE, OCCUPANCY_TABLE_SQL, RECOGNITION_MODES, SESSION_MODE_COLUMN_SQL, HeadcountMonitor,
+                       counts_from_bytes, counts_to_bytes, series_list, total_series)
+from presence_owner import PRESENCE_OWNER_ADDRESS, PresenceLink
+from presence_timeline import (PRESENCE_TABLE_SQL, SessionTimeline,
+                               bitmap_from_bytes, bitmap_to_bytes, popcount, slot_string, summarize)
+from quality_ladder import QualityController
+from quantized_gallery import GALLERY_PRECISION, quantized_gallery
+from roi_masks import REGIONS_TABLE_SQL, ROI_REFRESH_SECONDS, RegionMasks, parse_polygons
+from schedule_index import SESSION_TIME_FORMAT, ScheduleIndex, room_key
+from session_warmup import SessionContext, SessionWarmup
+from sharding import RECOGNITION_SHARDS, ShardCoordinator, ShardError
+from tiled_detection import TILE_LAYOUTS, TiledDetector, tile_layout
 
 app = Flask(__name__)
 CORS(app)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Spawned (and forkserver) children, like the tile workers, re-import the main script as __mp_main__.
+# When that is this file they need its functions only: no presence link, batcher thread or background services.
+WORKER_IMPORT = __name__ == '__mp_main__'
+
 # Database configuration
 db_config = {
     'host': os.environ.get('MYSQL_HOST', 'localhost'),
@@ -30,17 +50,93 @@ db_config = {
 # Face recognition settings
 TOLERANCE = 0.5  # Lower tolerance for better accuracy
 MODEL = 'hog'  # Can switch to 'cnn' for better accuracy
+EXIT_CHECK_SECONDS = 30  # How often the exit monitor runs
+EXIT_TIMEOUT_SECONDS = 60  # Unseen for this long counts as an exit
 STUDENT_IMAGES_DIR = os.environ.get('STUDENT_IMAGES_DIR', './student_images')
+ENCODING_JITTERS = 1  # Re-sampling passes per enrollment encoding
+LANDMARK_MODEL = 'large'  # 68-point landmarks; 'small' is faster but less accurate
+GALLERY_POLL_SECONDS = float(os.environ.get('GALLERY_POLL_SECONDS', 2))  # How often workers look for a newer gallery
+GALLERY_RETRY_SECONDS = float(os.environ.get('GALLERY_RETRY_SECONDS', 5))  # First retry after a failed gallery load, doubling
+GALLERY_RETRY_MAX_SECONDS = 300
+SCHEDULE_REFRESH_SECONDS = int(os.environ.get('SCHEDULE_REFRESH_SECONDS', 60))  # Picks up sessions created by other workers
+ROSTER_MARGIN = float(os.environ.get('ROSTER_MARGIN', 0.1))  # Roster matches this far under TOLERANCE skip the full gallery
+
+# Enrollment encodings keyed by image content + encoder settings
+encoding_cache = EncodingCache()
+
+# Heavy modules, imported in the background by load_recognition_stack()
+mysql = None
+face_recognition = None
+cv2 = None
+Image = None
+
+# Startup phases reported by /api/ready
+STARTUP_PHASES = ('recognition', 'gallery', 'exit_monitor', 'session_warmup')
+readiness = {phase: {'state': 'pending', 'seconds': None, 'error': None} for phase in STARTUP_PHASES}
+process_started_at = time.time()
 
 # Global variables for face recognition
 known_face_encodings = []
 known_face_names = []
 known_face_ids = []
-current_session_id = None
-session_tracking = {}
+gallery_generation = None  # Snapshot generation the arrays above are mapped from
+gallery_checked_at = 0
+
+# Per-camera recognition quality, stepped down under load and back up when it eases
+quality = QualityController()
+
+# Overlapping-tile detection in a process pool for the cameras in TILE_LAYOUTS
+tiled_detector = TiledDetector() if TILE_LAYOUTS else None
+
+# Recently recognized students per room, matched before the full gallery when HOT_SET_SIZE is set
+hot_sets = HotSetCache() if HOT_SET_SIZE else None
+
+# Scatter-gather matching over shard nodes when RECOGNITION_SHARDS is set
+shard_coordinator = ShardCoordinator(RECOGNITION_SHARDS) if RECOGNITION_SHARDS else None
+
+# Current session, exit tracking and per-minute presence bitmaps (persisted when a session stops).
+# With PRESENCE_OWNER_ADDRESS set, one worker owns this state and the others call into it.
+presence_link = PresenceLink(None if WORKER_IMPORT else PRESENCE_OWNER_ADDRESS)
+tracking = presence_link.shared('tracking')
+presence = presence_link.shared('timelines')
+tracking_tables_ready = False
+
+# Interval index over class_sessions; rebuilt on writes here and every SCHEDULE_REFRESH_SECONDS
+schedule = ScheduleIndex()
+
+# Face counts per camera and minute for headcount sessions (detection only, no identities)
+headcount = HeadcountMonitor()
+
+# Detection regions per classroom/camera; updated on writes here and reloaded every ROI_REFRESH_SECONDS
+region_masks = RegionMasks()
+
+# Camera ids each Socket.IO connection has sent frames for, so a disconnect forgets the right state
+connection_cameras = {}
+connection_cameras_lock = threading.Lock()
+
+def connection_camera(data, sid):
+    """The frame's camera id (the connection's sid when the client sends none), remembered for the connection"""
+    camera_id = data.get('camera_id') or sid
+    with connection_cameras_lock:
+        connection_cameras.setdefault(sid, set()).add(camera_id)
+    return camera_id
+
+def forget_connection(sid):
+    """A connection closed: drop the per-camera state of the cameras no other connection still sends"""
+    with connection_cameras_lock:
+        cameras = connection_cameras.pop(sid, {sid})
+        still_sent = set().union(*connection_cameras.values())
+    for camera_id in cameras - still_sent:
+        quality.forget(camera_id)
+        region_masks.forget(camera_id)
+        headcount.forget(camera_id)
 
 def get_db_connection():
     """Create database connection with error handling"""
+    global mysql
+    if mysql is None:
+        import mysql.connector
+
     try:
         connection = mysql.connector.connect(**db_config)
         return connection
@@ -48,13 +144,86 @@ def get_db_connection():
         print(f"Database connection error: {err}")
         raise
 
-def load_student_encodings():
-    """Load all student face encodings from database"""
-    global known_face_encodings, known_face_names, known_face_ids
-    
+def load_recognition_stack():
+    """Import dlib (which loads its models), OpenCV and PIL"""
+    global face_recognition, cv2, Image
+    import face_recognition
+    import cv2
+    from PIL import Image
+
+def run_startup_phase(phase, target):
+    """Run one startup phase, recording its state and duration for /api/ready"""
+    readiness[phase]['state'] = 'loading'
+    started = time.time()
+    try:
+        target()
+        readiness[phase]['state'] = 'ready'
+    except Exception as e:
+        readiness[phase]['state'] = 'error'
+        readiness[phase]['error'] = str(e)
+        print(f"Warning: startup phase '{phase}' failed: {e}")
+    finally:
+        readiness[phase]['seconds'] = round(time.time() - started, 3)
+
+def is_ready(phase):
+    """Whether a startup phase has finished successfully"""
+    return readiness[phase]['state'] == 'ready'
+
+def start_exit_monitor():
+    """Start background thread for exit detection"""
+    exit_thread = threading.Thread(target=check_exits, daemon=True)
+    exit_thread.start()
+
+def start_session_warmup():
+    """Start background thread that pre-builds contexts for upcoming sessions"""
+    warmup_thread = threading.Thread(target=session_warmup.run, daemon=True)
+    warmup_thread.start()
+
+def load_gallery_until_ready():
+    """Gallery startup phase, retried with backoff while it fails (e.g. the database isn't up yet)"""
+    delay = GALLERY_RETRY_SECONDS
+    run_startup_phase('gallery', load_student_encodings)
+    while not is_ready('gallery'):
+        time.sleep(delay)
+        delay = min(delay * 2, GALLERY_RETRY_MAX_SECONDS)
+        if not is_ready('gallery'):
+            run_startup_phase('gallery', load_student_encodings)
+
+def start_background_services():
+    """Bring up recognition, gallery, exit monitoring and session warm-up without blocking the HTTP API"""
+    run_startup_phase('exit_monitor', start_exit_monitor)
+    run_startup_phase('session_warmup', start_session_warmup)
+    threading.Thread(target=run_startup_phase, args=('recognition', load_recognition_stack), daemon=True).start()
+    threading.Thread(target=load_gallery_until_ready, daemon=True).start()
+
+def get_gallery_data_version(cursor):
+    """Cheap stamp that changes whenever enrolled encodings or student names change"""
+    cursor.execute("""
+    SELECT COUNT(*), COALESCE(MAX(si.id), 0), MAX(si.uploaded_at),
+           (SELECT COUNT(*) FROM students), (SELECT MAX(updated_at) FROM students)
+    FROM student_images si
+    WHERE si.encoding_data IS NOT NULL
+    """)
+    return '|'.join(str(value) for value in cursor.fetchone())
+
+def load_student_encodings(force_refresh=False):
+    """Load all student face encodings, from the gallery snapshot when it is up to date"""
+    global known_face_encodings, known_face_names, known_face_ids, gallery_generation
+
     conn = get_db_connection()
     cursor = conn.cursor()
-    
+
+    data_version = get_gallery_data_version(cursor)
+    snapshot = None if force_refresh else load_current_gallery(GALLERY_SNAPSHOT_DIR, data_version)
+
+    if snapshot is not None:
+        gallery_generation, (known_face_encodings, known_face_ids, known_face_names) = snapshot
+        cursor.close()
+        conn.close()
+        print(f"Loaded {len(known_face_encodings)} face encodings from snapshot")
+        gallery_loaded()
+        return
+
     query = """
     SELECT s.id, s.name, s.student_id, si.encoding_data
     FROM students s
@@ -64,27 +233,99 @@ def load_student_encodings():
     
     cursor.execute(query)
     results = cursor.fetchall()
-    
-    known_face_encodings = []
-    known_face_names = []
-    known_face_ids = []
-    
+
+    encodings = []
+    names = []
+    ids = []
+
     for student_id, name, student_code, encoding_data in results:
         if encoding_data:
             # Fix deprecated np.fromstring() - use np.frombuffer() with proper encoding
             try:
                 encoding = np.array([float(x) for x in encoding_data.split(',')])
-                known_face_encodings.append(encoding)
-                known_face_names.append(f"{name} ({student_code})")
-                known_face_ids.append(student_id)
+                encodings.append(encoding)
+                names.append(f"{name} ({student_code})")
+                ids.append(student_id)
             except (ValueError, AttributeError) as e:
                 print(f"Error loading encoding for student {name}: {e}")
                 continue
-    
+
     cursor.close()
     conn.close()
-    
+
+    # Publish a fresh generation and map it; other workers adopt it in sync_gallery_generation()
+    try:
+        save_gallery_snapshot(GALLERY_SNAPSHOT_DIR, encodings, ids, names, data_version)
+        snapshot = load_current_gallery(GALLERY_SNAPSHOT_DIR, data_version)
+    except OSError as e:
+        print(f"Could not write gallery snapshot: {e}")
+
+    if snapshot is not None:
+        gallery_generation, (known_face_encodings, known_face_ids, known_face_names) = snapshot
+    else:
+        known_face_encodings = np.array(encodings).reshape(-1, ENCODING_DIM)
+        known_face_ids = np.array(ids)
+        known_face_names = np.array(names, dtype=str)
+
     print(f"Loaded {len(known_face_encodings)} face encodings")
+    gallery_loaded()
+
+def gallery_loaded():
+    """Bring the matchers up to date with a newly loaded gallery"""
+    # However it was loaded (startup, upload, rebuild, another worker), frames can now be matched
+    readiness['gallery']['state'] = 'ready'
+    readiness['gallery']['error'] = None
+    sync_shards()
+    if CASCADE_DIMS:
+        cascade_matcher(known_face_encodings)
+    elif GALLERY_PRECISION != 'float64':
+        matcher = quantized_gallery(known_face_encodings)
+        print(f"{GALLERY_PRECISION} gallery: {matcher.nbytes / (1024 * 1024):.1f} MB, "
+              f"error bound {matcher.error_bound:.4f}")
+
+def sync_shards():
+    """Repartition the gallery across the recognition shards (only changed partitions are sent)"""
+    if shard_coordinator is None:
+        return
+    try:
+        shard_coordinator.load(known_face_encodings, known_face_ids, known_face_names)
+        print(f"Gallery sharded across {len(shard_coordinator.addresses)} nodes: {shard_coordinator.counts}")
+    except ShardError as e:
+        print(f"Could not load recognition shards: {e}")
+
+def sync_gallery_generation():
+    """Map the gallery generation another worker published, at most every GALLERY_POLL_SECONDS (no DB access)"""
+    global known_face_encodings, known_face_names, known_face_ids, gallery_generation, gallery_checked_at
+
+    now = time.time()
+    if now - gallery_checked_at < GALLERY_POLL_SECONDS:
+        return
+    gallery_checked_at = now
+
+    if current_generation(GALLERY_SNAPSHOT_DIR) in (None, gallery_generation):
+        return
+    snapshot = load_current_gallery(GALLERY_SNAPSHOT_DIR)
+    if snapshot is not None:
+        gallery_generation, (known_face_encodings, known_face_ids, known_face_names) = snapshot
+        print(f"Switched to gallery generation {gallery_generation} ({len(known_face_encodings)} encodings)")
+        gallery_loaded()
+
+def encode_image_file(filepath):
+    """Compute the enrollment encoding for an image, reusing cached results for known bytes"""
+    with open(filepath, 'rb') as f:
+        image_bytes = f.read()
+
+    config = {'model': MODEL, 'num_jitters': ENCODING_JITTERS, 'landmark_model': LANDMARK_MODEL}
+
+    def compute():
+        img = face_recognition.load_image_file(filepath)
+        face_locations = face_recognition.face_locations(img, model=MODEL)
+        face_encodings = face_recognition.face_encodings(
+            img, face_locations, num_jitters=ENCODING_JITTERS, model=LANDMARK_MODEL
+        )
+        return face_encodings[0] if face_encodings else None
+
+    return encoding_cache.get_or_compute(image_bytes, config, compute)
 
 @app.route('/api/students', methods=['GET'])
 def get_students():
@@ -183,6 +424,9 @@ def create_student():
 @app.route('/api/students/<int:student_id>/upload-images', methods=['POST'])
 def upload_student_images(student_id):
     """Upload and process multiple images for a student"""
+    if not is_ready('recognition'):
+        return jsonify({'error': 'Face recognition is still loading'}), 503
+
     if 'images' not in request.files:
         return jsonify({'error': 'No images provided'}), 400
     
@@ -205,13 +449,12 @@ def upload_student_images(student_id):
         filepath = os.path.join(student_dir, filename)
         image.save(filepath)
         
-        # Process image for face encoding
-        img = face_recognition.load_image_file(filepath)
-        face_encodings = face_recognition.face_encodings(img, model=MODEL)
-        
-        if face_encodings:
+        # Process image for face encoding (cached by content hash)
+        face_encoding = encode_image_file(filepath)
+
+        if face_encoding is not None:
             # Save encoding to database
-            encoding_str = ','.join(map(str, face_encodings[0]))
+            encoding_str = ','.join(map(str, face_encoding))
             
             query = """
             INSERT INTO student_images (student_id, image_path, encoding_data)
@@ -233,6 +476,58 @@ def upload_student_images(student_id):
         'processed': processed_count
     })
 
+@app.route('/api/encodings/rebuild', methods=['POST'])
+def rebuild_encodings():
+    """Re-encode every stored student image, skipping images already in the encoding cache"""
+    if not is_ready('recognition'):
+        return jsonify({'error': 'Face recognition is still loading'}), 503
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    cursor.execute("SELECT id, image_path FROM student_images")
+    images = cursor.fetchall()
+
+    updated_count = 0
+    missing_count = 0
+
+    try:
+        for image_id, image_path in images:
+            if not os.path.exists(image_path):
+                missing_count += 1
+                continue
+
+            face_encoding = encode_image_file(image_path)
+            encoding_str = ','.join(map(str, face_encoding)) if face_encoding is not None else None
+
+            cursor.execute("""
+                UPDATE student_images SET encoding_data = %s WHERE id = %s
+            """, (encoding_str, image_id))
+            updated_count += 1
+
+        conn.commit()
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+    # Encodings changed in place, so the snapshot stamp can't detect it
+    load_student_encodings(force_refresh=True)
+
+    return jsonify({
+        'message': f'Rebuilt {updated_count} encodings',
+        'updated': updated_count,
+        'missing_files': missing_count,
+        'cache': encoding_cache.stats()
+    })
+
+@app.route('/api/encodings/cache-stats', methods=['GET'])
+def get_encoding_cache_stats():
+    """Get encoding cache hit/miss statistics"""
+    return jsonify(encoding_cache.stats())
+
 @app.route('/api/sessions', methods=['GET'])
 def get_sessions():
     """Get all class sessions"""
@@ -252,8 +547,14 @@ def create_session():
     """Create a new class session"""
     data = request.json
     
+    # 'headcount' sessions only count faces; nothing is encoded, matched or marked
+    recognition_mode = data.get('recognition_mode') or 'identity'
+    if recognition_mode not in RECOGNITION_MODES:
+        return jsonify({'error': f"recognition_mode must be one of {', '.join(RECOGNITION_MODES)}"}), 400
+    
     conn = get_db_connection()
     cursor = conn.cursor()
+    ensure_tracking_tables(cursor)
     
     # Calculate duration
     start_time = datetime.strptime(data['start_time'], '%Y-%m-%d %H:%M:%S')
@@ -261,8 +562,9 @@ def create_session():
     duration = int((end_time - start_time).total_seconds() / 60)
     
     query = """
-    INSERT INTO class_sessions (subject, instructor, classroom, start_time, end_time, duration_minutes)
-    VALUES (%s, %s, %s, %s, %s, %s)
+    INSERT INTO class_sessions (subject, instructor, classroom, start_time, end_time, duration_minutes,
+                                recognition_mode)
+    VALUES (%s, %s, %s, %s, %s, %s, %s)
     """
     
     values = (
@@ -271,7 +573,8 @@ def create_session():
         data.get('classroom'),
         start_time,
         end_time,
-        duration
+        duration,
+        recognition_mode
     )
     
     cursor.execute(query, values)
@@ -281,45 +584,277 @@ def create_session():
     cursor.close()
     conn.close()
     
+    refresh_schedule()
+    
     return jsonify({'id': session_id, 'message': 'Session created successfully'}), 201
 
-@app.route('/api/sessions/active', methods=['GET'])
-def get_active_session():
-    """Get current active session"""
+def refresh_schedule():
+    """Reload class_sessions into the schedule index"""
     conn = get_db_connection()
     cursor = conn.cursor(dictionary=True)
     
-    query = """
-    SELECT * FROM class_sessions
-    WHERE NOW() BETWEEN start_time AND end_time
-    ORDER BY start_time DESC
-    LIMIT 1
-    """
+    try:
+        cursor.execute("SELECT * FROM class_sessions")
+        schedule.rebuild(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_schedule():
+    """The schedule index, reloaded first if it is older than SCHEDULE_REFRESH_SECONDS"""
+    if schedule.built_at is None or time.time() - schedule.built_at > SCHEDULE_REFRESH_SECONDS:
+        refresh_schedule()
+    return schedule
+
+def session_classroom(session_id):
+    """Classroom of a scheduled session, or None"""
+    session = get_schedule().get(session_id)
+    return session.get('classroom') if session else None
+
+def refresh_regions():
+    """Reload camera_regions into the region masks"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
-    cursor.execute(query)
-    session = cursor.fetchone()
+    try:
+        ensure_tracking_tables(cursor)
+        cursor.execute("SELECT classroom, camera_id, polygons FROM camera_regions")
+        region_masks.rebuild(cursor.fetchall())
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_region_masks():
+    """The region masks, reloaded first if they are older than ROI_REFRESH_SECONDS"""
+    if region_masks.loaded_at is None or time.time() - region_masks.loaded_at > ROI_REFRESH_SECONDS:
+        try:
+            refresh_regions()
+        except mysql.connector.Error as err:
+            # Keep the regions we have and retry after another ROI_REFRESH_SECONDS
+            region_masks.loaded_at = time.time()
+            print(f"Error loading camera regions: {err}")
+    return region_masks
+
+def session_roster(cursor, session):
+    """Students present at any session of this subject so far: whom its faces are matched against first"""
+    cursor.execute("""
+        SELECT DISTINCT ar.student_id FROM attendance_records ar
+        JOIN class_sessions cs ON cs.id = ar.session_id
+        WHERE cs.subject = %s AND ar.status = 'present'
+    """, (session.get('subject'),))
+    return [row[0] for row in cursor.fetchall()]
+
+def build_session_context(session):
+    """Recognition context for a session: its roster's gallery rows and id/name lists, marked students, presence timeline"""
+    gallery, gallery_ids, gallery_names = known_face_encodings, known_face_ids, known_face_names
     
-    cursor.close()
-    conn.close()
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("SELECT student_id FROM attendance_records WHERE session_id = %s", (session['id'],))
+        marked = {row[0] for row in cursor.fetchall()}
+        roster = session_roster(cursor, session)
+        timeline = build_presence_timeline(cursor, session['id'], session['start_time'],
+                                           session['end_time'], session.get('duration_minutes'))
+    finally:
+        cursor.close()
+        conn.close()
     
-    if session:
-        global current_session_id
-        current_session_id = session['id']
-        return jsonify(session)
+    rows = np.flatnonzero(np.isin(np.asarray(gallery_ids), roster)) if roster and len(gallery) else []
+    if len(rows):
+        return SessionContext(session, gallery, gallery[rows],
+                              [int(student_id) for student_id in gallery_ids[rows]],
+                              [str(name) for name in gallery_names[rows]],
+                              marked, timeline)
+    # No roster yet (the subject's first session): the whole gallery, shared rather than copied
+    return SessionContext(session, gallery, gallery, gallery_ids, gallery_names, marked, timeline)
+
+# Contexts for sessions starting within WARMUP_LOOKAHEAD_SECONDS, swapped in when they start
+session_warmup = SessionWarmup(
+    build=build_session_context,
+    upcoming=lambda after, before: get_schedule().starting(after, before),
+    gallery=lambda: known_face_encodings
+)
+
+def activate_session(session_id):
+    """Swap in the session's pre-built context (building it now if the warm-up missed it)"""
+    session = get_schedule().get(session_id)
+    if session is None:
+        refresh_schedule()
+        session = schedule.get(session_id)
+    if session is None:
+        return None
+    
+    context = session_warmup.activate(session)
+    presence.add(context.timeline)
+    return context
+
+@app.route('/api/sessions/warmup', methods=['GET'])
+def get_session_warmup():
+    """Pre-built and live session contexts, with warm/cold activation counts"""
+    return jsonify(session_warmup.summary())
+
+@app.route('/api/recognition/shards', methods=['GET'])
+def get_recognition_shards():
+    """Shard nodes and how many gallery entries each holds"""
+    if shard_coordinator is None:
+        return jsonify({'enabled': False, 'shards': []})
+    return jsonify({'enabled': True, 'top_k': shard_coordinator.top_k, 'shards': shard_coordinator.summary()})
+
+@app.route('/api/recognition/batching', methods=['GET'])
+def get_recognition_batching():
+    """Micro-batch sizes and queueing delay of the shared encoder"""
+    if recognition_batcher is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **recognition_batcher.summary()})
+
+@app.route('/api/recognition/quality', methods=['GET'])
+def get_recognition_quality():
+    """Quality ladder and each camera's current level, latency and skipped frames"""
+    return jsonify(quality.summary())
+
+@app.route('/api/recognition/tiles', methods=['GET'])
+def get_recognition_tiles():
+    """Tile layouts per camera and the tiled detector's tiles, merged duplicates and latency per frame"""
+    if tiled_detector is None:
+        return jsonify({'enabled': False, 'layouts': {}})
+    return jsonify({'enabled': True, 'layouts': TILE_LAYOUTS, **tiled_detector.summary()})
+
+@app.route('/api/recognition/hot-sets', methods=['GET'])
+def get_recognition_hot_sets():
+    """Per-room hot set sizes, hit rate and candidates scanned per face"""
+    if hot_sets is None:
+        return jsonify({'enabled': False})
+    return jsonify({'enabled': True, **hot_sets.summary()})
+
+@app.route('/api/recognition/regions', methods=['GET'])
+def get_recognition_regions():
+    """Per camera: share of each frame scanned, pixels saved, detection CPU time and faces dropped outside regions"""
+    return jsonify(region_masks.summary())
+
+@app.route('/api/regions', methods=['GET'])
+def get_regions():
+    """Detection regions by classroom and camera"""
+    try:
+        refresh_regions()
+    except mysql.connector.Error as err:
+        return jsonify({'error': f'Database error: {str(err)}'}), 500
+    return jsonify(region_masks.regions())
+
+@app.route('/api/regions', methods=['PUT'])
+def set_regions():
+    """Set the polygons (frame fractions) faces are detected in, for a classroom and optionally one camera"""
+    data = request.json or {}
+    # Stored normalised, so one room can't end up with two rows that differ only in case
+    classroom = room_key(data.get('classroom'))
+    camera_id = str(data.get('camera_id') or '')
+    if not classroom and not camera_id:
+        return jsonify({'error': 'classroom or camera_id is required'}), 400
+    try:
+        polygons = parse_polygons(data.get('polygons'))
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid polygons: {e}'}), 400
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        ensure_tracking_tables(cursor)
+        cursor.execute("""
+            INSERT INTO camera_regions (classroom, camera_id, polygons) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE polygons = VALUES(polygons)
+        """, (classroom, camera_id, json.dumps(polygons)))
+        conn.commit()
+        region_masks.set(classroom, camera_id, polygons)
+        return jsonify({'classroom': classroom, 'camera_id': camera_id, 'polygons': polygons})
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/api/regions', methods=['DELETE'])
+def delete_regions():
+    """Remove the regions of a classroom/camera (?classroom=&camera_id=), so whole frames are scanned again"""
+    classroom = room_key(request.args.get('classroom'))
+    camera_id = request.args.get('camera_id', '')
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        ensure_tracking_tables(cursor)
+        # Rows written before classrooms were normalised may still differ in case/padding
+        cursor.execute("DELETE FROM camera_regions WHERE LOWER(TRIM(classroom)) = %s AND camera_id = %s",
+                       (classroom, camera_id))
+        conn.commit()
+        region_masks.remove(classroom, camera_id)
+        if cursor.rowcount == 0:
+            return jsonify({'error': 'No regions set for this classroom/camera'}), 404
+        return jsonify({'message': 'Regions removed'})
+    except mysql.connector.Error as err:
+        conn.rollback()
+        return jsonify({'error': str(err)}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/api/sessions/active', methods=['GET'])
+def get_active_session():
+    """Get current active session (the latest started one; ?classroom= limits it to one room)"""
+    sessions = get_schedule().active(room=request.args.get('classroom'))
+    
+    if sessions:
+        current_session_id = tracking.get_current_session()
+        if current_session_id != sessions[0]['id'] or session_warmup.get(sessions[0]['id']) is None:
+            if current_session_id and current_session_id != sessions[0]['id']:
+                session_warmup.release(current_session_id)
+            try:
+                activate_session(sessions[0]['id'])
+            except Exception as e:
+                print(f"Error activating session {sessions[0]['id']}: {e}")
+        tracking.set_current_session(sessions[0]['id'])
+        return jsonify(sessions[0])
     else:
         return jsonify({'message': 'No active session'}), 404
 
+@app.route('/api/sessions/active/all', methods=['GET'])
+def get_all_active_sessions():
+    """Get every session running at ?at= (default now), optionally in one ?classroom="""
+    at = request.args.get('at')
+    if at:
+        try:
+            at = datetime.strptime(at, SESSION_TIME_FORMAT)
+        except ValueError:
+            return jsonify({'error': 'at must be formatted as YYYY-MM-DD HH:MM:SS'}), 400
+    
+    return jsonify(get_schedule().active(at, room=request.args.get('classroom')))
+
 @socketio.on('process_frame')
 def process_video_frame(data):
     """Process video frame for face recognition"""
-    global current_session_id, session_tracking
-    
+    received_at = time.time()
     try:
+        # Reject early while dlib and the gallery are still loading
+        if not (is_ready('recognition') and is_ready('gallery')):
+            emit('recognition_result', {'error': 'Recognition is still starting up', 'ready': False})
+            return
+
+        current_session_id = tracking.get_current_session()
         if not current_session_id:
             emit('recognition_result', {'error': 'No active session'})
             return
         
-        if not known_face_encodings:
+        session = get_schedule().get(current_session_id)
+        if session and session.get('recognition_mode') == 'headcount':
+            process_headcount_frame(data, session, received_at)
+            return
+        
+        gallery, gallery_ids, gallery_names = session_gallery(current_session_id)
+        
+        if len(gallery) == 0:
             emit('recognition_result', {'error': 'No student faces registered'})
             return
             
@@ -328,81 +863,316 @@ def process_video_frame(data):
             emit('recognition_result', {'error': 'No frame data provided'})
             return
         
-        # Decode base64 image
-        try:
-            image_data = base64.b64decode(data['frame'].split(',')[1])
-            image = Image.open(BytesIO(image_data))
-            frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        except Exception as e:
-            emit('recognition_result', {'error': f'Invalid image data: {str(e)}'})
+        # The camera's quality level decides the detection settings, and whether this frame is analysed at all
+        camera_id = connection_camera(data, request.sid)
+        # Latency counts from capture, so time spent queued before this handler ran moves the ladder too
+        started_at = received_at - quality.queued(camera_id, data.get('captured_at'), received_at)
+        profile = quality.admit(camera_id, received_at)
+        if profile is None:
+            emit('recognition_result', {'skipped': True})
             return
         
-        # Resize frame for faster processing
-        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        try:
+            frame = decode_frame(data['frame'])
+        except ValueError as e:
+            emit('recognition_result', {'error': str(e)})
+            return
         
-        # Find faces in frame
-        face_locations = face_recognition.face_locations(rgb_small_frame, model=MODEL)
+        regions = get_region_masks().lookup(session_classroom(current_session_id), camera_id)
+        rgb_small_frame, face_locations = locate_faces(frame, profile, camera_id, regions)
         
         if not face_locations:
             emit('recognition_result', {
                 'recognized': [],
                 'total_faces': 0,
-                'message': 'No faces detected'
+                'message': 'No faces detected',
+                'quality': profile['name']
             })
+            quality.observe(camera_id, time.time() - started_at)
             return
-            
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
         
-        recognized_students = []
+        # Encoding and matching run batched with other streams' faces when batching is on
+        # (the batched encoder only does the default landmarks and jitters)
+        matches = None
+        if recognition_batcher is not None and profile['landmarks'] == 'small' and profile['jitters'] == 1:
+            face_encodings, matches = recognition_batcher.submit(
+                rgb_small_frame, face_locations, (gallery, gallery_ids, gallery_names),
+                hot_set_room(current_session_id) if hot_sets is not None else None).result()
+        else:
+            face_encodings = encode_faces(rgb_small_frame, face_locations, profile)
         
-        for face_encoding in face_encodings:
-            # Compare with known faces
-            matches = face_recognition.compare_faces(known_face_encodings, face_encoding, tolerance=TOLERANCE)
-            face_distances = face_recognition.face_distance(known_face_encodings, face_encoding)
-            
-            if len(matches) > 0 and True in matches:
-                best_match_index = np.argmin(face_distances)
-                if matches[best_match_index]:
-                    student_id = known_face_ids[best_match_index]
-                    student_name = known_face_names[best_match_index]
-                    confidence = 1 - face_distances[best_match_index]
-                    
-                    recognized_students.append({
-                        'id': student_id,
-                        'name': student_name,
-                        'confidence': float(confidence)
-                    })
-                    
-                    # Track attendance
-                    try:
-                        track_attendance(student_id, current_session_id)
-                    except Exception as e:
-                        print(f"Error tracking attendance for student {student_id}: {e}")
+        recognized_students = recognize_faces(face_encodings, current_session_id, gallery, gallery_ids, gallery_names,
+                                              matches)
         
         emit('recognition_result', {
             'recognized': recognized_students,
-            'total_faces': len(face_locations)
+            'total_faces': len(face_locations),
+            'quality': profile['name']
         })
+        quality.observe(camera_id, time.time() - started_at)
         
     except Exception as e:
         print(f"Error in process_video_frame: {e}")
         emit('recognition_result', {'error': f'Processing error: {str(e)}'})
 
-def track_attendance(student_id, session_id):
-    """Track student attendance and movements"""
+def process_headcount_frame(data, session, received_at):
+    """Detection only: count the faces in a frame of a headcount session and update its occupancy series"""
+    if 'frame' not in data:
+        emit('recognition_result', {'error': 'No frame data provided'})
+        return
+    
+    camera_id = connection_camera(data, request.sid)
+    started_at = received_at - quality.queued(camera_id, data.get('captured_at'), received_at)
+    profile = quality.admit(camera_id, received_at)
+    if profile is None:
+        emit('recognition_result', {'skipped': True})
+        return
+    
+    try:
+        frame = decode_frame(data['frame'])
+    except ValueError as e:
+        emit('recognition_result', {'error': str(e)})
+        return
+    
+    regions = get_region_masks().lookup(session.get('classroom'), camera_id)
+    _, face_locations = locate_faces(frame, profile, camera_id, regions)
+    result, event = record_headcount(session, camera_id, face_locations, profile)
+    
+    emit('recognition_result', result)
+    socketio.emit('headcount', event)
+    quality.observe(camera_id, time.time() - started_at)
+    flush_occupancy()
+
+def record_headcount(session, camera_id, face_locations, profile):
+    """Count a headcount frame's faces into the session's occupancy; (recognition_result, headcount event)"""
+    now = datetime.now()
+    count, total = headcount.observe(session, camera_id, face_locations, now)
+    result = {
+        'recognized': [],
+        'total_faces': len(face_locations),
+        'headcount': count,
+        'quality': profile['name']
+    }
+    event = {
+        'session_id': session['id'],
+        'camera_id': str(camera_id),
+        'count': count,
+        'total': total,
+        'timestamp': now.isoformat()
+    }
+    return result, event
+
+def flush_occupancy():
+    """Write out the occupancy series not persisted for OCCUPANCY_FLUSH_SECONDS"""
+    for occupancy in headcount.due():
+        try:
+            persist_occupancy(occupancy)
+        except Exception as e:
+            print(f"Error persisting occupancy for session {occupancy.session_id}: {e}")
+
+def session_gallery(current_session_id):
+    """Gallery arrays to match a session's frames against: its pre-built context, or the global gallery"""
+    sync_gallery_generation()
+    
+    # Activated here if another worker (or the ingest service) started the session
+    context = session_warmup.get(current_session_id)
+    if context is None:
+        try:
+            context = activate_session(current_session_id)
+        except Exception as e:
+            print(f"Error activating session {current_session_id}: {e}")
+    if context is not None:
+        return context.encodings, context.ids, context.names
+    return known_face_encodings, known_face_ids, known_face_names
+
+def decode_frame(frame_data, into=None):
+    """BGR frame from a base64 data URL, written into into((height, width, 3)) if given; ValueError if it doesn't decode"""
+    try:
+        image_data = base64.b64decode(frame_data.split(',')[1])
+        image = np.array(Image.open(BytesIO(image_data)))
+        if into is None:
+            return cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
+        return cv2.cvtColor(image, cv2.COLOR_RGB2BGR, dst=into(image.shape[:2] + (3,)))
+    except Exception as e:
+        raise ValueError(f'Invalid image data: {str(e)}')
+
+def detect_faces(frame_data):
+    """Face locations and encodings in a base64 data-URL frame; ValueError if it doesn't decode"""
+    return detect_faces_in_frame(decode_frame(frame_data))
+
+def locate_faces(frame, profile=None, camera_id=None, regions=None):
+    """(downscaled RGB frame, face locations in it) for a BGR frame, at a quality profile's scale and upsampling"""
+    scale = profile['scale'] if profile else 0.25
+    upsample = profile['upsample'] if profile else 1
+    
+    # Tiled cameras are scaled by their layout instead and detected tile by tile
+    layout = tile_layout(camera_id) if tiled_detector is not None and camera_id is not None else None
+    if layout:
+        scale = layout['scale']
+    
+    # Resize frame for faster processing
+    small_frame = cv2.resize(frame, (0, 0), fx=scale, fy=scale)
+    rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+    
+    # Find faces in frame (only inside the camera's regions, when it has any)
+    if layout:
+        detect = lambda image: tiled_detector.locate(image, layout, upsample, MODEL)
+    else:
+        detect = lambda image: face_recognition.face_locations(image, number_of_times_to_upsample=upsample,
+                                                               model=MODEL)
+    if camera_id is None:
+        return rgb_small_frame, detect(rgb_small_frame)
+    return rgb_small_frame, region_masks.locate(rgb_small_frame, regions, detect, camera_id,
+                                                in_process=not layout or tiled_detector.workers <= 1)
+
+def encode_faces(rgb_frame, face_locations, profile):
+    """face_encodings() with a quality profile's landmark model and jitters"""
+    return face_recognition.face_encodings(rgb_frame, face_locations,
+                                           num_jitters=profile['jitters'], model=profile['landmarks'])
+
+def detect_faces_in_frame(frame):
+    """Face locations and encodings in a BGR frame (live or read from a recording)"""
+    rgb_small_frame, face_locations = locate_faces(frame)
+    if not face_locations:
+        return [], []
+    
+    return face_locations, face_recognition.face_encodings(rgb_small_frame, face_locations)
+
+def encode_face_batch(items):
+    """face_encodings() for several (image, locations) at once: landmarks per face, one batched encoder call"""
+    import dlib
+    from face_recognition import api
+    
+    images, detections = [], []
+    for image, locations in items:
+        shapes = dlib.full_object_detections()
+        for location in locations:
+            shapes.append(api.pose_predictor_5_point(image, api._css_to_rect(location)))
+        images.append(image)
+        detections.append(shapes)
+    
+    descriptors = api.face_encoder.compute_face_descriptor(images, detections, 1)
+    return [[np.array(descriptor) for descriptor in image_descriptors] for image_descriptors in descriptors]
+
+def match_face_batch(face_encodings, gallery, room=None):
+    """match_faces() for a batch of one room's faces: its hot set first, then the gallery for the rest"""
+    if hot_sets is not None and room is not None:
+        matches = hot_sets.match(room, face_encodings, *gallery, TOLERANCE, match_gallery_batch)
+    else:
+        matches = match_gallery_batch(face_encodings, *gallery)
+    return include_walk_ins(face_encodings, gallery[0], matches, match_gallery_batch)
+
+def include_walk_ins(face_encodings, gallery, matches, match):
+    """Re-match against the full gallery the faces a session roster missed or matched within ROSTER_MARGIN of TOLERANCE"""
+    if gallery is known_face_encodings:
+        return matches
+    recheck = [position for position, found in enumerate(matches)
+               if found is None or found[2] > TOLERANCE - ROSTER_MARGIN]
+    if recheck:
+        for position, found in zip(recheck, match([face_encodings[position] for position in recheck],
+                                                  known_face_encodings, known_face_ids, known_face_names)):
+            matches[position] = found
+    return matches
+
+def match_gallery_batch(face_encodings, gallery, gallery_ids, gallery_names):
+    """match_faces() with one matrix product over the local gallery"""
+    if shard_coordinator is not None or CASCADE_DIMS or GALLERY_PRECISION != 'float64':
+        return match_faces(face_encodings, gallery, gallery_ids, gallery_names)
+    return [None if match is None else (int(gallery_ids[match[0]]), str(gallery_names[match[0]]), match[1])
+            for match in nearest_matches(face_encodings, gallery, TOLERANCE)]
+
+# Shared encoder/matcher for all streams when RECOGNITION_BATCHING=1
+recognition_batcher = (RecognitionBatcher(encode_face_batch, match_face_batch)
+                       if RECOGNITION_BATCHING and not WORKER_IMPORT else None)
+
+def hot_set_room(session_id):
+    """Key of the hot set a session's faces are tried against first: its classroom"""
+    return session_classroom(session_id) or f"session {session_id}"
+
+def recognize_faces(face_encodings, current_session_id, gallery, gallery_ids, gallery_names, matches=None):
+    """Match encodings against the gallery (unless already matched) and track attendance for each recognized student"""
+    recognized_students = []
+    
+    if matches is None and hot_sets is not None:
+        matches = include_walk_ins(face_encodings, gallery, hot_sets.match(
+            hot_set_room(current_session_id), face_encodings, gallery, gallery_ids, gallery_names,
+            TOLERANCE, match_faces), match_faces)
+    elif matches is None:
+        matches = include_walk_ins(face_encodings, gallery, match_faces(face_encodings, gallery, gallery_ids,
+                                                                        gallery_names), match_faces)
+    
+    for match in matches:
+        if match is not None:
+            student_id, student_name, distance = match
+            
+            recognized_students.append({
+                'id': student_id,
+                'name': student_name,
+                'confidence': float(1 - distance)
+            })
+            
+            # Track attendance
+            try:
+                track_attendance(student_id, current_session_id)
+            except Exception as e:
+                print(f"Error tracking attendance for student {student_id}: {e}")
+    
+    return recognized_students
+
+def match_faces(face_encodings, gallery, gallery_ids, gallery_names):
+    """match_face() for each encoding, on the shard nodes when the gallery is sharded"""
+    # Fall back to the local mapping if a shard is down
+    if shard_coordinator is not None:
+        try:
+            return shard_coordinator.match(face_encodings, TOLERANCE)
+        except ShardError as e:
+            print(f"Sharded matching failed, matching locally: {e}")
+    if CASCADE_DIMS:
+        return match_cascade(face_encodings, gallery, gallery_ids, gallery_names)
+    if GALLERY_PRECISION != 'float64':
+        return match_quantized(face_encodings, gallery, gallery_ids, gallery_names)
+    return [match_face(face_encoding, gallery, gallery_ids, gallery_names) for face_encoding in face_encodings]
+
+def match_cascade(face_encodings, gallery, gallery_ids, gallery_names):
+    """match_faces() with PCA-reduced scoring first and exact distances for the shortlist"""
+    return [None if match is None else (int(gallery_ids[match[0]]), str(gallery_names[match[0]]), match[1])
+            for match in cascade_matcher(gallery).match(face_encodings, TOLERANCE)]
+
+def match_quantized(face_encodings, gallery, gallery_ids, gallery_names):
+    """match_faces() on the reduced-precision gallery copy, decided on exact distances"""
+    return [None if match is None else (int(gallery_ids[match[0]]), str(gallery_names[match[0]]), match[1])
+            for match in quantized_gallery(gallery).match(face_encodings, TOLERANCE)]
+
+def match_face(face_encoding, gallery, gallery_ids, gallery_names):
+    """Nearest gallery entry as (student_id, name, distance) if within TOLERANCE, else None"""
+    matches = face_recognition.compare_faces(gallery, face_encoding, tolerance=TOLERANCE)
+    face_distances = face_recognition.face_distance(gallery, face_encoding)
+    
+    if len(matches) > 0 and True in matches:
+        best_match_index = np.argmin(face_distances)
+        if matches[best_match_index]:
+            return int(gallery_ids[best_match_index]), str(gallery_names[best_match_index]), face_distances[best_match_index]
+    return None
+
+def track_attendance(student_id, session_id, current_time=None, session_tracking=None):
+    """Track student attendance and movements (at current_time and with session_tracking when replaying a recording)"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    current_time = datetime.now()
+    current_time = current_time or datetime.now()
+    session_tracking = session_tracking or tracking
+    context = session_warmup.get(session_id)
     
     # Check if student already has an attendance record for this session
-    cursor.execute("""
-        SELECT id, entry_time, exit_time FROM attendance_records
-        WHERE student_id = %s AND session_id = %s
-    """, (student_id, session_id))
-    
-    record = cursor.fetchone()
+    if context is not None and student_id in context.marked:
+        record = True
+    else:
+        cursor.execute("""
+            SELECT id, entry_time, exit_time FROM attendance_records
+            WHERE student_id = %s AND session_id = %s
+        """, (student_id, session_id))
+        
+        record = cursor.fetchone()
     
     if not record:
         # First entry - create attendance record
@@ -410,52 +1180,313 @@ def track_attendance(student_id, session_id):
             INSERT INTO attendance_records (student_id, session_id, entry_time, status)
             VALUES (%s, %s, %s, 'present')
         """, (student_id, session_id, current_time))
-        
-        # Log movement
-        cursor.execute("""
-            INSERT INTO movement_logs (student_id, session_id, movement_type, timestamp)
-            VALUES (%s, %s, 'entry', %s)
-        """, (student_id, session_id, current_time))
-    else:
-        # Update last seen time (implement exit detection logic)
-        if student_id not in session_tracking:
-            session_tracking[student_id] = {'last_seen': current_time}
-        else:
-            session_tracking[student_id]['last_seen'] = current_time
+    if context is not None:
+        context.marked.add(student_id)
+    
+    # Update last seen time; a student the exit monitor isn't tracking has just (re)entered
+    if session_tracking.seen(student_id, current_time):
+        record_entry(cursor, student_id, session_id, current_time)
+    
+    # One call to the presence owner per sighting; the timeline is only built on a session's first one
+    if not presence.mark(session_id, student_id, current_time) and ensure_presence_timeline(cursor, session_id):
+        presence.mark(session_id, student_id, current_time)
     
     conn.commit()
     cursor.close()
     conn.close()
 
-def check_exits():
-    """Background thread to check for student exits"""
-    global session_tracking, current_session_id
+def archive_movement(cursor, student_id, session_id, movement_type, timestamp):
+    """Keep the raw event in the cold archive table when MOVEMENT_ARCHIVE_RAW is set"""
+    if MOVEMENT_ARCHIVE_RAW:
+        ensure_tracking_tables(cursor)
+        cursor.execute("""
+            INSERT INTO movement_logs_archive (student_id, session_id, movement_type, timestamp)
+            VALUES (%s, %s, %s, %s)
+        """, (student_id, session_id, movement_type, timestamp))
+
+def record_entry(cursor, student_id, session_id, timestamp):
+    """Open a presence interval, or reopen the last one if the student left less than the debounce ago"""
+    ensure_tracking_tables(cursor)
+    cursor.execute("""
+        SELECT id, end_time FROM presence_intervals
+        WHERE student_id = %s AND session_id = %s
+        ORDER BY start_time DESC LIMIT 1
+    """, (student_id, session_id))
+    last_interval = cursor.fetchone()
+    
+    if last_interval and last_interval[1] is None:
+        pass  # Still inside (e.g. tracking state was lost on restart)
+    elif last_interval and timestamp < last_interval[1]:
+        return  # Older than the recorded history (a replayed recording); it doesn't reopen anything
+    elif last_interval and (timestamp - last_interval[1]).total_seconds() <= MOVEMENT_DEBOUNCE_SECONDS:
+        cursor.execute("UPDATE presence_intervals SET end_time = NULL WHERE id = %s", (last_interval[0],))
+    else:
+        cursor.execute("""
+            INSERT INTO presence_intervals (student_id, session_id, start_time)
+            VALUES (%s, %s, %s)
+        """, (student_id, session_id, timestamp))
     
+    archive_movement(cursor, student_id, session_id, 'entry', timestamp)
+
+def check_exits():
+    """Background thread to check for student exits (only the presence owner acts on them)"""
     while True:
-        time.sleep(30)  # Check every 30 seconds
+        time.sleep(EXIT_CHECK_SECONDS)
         
-        if not current_session_id:
+        try:
+            current_session_id = tracking.get_current_session()
+        except Exception as e:
+            print(f"Exit monitor could not reach presence state: {e}")
+            continue
+        if not presence_link.is_owner or not current_session_id:
             continue
         
-        current_time = datetime.now()
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        for student_id, data in list(session_tracking.items()):
-            time_diff = (current_time - data['last_seen']).total_seconds()
-            
-            if time_diff > 60:  # Not seen for 60 seconds, mark as exit
-                cursor.execute("""
-                    INSERT INTO movement_logs (student_id, session_id, movement_type, timestamp)
-                    VALUES (%s, %s, 'exit', %s)
-                """, (student_id, current_session_id, data['last_seen']))
-                
-                del session_tracking[student_id]
+        record_exits(cursor, tracking, current_session_id, datetime.now())
         
         conn.commit()
         cursor.close()
         conn.close()
 
+def record_exits(cursor, session_tracking, session_id, now):
+    """Close the intervals of students unseen for EXIT_TIMEOUT_SECONDS, ending them when last seen"""
+    for student_id, last_seen in session_tracking.expire(now, EXIT_TIMEOUT_SECONDS):
+        ensure_tracking_tables(cursor)
+        cursor.execute("""
+            UPDATE presence_intervals SET end_time = %s
+            WHERE student_id = %s AND session_id = %s AND end_time IS NULL
+        """, (last_seen, student_id, session_id))
+        archive_movement(cursor, student_id, session_id, 'exit', last_seen)
+
+def close_open_intervals(cursor, session_tracking, session_id, ended_at=None):
+    """End the intervals still open when a session stops: at ended_at, or at each student's last sighting if None"""
+    ensure_tracking_tables(cursor)
+    for student_id, last_seen in session_tracking.drain():
+        cursor.execute("""
+            UPDATE presence_intervals SET end_time = %s
+            WHERE student_id = %s AND session_id = %s AND end_time IS NULL
+        """, (ended_at or last_seen, student_id, session_id))
+        archive_movement(cursor, student_id, session_id, 'exit', ended_at or last_seen)
+    if ended_at is not None:
+        # Students whose tracking was lost (e.g. across a restart) still have an open interval
+        cursor.execute("""
+            UPDATE presence_intervals SET end_time = %s
+            WHERE session_id = %s AND end_time IS NULL
+        """, (ended_at, session_id))
+
+def ensure_tracking_tables(cursor):
+    """Create the presence, region and occupancy tables (and session mode column) on older databases"""
+    global tracking_tables_ready
+    if not tracking_tables_ready:
+        for statement in (PRESENCE_TABLE_SQL, INTERVALS_TABLE_SQL, ARCHIVE_TABLE_SQL, REGIONS_TABLE_SQL,
+                          OCCUPANCY_TABLE_SQL):
+            cursor.execute(statement)
+        cursor.execute("SHOW COLUMNS FROM class_sessions LIKE 'recognition_mode'")
+        if cursor.fetchone() is None:
+            cursor.execute(SESSION_MODE_COLUMN_SQL)
+        tracking_tables_ready = True
+
+def ensure_presence_timeline(cursor, session_id):
+    """Register the session's live timeline if it has none (resuming any persisted bitmaps); False if no such session"""
+    if presence.has(session_id):
+        return True
+    
+    cursor.execute("""
+        SELECT start_time, end_time, duration_minutes FROM class_sessions WHERE id = %s
+    """, (session_id,))
+    session = cursor.fetchone()
+    if not session:
+        return False
+    
+    # Returns False if another worker registered it meanwhile; either way the session has one now
+    presence.add(build_presence_timeline(cursor, session_id, *session))
+    return True
+
+def build_presence_timeline(cursor, session_id, start_time, end_time, duration_minutes):
+    """Unregistered timeline for a session, preloaded with any bitmaps persisted earlier"""
+    if not duration_minutes:
+        duration_minutes = (end_time - start_time).total_seconds() / 60
+    timeline = SessionTimeline(session_id, start_time, duration_minutes)
+    
+    # A session that was stopped and started again keeps its earlier sightings
+    ensure_tracking_tables(cursor)
+    cursor.execute("""
+        SELECT student_id, bitmap FROM presence_timelines
+        WHERE session_id = %s AND slot_seconds = %s AND slot_count = %s
+    """, (session_id, timeline.slot_seconds, timeline.slot_count))
+    for student_id, bitmap in cursor.fetchall():
+        timeline.bits[student_id] = bitmap_from_bytes(bitmap)
+    
+    return timeline
+
+def persist_presence_timelines(session_id):
+    """Write a finished session's bitmaps to presence_timelines"""
+    timeline = presence.finish(session_id)
+    if timeline is None or not timeline.bits:
+        return
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        ensure_tracking_tables(cursor)
+        rows = []
+        for student_id, bits in timeline.bits.items():
+            slots = slot_string(bits, timeline.slot_count)
+            rows.append((session_id, student_id, timeline.slot_seconds, timeline.slot_count,
+                         bitmap_to_bytes(bits, timeline.slot_count), popcount(bits), slots.find('1')))
+        cursor.executemany("""
+            INSERT INTO presence_timelines
+                (session_id, student_id, slot_seconds, slot_count, bitmap, slots_present, first_slot)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE slot_seconds = VALUES(slot_seconds), slot_count = VALUES(slot_count),
+                bitmap = VALUES(bitmap), slots_present = VALUES(slots_present), first_slot = VALUES(first_slot)
+        """, rows)
+        conn.commit()
+        print(f"Persisted presence timelines for {len(rows)} students in session {session_id}")
+    finally:
+        cursor.close()
+        conn.close()
+
+def persist_occupancy(occupancy):
+    """Write a headcount session's per-camera count series to session_occupancy"""
+    snapshot = headcount.snapshot(occupancy)
+    if not snapshot:
+        return
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        ensure_tracking_tables(cursor)
+        rows = []
+        for camera_id, counts in snapshot.items():
+            sampled = counts[counts != NO_SAMPLE]
+            rows.append((occupancy.session_id, str(camera_id), occupancy.slot_seconds, occupancy.slot_count,
+                         counts_to_bytes(counts), int(sampled.max()) if len(sampled) else 0))
+        cursor.executemany("""
+            INSERT INTO session_occupancy (session_id, camera_id, slot_seconds, slot_count, counts, peak)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE slot_seconds = VALUES(slot_seconds), slot_count = VALUES(slot_count),
+                counts = VALUES(counts), peak = VALUES(peak)
+        """, rows)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def load_presence_timelines(cursor, session_id):
+    """(slot_count, slot_seconds, {student_id: bits}) for a session, live or persisted; None if there are none"""
+    timeline = presence.get(session_id)
+    if timeline is not None:
+        return timeline.slot_count, timeline.slot_seconds, dict(timeline.bits)
+    
+    ensure_tracking_tables(cursor)
+    cursor.execute("""
+        SELECT student_id, slot_count, slot_seconds, bitmap FROM presence_timelines WHERE session_id = %s
+    """, (session_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    
+    _, slot_count, slot_seconds, _ = rows[0]
+    return slot_count, slot_seconds, {student_id: bitmap_from_bytes(bitmap) for student_id, _, _, bitmap in rows}
+
+@app.route('/api/attendance/session/<int:session_id>/timeline', methods=['GET'])
+def get_session_timeline(session_id):
+    """Per-student presence timeline for a session: minutes present, late arrival, gaps, 10% rule status"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        live = presence.has(session_id)
+        timelines = load_presence_timelines(cursor, session_id)
+        if timelines is None:
+            return jsonify({'error': 'No presence timeline recorded for this session'}), 404
+        slot_count, slot_seconds, bits_by_student = timelines
+        
+        student_filter = request.args.get('student_id', type=int)
+        if student_filter is not None:
+            bits_by_student = {student_filter: bits_by_student.get(student_filter, 0)}
+        
+        names = {}
+        if bits_by_student:
+            placeholders = ', '.join(['%s'] * len(bits_by_student))
+            cursor.execute(f"SELECT id, name, student_id FROM students WHERE id IN ({placeholders})",
+                           tuple(bits_by_student))
+            names = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        
+        students = []
+        for student_id, bits in bits_by_student.items():
+            name, student_code = names.get(student_id, (None, None))
+            students.append({
+                'student_id': student_id,
+                'name': name,
+                'student_code': student_code,
+                'slots': slot_string(bits, slot_count),
+                **summarize(bits, slot_count, slot_seconds)
+            })
+        
+        return jsonify({
+            'session_id': session_id,
+            'live': live,
+            'slot_seconds': slot_seconds,
+            'slot_count': slot_count,
+            'students': students
+        })
+    except mysql.connector.Error as err:
+        return jsonify({'error': f'Database error: {str(err)}'}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/api/attendance/session/<int:session_id>/occupancy', methods=['GET'])
+def get_session_occupancy(session_id):
+    """Per-minute headcount of a headcount session, per camera and in total (None for minutes without frames)"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    try:
+        ensure_tracking_tables(cursor)
+        cursor.execute("""
+            SELECT camera_id, slot_seconds, slot_count, counts FROM session_occupancy WHERE session_id = %s
+        """, (session_id,))
+        rows = cursor.fetchall()
+        slot_seconds = rows[0][1] if rows else None
+        slot_count = rows[0][2] if rows else None
+        series = {row[0]: counts_from_bytes(row[3]) for row in rows}
+        
+        # Live counts on this worker are newer than what was last flushed
+        occupancy = headcount.get(session_id)
+        if occupancy is not None:
+            slot_seconds, slot_count = occupancy.slot_seconds, occupancy.slot_count
+            series.update(headcount.snapshot(occupancy))
+        if not series:
+            return jsonify({'error': 'No headcount recorded for this session'}), 404
+        
+        total = total_series(series)
+        return jsonify({
+            'session_id': session_id,
+            'live': occupancy is not None,
+            'slot_seconds': slot_seconds,
+            'slot_count': slot_count,
+            'cameras': {camera_id: series_list(counts) for camera_id, counts in series.items()},
+            'total': total,
+            'peak': max((count for count in total if count is not None), default=0)
+        })
+    except mysql.connector.Error as err:
+        return jsonify({'error': f'Database error: {str(err)}'}), 500
+    finally:
+        cursor.close()
+        conn.close()
+
+@app.route('/api/recognition/headcount', methods=['GET'])
+def get_recognition_headcount():
+    """Headcount sessions live on this worker and each camera's latest count"""
+    return jsonify(headcount.summary())
+
 @app.route('/api/attendance/session/<int:session_id>', methods=['GET'])
 def get_session_attendance(session_id):
     """Get attendance for a specific session"""
@@ -498,42 +1529,57 @@ def calculate_attendance_percentages():
     total_duration = session[0]
     max_absence_allowed = total_duration * 0.1  # 10% rule
     
-    # Get all attendance records for this session
+    # Sessions tracked with presence timelines: popcounts instead of replaying movement_logs
+    timelines = load_presence_timelines(cursor, session_id)
+    if timelines is not None:
+        slot_count, slot_seconds, bits_by_student = timelines
+        cursor.execute("""
+            SELECT id, student_id FROM attendance_records WHERE session_id = %s
+        """, (session_id,))
+        
+        for record_id, student_id in cursor.fetchall():
+            if student_id not in bits_by_student:
+                continue
+            summary = summarize(bits_by_student[student_id], slot_count, slot_seconds)
+            cursor.execute("""
+                UPDATE attendance_records
+                SET total_time_present = %s,
+                    percentage_present = %s,
+                    status = %s
+                WHERE id = %s
+            """, (round(summary['minutes_present']), summary['percentage_present'], summary['status'], record_id))
+        
+        conn.commit()
+        cursor.close()
+        conn.close()
+        
+        return jsonify({'message': 'Attendance percentages calculated successfully'})
+    
+    # Otherwise replay the merged presence intervals: one indexed range read for the whole session
+    ensure_tracking_tables(cursor)
     cursor.execute("""
-        SELECT ar.id, ar.student_id, ar.entry_time,
-               (SELECT COUNT(*) FROM movement_logs 
-                WHERE student_id = ar.student_id 
-                AND session_id = ar.session_id 
-                AND movement_type = 'exit') as exit_count,
-               (SELECT SUM(TIMESTAMPDIFF(MINUTE, 
-                   ml1.timestamp,
-                   IFNULL((SELECT MIN(ml2.timestamp) 
-                          FROM movement_logs ml2 
-                          WHERE ml2.student_id = ml1.student_id 
-                          AND ml2.session_id = ml1.session_id 
-                          AND ml2.movement_type = 'entry' 
-                          AND ml2.timestamp > ml1.timestamp), NOW())))
-                FROM movement_logs ml1
-                WHERE ml1.student_id = ar.student_id 
-                AND ml1.session_id = ar.session_id 
-                AND ml1.movement_type = 'exit') as total_absence_minutes
-        FROM attendance_records ar
-        WHERE ar.session_id = %s
+        SELECT student_id, start_time, end_time FROM presence_intervals
+        WHERE session_id = %s
+        ORDER BY student_id, start_time
     """, (session_id,))
+    intervals_by_student = {}
+    for student_id, start_time, end_time in cursor.fetchall():
+        intervals_by_student.setdefault(student_id, []).append((start_time, end_time))
     
+    cursor.execute("""
+        SELECT id, student_id FROM attendance_records WHERE session_id = %s
+    """, (session_id,))
     records = cursor.fetchall()
+    now = datetime.now()
     
-    for record in records:
-        record_id, student_id, entry_time, exit_count, absence_minutes = record
+    for record_id, student_id in records:
+        absence = absence_minutes(intervals_by_student.get(student_id, []), now)
         
-        if absence_minutes is None:
-            absence_minutes = 0
-        
-        time_present = total_duration - absence_minutes
+        time_present = total_duration - absence
         percentage = (time_present / total_duration) * 100
         
         # Determine status based on 10% rule
-        if absence_minutes > max_absence_allowed:
+        if absence > max_absence_allowed:
             status = 'partial'
         elif percentage >= 90:
             status = 'present'
@@ -713,12 +1759,7 @@ def get_dashboard_stats():
         cursor.execute("SELECT COUNT(*) as total_sessions FROM class_sessions")
         total_sessions = cursor.fetchone()['total_sessions']
         
-        cursor.execute("""
-            SELECT COUNT(*) as active_sessions 
-            FROM class_sessions 
-            WHERE NOW() BETWEEN start_time AND end_time
-        """)
-        active_sessions = cursor.fetchone()['active_sessions']
+        active_sessions = len(get_schedule().active())
         
         # Recent activity (today's data)
         today = datetime.now().date()
@@ -769,6 +1810,10 @@ def clear_sessions():
     try:
         cursor.execute("DELETE FROM class_sessions")
         conn.commit()
+        presence.clear()
+        headcount.clear()
+        session_warmup.clear()
+        schedule.rebuild([])
         return jsonify({'message': 'Sessions cleared successfully'})
     except mysql.connector.Error as err:
         conn.rollback()
@@ -785,10 +1830,21 @@ def clear_all_session_data():
     
     try:
         # Delete in order to respect foreign key constraints
+        ensure_tracking_tables(cursor)
+        cursor.execute("DELETE FROM presence_timelines")
+        cursor.execute("DELETE FROM session_occupancy")
+        cursor.execute("DELETE FROM presence_intervals")
+        cursor.execute("DELETE FROM movement_logs_archive")
         cursor.execute("DELETE FROM movement_logs")
         cursor.execute("DELETE FROM attendance_records")
         cursor.execute("DELETE FROM class_sessions")
         conn.commit()
+        presence.clear()
+        headcount.clear()
+        session_warmup.clear()
+        if hot_sets is not None:
+            hot_sets.clear()
+        schedule.rebuild([])
         return jsonify({'message': 'All session data cleared successfully'})
     except mysql.connector.Error as err:
         conn.rollback()
@@ -804,9 +1860,17 @@ def clear_reports():
     cursor = conn.cursor()
     
     try:
+        ensure_tracking_tables(cursor)
+        cursor.execute("DELETE FROM presence_timelines")
+        cursor.execute("DELETE FROM session_occupancy")
+        cursor.execute("DELETE FROM presence_intervals")
+        cursor.execute("DELETE FROM movement_logs_archive")
         cursor.execute("DELETE FROM movement_logs")
         cursor.execute("DELETE FROM attendance_records")
         conn.commit()
+        presence.clear()
+        headcount.clear()
+        session_warmup.clear()
         return jsonify({'message': 'Reports cleared successfully'})
     except mysql.connector.Error as err:
         conn.rollback()
@@ -826,6 +1890,16 @@ def health_check():
     except Exception as e:
         return jsonify({'status': 'error', 'message': f'Database connection failed: {str(e)}'}), 500
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Report the startup state of each background subsystem"""
+    ready = all(is_ready(phase) for phase in STARTUP_PHASES)
+    return jsonify({
+        'ready': ready,
+        'uptime_seconds': round(time.time() - process_started_at, 3),
+        'subsystems': readiness
+    }), 200 if ready else 503
+
 # Socket.IO event handlers
 @socketio.on('connect')
 def handle_connect():
@@ -835,39 +1909,60 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    forget_connection(request.sid)
 
 @socketio.on('start_session')
 def handle_start_session(data):
     """Handle session start event"""
-    global current_session_id
     session_id = data.get('session_id')
     if session_id:
-        current_session_id = session_id
+        try:
+            activate_session(session_id)
+        except Exception as e:
+            print(f"Error activating session {session_id}: {e}")
+        tracking.set_current_session(session_id)
         emit('session_started', {'session_id': session_id})
         print(f"Session {session_id} started")
 
 @socketio.on('stop_session')
 def handle_stop_session():
     """Handle session stop event"""
-    global current_session_id, session_tracking
+    current_session_id = tracking.get_current_session()
     if current_session_id:
+        try:
+            persist_presence_timelines(current_session_id)
+        except Exception as e:
+            print(f"Error persisting presence timelines for session {current_session_id}: {e}")
+        occupancy = headcount.finish(current_session_id)
+        if occupancy is not None:
+            try:
+                persist_occupancy(occupancy)
+            except Exception as e:
+                print(f"Error persisting occupancy for session {current_session_id}: {e}")
+        session_warmup.release(current_session_id)
+        # No new sightings once the session is unset, so every interval can be closed at the stop time
+        tracking.set_current_session(None)
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+            try:
+                close_open_intervals(cursor, tracking, current_session_id, datetime.now())
+                conn.commit()
+            finally:
+                cursor.close()
+                conn.close()
+        except Exception as e:
+            tracking.clear()
+            print(f"Error closing presence intervals for session {current_session_id}: {e}")
         emit('session_stopped', {'session_id': current_session_id})
         print(f"Session {current_session_id} stopped")
-        current_session_id = None
-        session_tracking.clear()
 
 # Create student images directory if it doesn't exist
 os.makedirs(STUDENT_IMAGES_DIR, exist_ok=True)
 
-# Start background thread for exit detection
-exit_thread = threading.Thread(target=check_exits, daemon=True)
-exit_thread.start()
-
-# Load initial encodings (with error handling)
-try:
-    load_student_encodings()
-except Exception as e:
-    print(f"Warning: Could not load initial face encodings: {e}")
+# Recognition stack, gallery and exit detection load in the background (command-line tools load what they need)
+if os.environ.get('START_BACKGROUND_SERVICES', '1') == '1' and not WORKER_IMPORT:
+    start_background_services()
 
 if __name__ == '__main__':
     print("Starting Face Attendance System Backend...")
@@ -6,12 +6,17 @@ import cv2
 import numpy as np
 import os
 import base64
-import json
 from datetime import datetime, timedelta
 from io import BytesIO
 from PIL import Image
 import threading
 import time
+import hashlib
+from encoding_cache import EncodingCache
+from demo_store import DEMO_STORE_BACKEND, open_demo_store
+from demo_index import DemoIndex
+from gallery_snapshot import GALLERY_SNAPSHOT_DIR, ENCODING_DIM, load_gallery_snapshot, save_gallery_snapshot
+from schedule_index import SESSION_TIME_FORMAT, ScheduleIndex
 
 app = Flask(__name__)
 CORS(app)
@@ -20,30 +25,31 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 # Storage file for persistence
 DATA_FILE = 'demo_data.json'
 
-# Load or initialize demo data
-def load_demo_data():
-    try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {
-            "students": [],
-            "sessions": [],
-            "attendance_records": [],
-            "student_images": {},
-            "movement_logs": []
-        }
-
-def save_demo_data():
-    with open(DATA_FILE, 'w') as f:
-        json.dump(demo_data, f, indent=2, default=str)
-
-demo_data = load_demo_data()
+# Load or initialize demo data (snapshot + journal replay); all writes go through demo_store
+demo_store = open_demo_store(DATA_FILE, {
+    "students": [],
+    "sessions": [],
+    "attendance_records": [],
+    "student_images": {},
+    "movement_logs": []
+})
+demo_data = demo_store.data
+# Id lookups for the recognition path; every mutation below keeps it in sync
+# (the SQLite backend answers them with SQL instead of holding a copy)
+demo_index = demo_store.index if DEMO_STORE_BACKEND == 'sqlite' else DemoIndex(demo_data)
+# Session times parsed once into an interval index instead of on every poll
+schedule = ScheduleIndex()
+schedule.rebuild(demo_data["sessions"])
 
 # Face recognition settings
 TOLERANCE = 0.5  # Lower tolerance for better accuracy
 MODEL = 'hog'  # Can switch to 'cnn' for better accuracy
 STUDENT_IMAGES_DIR = 'student_images'
+ENCODING_JITTERS = 1  # Re-sampling passes per enrollment encoding
+LANDMARK_MODEL = 'large'  # 68-point landmarks; 'small' is faster but less accurate
+
+# Enrollment encodings keyed by image content + encoder settings
+encoding_cache = EncodingCache()
 
 # Global variables for face recognition
 known_face_encodings = []
@@ -55,30 +61,79 @@ session_tracking = {}
 # Ensure student_images directory exists
 os.makedirs(STUDENT_IMAGES_DIR, exist_ok=True)
 
-def load_student_encodings():
-    """Load all student face encodings from memory"""
+def get_gallery_data_version():
+    """Stamp over enrolled images and student names, without parsing any encodings"""
+    digest = hashlib.sha1()
+    for student in demo_data["students"]:
+        digest.update(f"{student['id']}:{student['name']}:{student['student_id']};".encode())
+    for student_id, images_data in demo_data["student_images"].items():
+        paths = [img_data.get("path", "") for img_data in images_data if img_data.get("encoding")]
+        digest.update(f"{student_id}:{','.join(paths)};".encode())
+    return digest.hexdigest()
+
+def load_student_encodings(force_refresh=False):
+    """Load all student face encodings, from the gallery snapshot when it is up to date"""
     global known_face_encodings, known_face_names, known_face_ids
-    
-    known_face_encodings = []
-    known_face_names = []
-    known_face_ids = []
-    
+
+    data_version = get_gallery_data_version()
+    snapshot = None if force_refresh else load_gallery_snapshot(GALLERY_SNAPSHOT_DIR, data_version)
+
+    if snapshot is not None:
+        known_face_encodings, known_face_ids, known_face_names = snapshot
+        print(f"Loaded {len(known_face_encodings)} face encodings from snapshot")
+        return
+
+    encodings = []
+    names = []
+    ids = []
+
     for student_id, images_data in demo_data["student_images"].items():
+        student = demo_index.student(student_id)
         for img_data in images_data:
             if img_data.get("encoding"):
                 encoding = np.array(img_data["encoding"])
-                student = next((s for s in demo_data["students"] if s["id"] == student_id), None)
                 if student:
-                    known_face_encodings.append(encoding)
-                    known_face_names.append(f"{student['name']} ({student['student_id']})")
-                    known_face_ids.append(student_id)
-    
+                    encodings.append(encoding)
+                    names.append(f"{student['name']} ({student['student_id']})")
+                    ids.append(student_id)
+
+    # Persist a fresh snapshot and map it, so the next start can skip this loop
+    try:
+        save_gallery_snapshot(GALLERY_SNAPSHOT_DIR, encodings, ids, names, data_version)
+        snapshot = load_gallery_snapshot(GALLERY_SNAPSHOT_DIR, data_version)
+    except OSError as e:
+        print(f"Could not write gallery snapshot: {e}")
+
+    if snapshot is not None:
+        known_face_encodings, known_face_ids, known_face_names = snapshot
+    else:
+        known_face_encodings = np.array(encodings).reshape(-1, ENCODING_DIM)
+        known_face_ids = np.array(ids)
+        known_face_names = np.array(names, dtype=str)
+
     print(f"Loaded {len(known_face_encodings)} face encodings")
 
+def encode_image_file(filepath):
+    """Compute the enrollment encoding for an image, reusing cached results for known bytes"""
+    with open(filepath, 'rb') as f:
+        image_bytes = f.read()
+
+    config = {'model': MODEL, 'num_jitters': ENCODING_JITTERS, 'landmark_model': LANDMARK_MODEL}
+
+    def compute():
+        img = face_recognition.load_image_file(filepath)
+        face_locations = face_recognition.face_locations(img, model=MODEL)
+        face_encodings = face_recognition.face_encodings(
+            img, face_locations, num_jitters=ENCODING_JITTERS, model=LANDMARK_MODEL
+        )
+        return face_encodings[0] if face_encodings else None
+
+    return encoding_cache.get_or_compute(image_bytes, config, compute)
+
 @app.route('/api/students', methods=['GET'])
 def get_students():
     """Get all students"""
-    return jsonify(demo_data["students"])
+    return jsonify(list(demo_data["students"]))
 
 @app.route('/api/students', methods=['POST'])
 def create_student():
@@ -99,9 +154,9 @@ def create_student():
         "created_at": datetime.now().isoformat()
     }
     
-    demo_data["students"].append(student)
-    demo_data["student_images"][student_id] = []
-    save_demo_data()  # Save changes
+    demo_store.append("students", student)
+    demo_index.add_student(student)
+    demo_store.set_entry("student_images", student_id, [])
     
     # Create directory for student images
     student_dir = os.path.join(STUDENT_IMAGES_DIR, str(student_id))
@@ -132,22 +187,20 @@ def upload_student_images(student_id):
         image.save(filepath)
         
         try:
-            # Process image for face encoding
-            img = face_recognition.load_image_file(filepath)
-            face_encodings = face_recognition.face_encodings(img, model=MODEL)
-            
-            if face_encodings:
+            # Process image for face encoding (cached by content hash)
+            face_encoding = encode_image_file(filepath)
+
+            if face_encoding is not None:
                 # Save encoding to memory
-                demo_data["student_images"][student_id].append({
+                demo_store.append_entry("student_images", student_id, {
                     "path": filepath,
-                    "encoding": face_encodings[0].tolist()
+                    "encoding": face_encoding.tolist()
                 })
                 processed_count += 1
         except Exception as e:
             print(f"Error processing image: {e}")
     
-    # Save changes and reload encodings
-    save_demo_data()
+    # Reload encodings
     load_student_encodings()
     
     return jsonify({
@@ -155,6 +208,44 @@ def upload_student_images(student_id):
         'processed': processed_count
     })
 
+@app.route('/api/encodings/rebuild', methods=['POST'])
+def rebuild_encodings():
+    """Re-encode every stored student image, skipping images already in the encoding cache"""
+    updated_count = 0
+    missing_count = 0
+
+    for student_id, images_data in demo_data["student_images"].items():
+        rebuilt_images = []
+        for img_data in images_data:
+            if not os.path.exists(img_data["path"]):
+                missing_count += 1
+                rebuilt_images.append(img_data)
+                continue
+
+            face_encoding = encode_image_file(img_data["path"])
+            rebuilt_images.append({
+                **img_data,
+                "encoding": face_encoding.tolist() if face_encoding is not None else None
+            })
+            updated_count += 1
+
+        demo_store.set_entry("student_images", student_id, rebuilt_images)
+
+    # Paths are unchanged, so the snapshot stamp can't see re-encoded images
+    load_student_encodings(force_refresh=True)
+
+    return jsonify({
+        'message': f'Rebuilt {updated_count} encodings',
+        'updated': updated_count,
+        'missing_files': missing_count,
+        'cache': encoding_cache.stats()
+    })
+
+@app.route('/api/encodings/cache-stats', methods=['GET'])
+def get_encoding_cache_stats():
+    """Get encoding cache hit/miss statistics"""
+    return jsonify(encoding_cache.stats())
+
 @app.route('/api/sessions', methods=['GET'])
 def get_sessions():
     """Get all class sessions with optional department and year filtering"""
@@ -199,8 +290,9 @@ def create_session():
         "created_at": datetime.now().isoformat()
     }
     
-    demo_data["sessions"].append(session)
-    save_demo_data()  # Save changes
+    demo_store.append("sessions", session)
+    demo_index.add_session(session)
+    schedule.rebuild(demo_data["sessions"])
     
     return jsonify({'id': session_id, 'message': 'Session created successfully'}), 201
 
@@ -237,7 +329,7 @@ def get_session_filters():
 @app.route('/api/sessions/student/<int:student_id>', methods=['GET'])
 def get_student_sessions(student_id):
     """Get sessions that a specific student can attend based on department and year"""
-    student = next((s for s in demo_data["students"] if s["id"] == student_id), None)
+    student = demo_index.student(student_id)
     
     if not student:
         return jsonify({'error': 'Student not found'}), 404
@@ -259,20 +351,28 @@ def get_student_sessions(student_id):
 
 @app.route('/api/sessions/active', methods=['GET'])
 def get_active_session():
-    """Get current active session"""
-    now = datetime.now()
+    """Get current active session (the latest started one; ?classroom= limits it to one room)"""
+    sessions = schedule.active(room=request.args.get('classroom'))
     
-    for session in demo_data["sessions"]:
-        start_time = datetime.strptime(session['start_time'], '%Y-%m-%d %H:%M:%S')
-        end_time = datetime.strptime(session['end_time'], '%Y-%m-%d %H:%M:%S')
-        
-        if start_time <= now <= end_time:
-            global current_session_id
-            current_session_id = session['id']
-            return jsonify(session)
+    if sessions:
+        global current_session_id
+        current_session_id = sessions[0]['id']
+        return jsonify(sessions[0])
     
     return jsonify({'message': 'No active session'}), 404
 
+@app.route('/api/sessions/active/all', methods=['GET'])
+def get_all_active_sessions():
+    """Get every session running at ?at= (default now), optionally in one ?classroom="""
+    at = request.args.get('at')
+    if at:
+        try:
+            at = datetime.strptime(at, SESSION_TIME_FORMAT)
+        except ValueError:
+            return jsonify({'error': 'at must be formatted as YYYY-MM-DD HH:MM:SS'}), 400
+    
+    return jsonify(schedule.active(at, room=request.args.get('classroom')))
+
 @socketio.on('process_frame')
 def process_video_frame(data):
     """Process video frame for face recognition"""
@@ -307,8 +407,8 @@ def process_video_frame(data):
                 if True in matches:
                     best_match_index = np.argmin(face_distances)
                     if matches[best_match_index]:
-                        student_id = known_face_ids[best_match_index]
-                        student_name = known_face_names[best_match_index]
+                        student_id = known_face_ids[best_match_index].item()
+                        student_name = str(known_face_names[best_match_index])
                         confidence = 1 - face_distances[best_match_index]
                         
                         recognized_students.append({
@@ -333,8 +433,8 @@ def track_attendance(student_id, session_id):
     current_time = datetime.now()
     
     # Get student and session details
-    student = next((s for s in demo_data["students"] if s["id"] == student_id), None)
-    session = next((s for s in demo_data["sessions"] if s["id"] == session_id), None)
+    student = demo_index.student(student_id)
+    session = demo_index.session(session_id)
     
     if not student or not session:
         print(f"Student {student_id} or session {session_id} not found")
@@ -347,28 +447,28 @@ def track_attendance(student_id, session_id):
             return
     
     # Check if student already has an attendance record for this session
-    existing = next((r for r in demo_data["attendance_records"] 
-                     if r["student_id"] == student_id and r["session_id"] == session_id), None)
+    existing = demo_index.record_for(student_id, session_id)
     
     if not existing:
         # First entry - create attendance record
-        demo_data["attendance_records"].append({
+        record = {
             "id": len(demo_data["attendance_records"]) + 1,
             "student_id": student_id,
             "session_id": session_id,
             "entry_time": current_time.isoformat(),
             "status": "present",
             "marked_at": current_time.isoformat()
-        })
+        }
+        demo_store.append("attendance_records", record)
+        demo_index.add_record(record)
         
         # Log movement
-        demo_data["movement_logs"].append({
+        demo_store.append("movement_logs", {
             "student_id": student_id,
             "session_id": session_id,
             "movement_type": "entry",
             "timestamp": current_time.isoformat()
         })
-        save_demo_data()  # Save changes
     else:
         # Update last seen time
         if student_id not in session_tracking:
@@ -383,7 +483,7 @@ def get_session_attendance(session_id):
     
     for record in demo_data["attendance_records"]:
         if record["session_id"] == session_id:
-            student = next((s for s in demo_data["students"] if s["id"] == record["student_id"]), None)
+            student = demo_index.student(record["student_id"])
             if student:
                 attendance.append({
                     **record,
@@ -400,7 +500,7 @@ def calculate_attendance_percentages():
     session_id = data['session_id']
     
     # Get session details
-    session = next((s for s in demo_data["sessions"] if s["id"] == session_id), None)
+    session = demo_index.session(session_id)
     if not session:
         return jsonify({'error': 'Session not found'}), 404
     
@@ -423,11 +523,12 @@ def get_monthly_report(student_id):
 def get_attendance_stats():
     """Get overall attendance statistics for all students"""
     students_stats = []
+    records = list(demo_data["attendance_records"])
     
     for student in demo_data["students"]:
         # Calculate attendance for this student based on conducted sessions only
         total_sessions = len(demo_data["sessions"])
-        attended_sessions = len([r for r in demo_data["attendance_records"] 
+        attended_sessions = len([r for r in records 
                                 if r["student_id"] == student["id"]])
         
         # Only calculate percentage if there are conducted sessions
@@ -457,10 +558,11 @@ def get_low_attendance_students():
     
     # Get all students with stats
     all_students = []
+    records = list(demo_data["attendance_records"])
     for student in demo_data["students"]:
         # Calculate actual attendance based on conducted sessions only
         total_sessions = len(demo_data["sessions"])
-        attended_sessions = len([r for r in demo_data["attendance_records"] 
+        attended_sessions = len([r for r in records 
                                 if r["student_id"] == student["id"]])
         
         # Only calculate if there are conducted sessions
@@ -482,33 +584,35 @@ def get_low_attendance_students():
 @app.route('/api/clear/sessions', methods=['DELETE'])
 def clear_sessions():
     """Clear all session data"""
-    demo_data["sessions"] = []
-    save_demo_data()
+    demo_store.replace("sessions", [])
+    demo_index.rebuild(demo_data)
+    schedule.rebuild(demo_data["sessions"])
     return jsonify({'message': 'All sessions cleared successfully'}), 200
 
 @app.route('/api/clear/attendance', methods=['DELETE'])
 def clear_attendance():
     """Clear all attendance records and movement logs"""
-    demo_data["attendance_records"] = []
-    demo_data["movement_logs"] = []
-    save_demo_data()
+    demo_store.replace("attendance_records", [])
+    demo_store.replace("movement_logs", [])
+    demo_index.rebuild(demo_data)
     return jsonify({'message': 'All attendance records cleared successfully'}), 200
 
 @app.route('/api/clear/reports', methods=['DELETE'])
 def clear_reports():
     """Clear all data used for reports (attendance records, movement logs)"""
-    demo_data["attendance_records"] = []
-    demo_data["movement_logs"] = []
-    save_demo_data()
+    demo_store.replace("attendance_records", [])
+    demo_store.replace("movement_logs", [])
+    demo_index.rebuild(demo_data)
     return jsonify({'message': 'All report data cleared successfully'}), 200
 
 @app.route('/api/clear/all-session-data', methods=['DELETE'])
 def clear_all_session_data():
     """Clear sessions, attendance records, and movement logs (keeps students and their images)"""
-    demo_data["sessions"] = []
-    demo_data["attendance_records"] = []
-    demo_data["movement_logs"] = []
-    save_demo_data()
+    demo_store.replace("sessions", [])
+    demo_store.replace("attendance_records", [])
+    demo_store.replace("movement_logs", [])
+    demo_index.rebuild(demo_data)
+    schedule.rebuild(demo_data["sessions"])
     return jsonify({'message': 'All session and attendance data cleared successfully'}), 200
 
 # Start the app
@@ -0,0 +1,120 @@
+"""Student x session attendance matrix for vectorized report reductions"""
+from collections import defaultdict
+
+import numpy as np
+
+INITIAL_CAPACITY = 64
+
+
+class AttendanceMatrix:
+    """Boolean present[row, column] matrix: one row per student id, one column per session
+
+    Columns follow the order of demo_data['sessions'] (one per session
+    object, so duplicated session ids get one column each, like the per-
+    session report loops counted them). Each column carries a completed
+    flag and department/subject codes, so report slices are boolean masks.
+    Marks for students or sessions that are not registered yet are kept
+    and applied when the row or column is added.
+    """
+
+    def __init__(self):
+        self._present = np.zeros((INITIAL_CAPACITY, INITIAL_CAPACITY), dtype=bool)
+        self._completed = np.zeros(INITIAL_CAPACITY, dtype=bool)
+        self._department = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._subject = np.zeros(INITIAL_CAPACITY, dtype=np.int32)
+        self._n_rows = 0
+        self._n_cols = 0
+
+        self._row_of = {}
+        self._cols_of = defaultdict(list)
+        self._codes = {}
+        self._sessions_by_student = defaultdict(set)
+        self._students_by_session = defaultdict(set)
+
+    def _code(self, value):
+        """Small integer code for a department/subject string"""
+        return self._codes.setdefault(value, len(self._codes))
+
+    def _grow(self, rows, cols):
+        """Double the capacity along any axis that is full"""
+        capacity_rows, capacity_cols = self._present.shape
+        if rows <= capacity_rows and cols <= capacity_cols:
+            return
+        while capacity_rows < rows:
+            capacity_rows *= 2
+        while capacity_cols < cols:
+            capacity_cols *= 2
+
+        present = np.zeros((capacity_rows, capacity_cols), dtype=bool)
+        present[:self._n_rows, :self._n_cols] = self._present[:self._n_rows, :self._n_cols]
+        self._present = present
+        for name in ('_completed', '_department', '_subject'):
+            column_data = getattr(self, name)
+            if len(column_data) < capacity_cols:
+                resized = np.zeros(capacity_cols, dtype=column_data.dtype)
+                resized[:len(column_data)] = column_data
+                setattr(self, name, resized)
+
+    def add_student(self, student_id):
+        """Row for a student id, adding it on first sight"""
+        row = self._row_of.get(student_id)
+        if row is not None:
+            return row
+
+        row = self._n_rows
+        self._grow(row + 1, self._n_cols)
+        self._row_of[student_id] = row
+        self._n_rows += 1
+        for session_id in self._sessions_by_student.get(student_id, ()):
+            self._present[row, self._cols_of.get(session_id, [])] = True
+        return row
+
+    def add_session(self, session_id, completed, department, subject):
+        """Append a column for a session; returns its column index"""
+        col = self._n_cols
+        self._grow(self._n_rows, col + 1)
+        self._cols_of[session_id].append(col)
+        self._completed[col] = completed
+        self._department[col] = self._code(department)
+        self._subject[col] = self._code(subject)
+        self._n_cols += 1
+
+        rows = [self._row_of[student_id] for student_id in self._students_by_session.get(session_id, ())
+                if student_id in self._row_of]
+        self._present[rows, col] = True
+        return col
+
+    def set_completed(self, col, completed):
+        """Move a session column in or out of the completed set"""
+        self._completed[col] = completed
+
+    def mark(self, student_id, session_id):
+        """Record the student as present for every session with this id"""
+        self._sessions_by_student[student_id].add(session_id)
+        self._students_by_session[session_id].add(student_id)
+        row = self._row_of.get(student_id)
+        if row is not None:
+            self._present[row, self._cols_of.get(session_id, [])] = True
+
+    def session_mask(self, department=None, subject=None):
+        """Boolean mask over columns: completed sessions matching the given filters"""
+        mask = self._completed[:self._n_cols].copy()
+        for codes, value in ((self._department, department), (self._subject, subject)):
+            if value is not None:
+                code = self._codes.get(value)
+                if code is None:
+                    return np.zeros(self._n_cols, dtype=bool)
+                mask &= codes[:self._n_cols] == code
+        return mask
+
+    def attended(self, student_ids, mask):
+        """Number of masked sessions each student id was present for (0 for unknown ids)"""
+        counts = np.zeros(len(student_ids), dtype=np.int64)
+        known = [i for i, student_id in enumerate(student_ids) if student_id in self._row_of]
+        if not known or not mask.any():
+            return counts
+
+        rows = np.array([self._row_of[student_ids[i]] for i in known])
+        cols = np.flatnonzero(mask)
+        counts[known] = self._present[np.ix_(rows, cols)].sum(axis=1)
+        return counts
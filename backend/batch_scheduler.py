@@ -0,0 +1,144 @@
+"""Micro-batching of face encoding and matching across camera streams
+
+With RECOGNITION_BATCHING=1, each frame handler only decodes and detects;
+its face locations go to one RecognitionBatcher, which collects the faces
+of all concurrent streams until BATCH_MAX_FACES are waiting or the oldest
+has waited BATCH_MAX_WAIT_MS. The batch then gets one encoder call (dlib's
+batched compute_face_descriptor) and one gallery match per distinct
+gallery (and key, e.g. a room whose hot set is tried first), and each
+stream's future receives its own encodings and matches.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+RECOGNITION_BATCHING = os.environ.get('RECOGNITION_BATCHING', '0') == '1'
+BATCH_MAX_FACES = int(os.environ.get('BATCH_MAX_FACES', 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 15))
+
+
+def nearest_matches(probes, gallery, tolerance):
+    """Per probe, (gallery index, distance) of the nearest entry if within tolerance, else None
+
+    Distances for the whole batch come from one matrix product; the
+    winner's distance is then recomputed exactly, as face_distance would.
+    """
+    probes = np.asarray(probes, dtype=np.float64)
+    gallery = np.asarray(gallery, dtype=np.float64)
+    if len(probes) == 0 or len(gallery) == 0:
+        return [None] * len(probes)
+
+    squared = (np.einsum('ij,ij->i', gallery, gallery)[None, :]
+               - 2 * probes @ gallery.T
+               + np.einsum('ij,ij->i', probes, probes)[:, None])
+    best = np.argmin(squared, axis=1)
+    matches = []
+    for probe, index in zip(probes, best):
+        distance = float(np.linalg.norm(gallery[index] - probe))
+        matches.append((int(index), distance) if distance <= tolerance else None)
+    return matches
+
+
+class _Request:
+    __slots__ = ('image', 'locations', 'gallery', 'key', 'future', 'queued_at')
+
+    def __init__(self, image, locations, gallery, key):
+        self.image = image
+        self.locations = locations
+        self.gallery = gallery
+        self.key = key
+        self.future = Future()
+        self.queued_at = time.perf_counter()
+
+
+class RecognitionBatcher:
+    """Collects per-frame face work into batches run on one background thread
+
+    encode_batch([(image, locations), ...]) returns a list of encodings per
+    image; match_batch(encodings, gallery, key) returns one match per encoding.
+    """
+
+    def __init__(self, encode_batch, match_batch, max_faces=BATCH_MAX_FACES, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self._encode_batch = encode_batch
+        self._match_batch = match_batch
+        self.max_faces = max_faces
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.stats = {'batches': 0, 'frames': 0, 'faces': 0, 'wait_seconds': 0.0, 'run_seconds': 0.0}
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, image, locations, gallery, key=None):
+        """Future resolving to (encodings, matches) for one frame's faces"""
+        request = _Request(image, locations, gallery, key)
+        if not locations:
+            request.future.set_result(([], []))
+        else:
+            self._queue.put(request)
+        return request.future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        faces = len(batch[0].locations)
+        deadline = batch[0].queued_at + self.max_wait
+        while faces < self.max_faces:
+            # Past the deadline, still take whatever is already queued
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            faces += len(request.locations)
+        return batch, faces
+
+    def _run(self):
+        while True:
+            batch, faces = self._collect()
+            started = time.perf_counter()
+            try:
+                self._process(batch)
+            except Exception as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+            with self._lock:
+                self.stats['batches'] += 1
+                self.stats['frames'] += len(batch)
+                self.stats['faces'] += faces
+                self.stats['wait_seconds'] += sum(started - request.queued_at for request in batch)
+                self.stats['run_seconds'] += time.perf_counter() - started
+
+    def _process(self, batch):
+        encodings = self._encode_batch([(request.image, request.locations) for request in batch])
+
+        # One match call per distinct gallery and key (frames of the same session share both)
+        groups = {}
+        for request, request_encodings in zip(batch, encodings):
+            groups.setdefault((id(request.gallery[0]), request.key), []).append((request, request_encodings))
+        for members in groups.values():
+            flat = [encoding for _, request_encodings in members for encoding in request_encodings]
+            matches = self._match_batch(flat, members[0][0].gallery, members[0][0].key)
+            position = 0
+            for request, request_encodings in members:
+                request.future.set_result((request_encodings, matches[position:position + len(request_encodings)]))
+                position += len(request_encodings)
+
+    def summary(self):
+        with self._lock:
+            stats = dict(self.stats)
+        batches = stats['batches'] or 1
+        return {
+            'batches': stats['batches'],
+            'frames': stats['frames'],
+            'faces': stats['faces'],
+            'avg_faces_per_batch': round(stats['faces'] / batches, 2),
+            'avg_wait_ms': round(stats['wait_seconds'] / (stats['frames'] or 1) * 1000, 2),
+            'avg_batch_ms': round(stats['run_seconds'] / batches * 1000, 2),
+            'max_faces': self.max_faces,
+            'max_wait_ms': self.max_wait * 1000
+        }
@@ -0,0 +1,144 @@
+"""Throughput and latency of micro-batched recognition vs batch size
+
+Usage (from the backend directory):
+    python benchmarks/bench_batching.py --streams 16 --faces 3 --gallery 20000 --sizes 1 4 8 16 32
+
+--streams threads each send frames of --faces faces back to back, as the
+socket handlers of that many cameras would. "direct" is today's path (each
+frame encodes and matches its own faces); the other rows go through
+RecognitionBatcher with that BATCH_MAX_FACES. Matching is the real code
+over a random --gallery. Encoding uses dlib when face_recognition is
+installed (--encoder dlib); otherwise a CPU cost model holding the GIL for
+--call-ms per encoder call plus --face-ms per face stands in for it.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from batch_scheduler import RecognitionBatcher, nearest_matches  # noqa: E402
+
+TOLERANCE = 0.5
+
+
+def burn(ms):
+    deadline = time.thread_time() + ms / 1000
+    while time.thread_time() < deadline:
+        pass
+
+
+def model_encoder(call_ms, face_ms):
+    def encode_batch(items):
+        burn(call_ms + face_ms * sum(len(locations) for _, locations in items))
+        return [[np.full(128, 0.01 * i) for i in range(len(locations))] for _, locations in items]
+    return encode_batch
+
+
+def dlib_encoder():
+    import dlib
+    import face_recognition
+    from face_recognition import api
+
+    def encode_batch(items):
+        images, detections = [], []
+        for image, locations in items:
+            shapes = dlib.full_object_detections()
+            for location in locations:
+                shapes.append(api.pose_predictor_5_point(image, api._css_to_rect(location)))
+            images.append(image)
+            detections.append(shapes)
+        return [[np.array(d) for d in per_image]
+                for per_image in api.face_encoder.compute_face_descriptor(images, detections, 1)]
+
+    def encode_one(image, locations):
+        return face_recognition.face_encodings(image, locations)
+    return encode_batch, encode_one
+
+
+def match_one(encodings, gallery):
+    """Today's matching: one face_distance scan per face"""
+    matches = []
+    for encoding in encodings:
+        distances = np.linalg.norm(gallery - encoding, axis=1)
+        best = int(np.argmin(distances))
+        matches.append((best, float(distances[best])) if distances[best] <= TOLERANCE else None)
+    return matches
+
+
+def run(streams, seconds, handle):
+    latencies = []
+    stop = time.perf_counter() + seconds
+
+    def stream():
+        while time.perf_counter() < stop:
+            t = time.perf_counter()
+            handle()
+            latencies.append(time.perf_counter() - t)
+
+    threads = [threading.Thread(target=stream) for _ in range(streams)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / elapsed, latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.95)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--streams', type=int, default=16)
+    parser.add_argument('--faces', type=int, default=3, help='faces per frame')
+    parser.add_argument('--gallery', type=int, default=20000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--max-wait-ms', type=float, default=15)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--encoder', choices=['model', 'dlib'], default='model')
+    parser.add_argument('--call-ms', type=float, default=8, help='model: fixed cost per encoder call')
+    parser.add_argument('--face-ms', type=float, default=2, help='model: cost per face')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gallery_encodings = rng.normal(0, 0.1, (args.gallery, 128))
+    gallery = (gallery_encodings, np.arange(args.gallery), np.array([str(i) for i in range(args.gallery)]))
+    locations = [(10 + 40 * i, 40 + 40 * i, 40 + 40 * i, 10 + 40 * i) for i in range(args.faces)]
+
+    if args.encoder == 'dlib':
+        encode_batch, encode_one = dlib_encoder()
+        image = rng.integers(0, 255, (240, 40 * args.faces + 60, 3), dtype=np.uint8)
+    else:
+        encode_batch = model_encoder(args.call_ms, args.face_ms)
+        encode_one = lambda image, locations: encode_batch([(image, locations)])[0]  # noqa: E731
+        image = None
+
+    def match_batch(encodings, gallery, key=None):
+        return nearest_matches(encodings, gallery[0], TOLERANCE)
+
+    print(f"streams={args.streams} faces/frame={args.faces} gallery={args.gallery} encoder={args.encoder} "
+          f"max_wait={args.max_wait_ms}ms")
+    print(f"{'batch':>7} {'frames/s':>9} {'faces/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'faces/batch':>12}")
+
+    def direct():
+        match_one(encode_one(image, locations), gallery_encodings)
+
+    fps, p50, p95 = run(args.streams, args.seconds, direct)
+    print(f"{'direct':>7} {fps:9.1f} {fps * args.faces:9.1f} {p50:8.1f} {p95:8.1f} {args.faces:12.1f}")
+
+    for size in args.sizes:
+        batcher = RecognitionBatcher(encode_batch, match_batch, max_faces=size, max_wait_ms=args.max_wait_ms)
+        fps, p50, p95 = run(args.streams, args.seconds,
+                            lambda: batcher.submit(image, locations, gallery).result())
+        summary = batcher.summary()
+        print(f"{size:>7} {fps:9.1f} {fps * args.faces:9.1f} {p50:8.1f} {p95:8.1f} "
+              f"{summary['avg_faces_per_batch']:12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Speedup and decision error of the PCA cascade matcher over gallery size
+
+Usage (from the backend directory):
+    python benchmarks/bench_cascade.py --sizes 10000 50000 100000 200000 --dims 32
+
+Synthetic encodings have per-dimension spreads falling off as
+(i + 1) ** -decay, randomly rotated, scaled so different people are ~1.0
+apart; --decay 0 is the isotropic worst case for PCA. --encodings loads a
+real gallery (e.g. a snapshot's encodings.npy) instead and resamples it
+with noise to reach each size. Probes mix enrolled students seen again,
+hard cases within 2% of TOLERANCE and strangers.
+
+The baseline is face_distance + argmin per probe, as in match_face().
+Reported: probes/s and speedup of the approximate and certified cascade,
+and the share of match decisions that differ from the baseline.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from cascade_matcher import CascadeMatcher, PCAProjection  # noqa: E402
+
+TOLERANCE = 0.5
+
+
+def make_gallery(size, decay, rng, real=None):
+    if real is not None:
+        rows = real[rng.integers(0, len(real), size)]
+        return rows + rng.normal(0, 0.3 / np.sqrt(real.shape[1]), rows.shape)
+    spread = (np.arange(128) + 1.0) ** -decay
+    spread *= 1.0 / np.sqrt(2 * np.sum(np.square(spread)))
+    rotation, _ = np.linalg.qr(np.random.default_rng(1).normal(size=(128, 128)))
+    return (rng.normal(size=(size, 128)) * spread) @ rotation
+
+
+def make_probes(gallery, count, decay, rng, real=None):
+    third = count // 3
+    seen = gallery[rng.integers(0, len(gallery), third)] + rng.normal(0, 0.35 / np.sqrt(128), (third, 128))
+    direction = rng.normal(0, 1, (third, 128))
+    direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+    hard = gallery[rng.integers(0, len(gallery), third)] + direction * TOLERANCE * rng.uniform(0.98, 1.02, (third, 1))
+    strangers = make_gallery(count - 2 * third, decay, rng, real)
+    return np.vstack([seen, hard, strangers])
+
+
+def baseline(gallery, probes):
+    matches = []
+    for probe in probes:
+        distances = np.linalg.norm(gallery - probe, axis=1)
+        best = int(np.argmin(distances))
+        matches.append(best if distances[best] <= TOLERANCE else None)
+    return matches
+
+
+def timed(matcher, probes, batch):
+    results = []
+    t = time.perf_counter()
+    for start in range(0, len(probes), batch):
+        results.extend(matcher.match(probes[start:start + batch], TOLERANCE))
+    return [result[0] if result else None for result in results], time.perf_counter() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 50000, 100000, 200000])
+    parser.add_argument('--probes', type=int, default=300)
+    parser.add_argument('--dims', type=int, default=32)
+    parser.add_argument('--shortlist', type=int, default=64)
+    parser.add_argument('--decay', type=float, default=0.5, help='spectrum fall-off of synthetic encodings')
+    parser.add_argument('--encodings', help='.npy of real encodings to resample instead')
+    parser.add_argument('--batch', type=int, default=8, help='probes per call (faces per frame)')
+    args = parser.parse_args()
+
+    real = np.load(args.encodings) if args.encodings else None
+    print(f"dims={args.dims} shortlist={args.shortlist} probes={args.probes} "
+          f"data={'resampled ' + args.encodings if real is not None else f'synthetic decay={args.decay}'}")
+    print(f"{'gallery':>8} {'captured':>9} {'exact/s':>8} {'cascade/s':>10} {'speedup':>8} {'errors':>7} "
+          f"{'certified/s':>12} {'speedup':>8} {'errors':>7}")
+
+    for size in args.sizes:
+        rng = np.random.default_rng(size)
+        gallery = make_gallery(size, args.decay, rng, real)
+        probes = make_probes(gallery, args.probes, args.decay, rng, real)
+
+        t = time.perf_counter()
+        expected = baseline(gallery, probes)
+        base_seconds = time.perf_counter() - t
+
+        projection = PCAProjection(gallery, args.dims)
+        row = [f"{size:>8}", f"{projection.fitted_variance:9.1%}", f"{args.probes / base_seconds:8.1f}"]
+        for certify in (False, True):
+            matcher = CascadeMatcher(gallery, projection, shortlist=args.shortlist, certify=certify)
+            results, seconds = timed(matcher, probes, args.batch)
+            errors = sum(result != want for result, want in zip(results, expected)) / len(probes)
+            row += [f"{args.probes / seconds:{12 if certify else 10}.1f}", f"{base_seconds / seconds:8.2f}",
+                    f"{errors:7.2%}"]
+        print(' '.join(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Decoded frames to another process: multiprocessing queue vs FrameRing
+
+Usage (from the backend directory):
+    python benchmarks/bench_frame_ring.py --width 1920 --height 1080 --fps 30 --seconds 10
+
+A producer process sends --fps frames per second of --width x --height BGR
+to a consumer process, which reads every pixel of each frame (frame.max())
+as a stand-in for resizing it before detection:
+  - queue: the frame itself through a multiprocessing.Queue (pickled,
+    written to a pipe, read back and unpickled)
+  - ring: the frame copied into a FrameRing slot, its FrameHandle through
+    the same kind of queue, read in place by the consumer
+
+Reported: bytes pickled per frame, p50/p99 latency from send to the
+consumer being done with the frame, CPU per frame in producer and consumer,
+and frames the consumer missed (overwritten before it read them).
+"""
+import argparse
+import os
+import pickle
+import sys
+import time
+from multiprocessing import get_context
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from frame_ring import FrameRing, attached_ring  # noqa: E402
+
+
+def consume(transport, frames, results):
+    latencies, missed = [], 0
+    started = time.process_time()
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        sent, payload = item
+        if transport == 'ring':
+            ring = attached_ring(payload.ring)
+            frame = ring.read(payload)
+            if frame is None:
+                missed += 1
+                continue
+            frame.max()
+            if not ring.valid(payload):
+                missed += 1
+                continue
+        else:
+            payload.max()
+        latencies.append(time.time() - sent)
+    results.put((latencies, missed, time.process_time() - started))
+
+
+def produce(transport, sources, fps, count, frames):
+    ring = FrameRing.create(sources[0].shape) if transport == 'ring' else None
+    begin = time.perf_counter()
+    for i in range(count):
+        delay = begin + i / fps - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        image = sources[i % len(sources)]
+        frames.put((time.time(), ring.put(image) if ring else image))
+    frames.put(None)
+    return ring
+
+
+def run(transport, sources, fps, count):
+    context = get_context('fork')
+    frames, results = context.Queue(), context.Queue()
+    consumer = context.Process(target=consume, args=(transport, frames, results))
+    consumer.start()
+    started = time.process_time()
+    ring = produce(transport, sources, fps, count, frames)
+    frames.close()
+    frames.join_thread()  # The queue's feeder thread pickles and writes in this process
+    producer_cpu = time.process_time() - started
+    latencies, missed, consumer_cpu = results.get()
+    consumer.join()
+    if ring:
+        ring.close()
+    return np.array(latencies), missed, producer_cpu, consumer_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    sources = [rng.integers(0, 256, (args.height, args.width, 3), dtype=np.uint8) for _ in range(4)]
+    count = int(args.fps * args.seconds)
+    ring = FrameRing.create(sources[0].shape)
+    payload_bytes = {'queue': len(pickle.dumps((time.time(), sources[0]))),
+                     'ring': len(pickle.dumps((time.time(), ring.put(sources[0]))))}
+    ring.close()
+
+    print(f"{args.width}x{args.height} BGR ({sources[0].nbytes / 1e6:.1f} MB), {args.fps:g} fps, "
+          f"{count} frames, {os.cpu_count()} cores")
+    print(f"{'transport':>9} {'pickled B':>10} {'p50 ms':>7} {'p99 ms':>7} "
+          f"{'producer ms':>12} {'consumer ms':>12} {'missed':>7}")
+    for transport in ('queue', 'ring'):
+        latencies, missed, producer_cpu, consumer_cpu = run(transport, sources, args.fps, count)
+        print(f"{transport:>9} {payload_bytes[transport]:10d} {1000 * np.percentile(latencies, 50):7.2f} "
+              f"{1000 * np.percentile(latencies, 99):7.2f} {1000 * producer_cpu / count:12.2f} "
+              f"{1000 * consumer_cpu / count:12.2f} {missed:7d}")
+
+
+if __name__ == '__main__':
+    main()
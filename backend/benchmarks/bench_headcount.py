@@ -0,0 +1,97 @@
+"""Cameras per core in headcount mode against identity mode
+
+Usage (from the backend directory):
+    python benchmarks/bench_headcount.py classroom_*.jpg --gallery 5000 --camera-fps 2
+
+Each image is processed as locate_faces() does at the standard quality
+level (quarter size, upsample 1, HOG), then either:
+  - identity: face encodings plus nearest-neighbour matching against a
+    random gallery of --gallery encodings, as in recognize_faces()
+  - headcount: len(face_locations), as process_headcount_frame() does
+  - headcount + tracking: the same count through occupancy.CountTracker
+
+CPU time per frame is process time on one core. Cameras per core is how
+many streams at --camera-fps one core keeps up with.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import cv2  # noqa: E402
+import face_recognition  # noqa: E402
+
+from occupancy import CountTracker  # noqa: E402
+
+TOLERANCE = 0.5
+
+
+def locate(frame):
+    small = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    return rgb, face_recognition.face_locations(rgb, number_of_times_to_upsample=1, model='hog')
+
+
+def identity(gallery):
+    def process(frame):
+        rgb, locations = locate(frame)
+        matches = []
+        for encoding in face_recognition.face_encodings(rgb, locations):
+            distances = np.linalg.norm(gallery - encoding, axis=1)
+            best = int(np.argmin(distances))
+            matches.append(best if distances[best] <= TOLERANCE else None)
+        return len(matches)
+    return process
+
+
+def headcount(frame):
+    return len(locate(frame)[1])
+
+
+def tracked_headcount():
+    tracker = CountTracker()
+
+    def process(frame):
+        return tracker.update(locate(frame)[1], time.time())
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--gallery', type=int, default=5000)
+    parser.add_argument('--camera-fps', type=float, default=2, help='frames analysed per camera per second')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    frames = [cv2.imread(path) for path in args.images]
+    if any(frame is None for frame in frames):
+        parser.error("can't read one of the images")
+    gallery = np.random.default_rng(0).normal(0, 0.0625, (args.gallery, 128))
+
+    methods = [('identity', identity(gallery)), ('headcount', headcount),
+               ('headcount+track', tracked_headcount())]
+    for _, process in methods:
+        process(frames[0])  # Warm-up: model loading and first-call allocations
+
+    height, width = frames[0].shape[:2]
+    print(f"{len(frames)} images ({width}x{height}), gallery {args.gallery}, {args.camera_fps:g} fps per camera")
+    print(f"{'mode':>16} {'faces/frame':>12} {'cpu ms/frame':>13} {'cameras/core':>13}")
+    for name, process in methods:
+        faces = 0
+        started = time.process_time()
+        for _ in range(args.repeat):
+            for frame in frames:
+                faces += process(frame)
+        cpu = (time.process_time() - started) / (args.repeat * len(frames))
+        print(f"{name:>16} {faces / (args.repeat * len(frames)):12.1f} {1000 * cpu:13.1f} "
+              f"{1 / (cpu * args.camera_fps):13.1f}")
+
+
+if __name__ == '__main__':
+    main()
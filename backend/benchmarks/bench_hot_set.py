@@ -0,0 +1,105 @@
+"""Hit rate, candidates per face and decision agreement of per-room hot sets
+
+Usage (from the backend directory):
+    python benchmarks/bench_hot_set.py --gallery 50000 --rooms 20 --class-size 60 --sessions 10
+
+Synthetic institution: random 128-d encodings at the spread of real dlib
+encodings (different people ~1.0 apart). Each room has a regular class of
+--class-size students who attend every session with --attendance
+probability, plus a few visitors from elsewhere and strangers. A session
+is --frames frames of --faces-per-frame attendees, each with fresh noise
+(~0.35 from the enrolled encoding).
+
+The full matcher is face_distance + argmin over the whole gallery, as in
+match_face(). Reported: hit rate, average candidates scanned per face,
+faces/s of the hot-set path against the full scan, and how many match
+decisions differ from it.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from hot_set import HotSetCache  # noqa: E402
+
+TOLERANCE = 0.5
+SPREAD = 0.0625  # per-dimension std; gives ~1.0 between random encodings
+
+
+def match_full(face_encodings, gallery, gallery_ids, gallery_names):
+    matches = []
+    for face_encoding in face_encodings:
+        distances = np.linalg.norm(gallery - face_encoding, axis=1)
+        best = int(np.argmin(distances))
+        matches.append((int(gallery_ids[best]), gallery_names[best], float(distances[best]))
+                       if distances[best] <= TOLERANCE else None)
+    return matches
+
+
+def make_frames(args, gallery, rng):
+    """(room, encodings) per frame, session by session, rooms interleaved"""
+    classes = [rng.choice(len(gallery), args.class_size, replace=False) for _ in range(args.rooms)]
+    frames = []
+    for _ in range(args.sessions):
+        for room, students in enumerate(classes):
+            present = students[rng.random(len(students)) < args.attendance]
+            visitors = rng.integers(0, len(gallery), args.visitors)
+            people = [gallery[s] for s in np.concatenate([present, visitors])]
+            people += list(rng.normal(0, SPREAD, (args.strangers, 128)))
+            for _ in range(args.frames):
+                order = rng.permutation(len(people))[:args.faces_per_frame]
+                frames.append((room, np.array([people[i] + rng.normal(0, 0.35 / np.sqrt(128), 128)
+                                               for i in order])))
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--gallery', type=int, default=50000)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--class-size', type=int, default=60)
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--frames', type=int, default=10, help='frames per room per session')
+    parser.add_argument('--faces-per-frame', type=int, default=8)
+    parser.add_argument('--attendance', type=float, default=0.9)
+    parser.add_argument('--visitors', type=int, default=2)
+    parser.add_argument('--strangers', type=int, default=1)
+    parser.add_argument('--size', type=int, default=120, help='HOT_SET_SIZE')
+    parser.add_argument('--margin', type=float, default=0.1, help='HOT_SET_MARGIN')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gallery = rng.normal(0, SPREAD, (args.gallery, 128))
+    gallery_ids = list(range(1, args.gallery + 1))
+    gallery_names = [f"student {i}" for i in gallery_ids]
+    frames = make_frames(args, gallery, rng)
+    faces = sum(len(encodings) for _, encodings in frames)
+
+    t = time.perf_counter()
+    expected = [match_full(encodings, gallery, gallery_ids, gallery_names) for _, encodings in frames]
+    full_seconds = time.perf_counter() - t
+
+    cache = HotSetCache(size=args.size, window_seconds=8 * 24 * 3600, margin=args.margin)
+    t = time.perf_counter()
+    results = [cache.match(room, encodings, gallery, gallery_ids, gallery_names, TOLERANCE, match_full)
+               for room, encodings in frames]
+    hot_seconds = time.perf_counter() - t
+
+    differ = sum((a[0] if a else None) != (b[0] if b else None)
+                 for got, want in zip(results, expected) for a, b in zip(got, want))
+    summary = cache.summary()
+    print(f"gallery={args.gallery} rooms={args.rooms} class={args.class_size} faces={faces} "
+          f"hot set size={args.size} margin={args.margin}")
+    print(f"{'':>10} {'faces/s':>9} {'candidates/face':>16} {'hit rate':>9} {'differ':>7}")
+    print(f"{'full':>10} {faces / full_seconds:9.1f} {args.gallery:16.1f} {'-':>9} {0:7d}")
+    print(f"{'hot set':>10} {faces / hot_seconds:9.1f} {summary['avg_candidates_per_face']:16.1f} "
+          f"{summary['hit_rate']:9.2%} {differ:7d}   speedup {full_seconds / hot_seconds:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
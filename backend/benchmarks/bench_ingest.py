@@ -0,0 +1,235 @@
+"""Load test: Flask-SocketIO threading server vs the asyncio ingest service
+
+Usage (from the backend directory):
+    python benchmarks/bench_ingest.py --idle 1000 --active 16 --work-ms 40
+
+Both servers run the same synthetic pipeline, so dlib and MySQL aren't
+needed: `decode` writes a blank 640x480 frame, `detect` burns --work-ms of
+CPU per frame in pure Python (it holds the GIL, as dlib's detector does)
+and the other steps are trivial. The
+"current" server handles process_frame inline on python-socketio's
+threading server, which is what Flask-SocketIO runs for app.py; the
+"ingest" server is ingest_service.IngestService.
+
+For each server: open --idle websocket connections that send nothing and
+report the server's memory and thread count, then let --active clients send
+frames back to back (one in flight each) for --seconds. Reported: frames/s,
+frames per CPU-second used by the server (its process and children) and
+p50/p95 round-trip latency.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FRAME = 'data:image/jpeg;base64,' + 'A' * 20000
+FRAME_SHAPE = (480, 640, 3)
+
+
+def burn(ms):
+    deadline = time.thread_time() + ms / 1000
+    x = 0
+    while time.thread_time() < deadline:
+        x += 1
+    return x
+
+
+class SyntheticPipeline:
+    """Stands in for ingest_service.AppPipeline"""
+
+    def __init__(self, work_ms):
+        self.work_ms = work_ms
+
+    def load(self):
+        pass
+
+    def begin(self, data, sid, received_at):
+        if 'frame' not in data:
+            return {'error': 'No frame data provided'}, None, None
+        return None, data.get('session_id'), ()
+
+    def decode(self, frame_data, into=None):
+        frame = into(FRAME_SHAPE) if into else np.empty(FRAME_SHAPE, dtype=np.uint8)
+        frame[:] = 0
+        return frame
+
+    def detect(self, frame):
+        burn(self.work_ms)
+        return [(0, 10, 10, 0)], [[0.0] * 128]
+
+    def finish(self, state, face_locations, face_encodings):
+        return {'recognized': [], 'total_faces': len(face_locations)}, []
+
+    def forget(self, sid):
+        pass
+
+
+def serve_current(port, work_ms):
+    """Same threading model as app.py: Flask-SocketIO's default is socketio.Server in threading mode"""
+    import socketio
+    from flask import Flask
+    from werkzeug.serving import run_simple
+
+    sio = socketio.Server(async_mode='threading', cors_allowed_origins='*')
+    app = socketio.WSGIApp(sio, Flask(__name__))
+    pipeline = SyntheticPipeline(work_ms)
+
+    @sio.on('process_frame')
+    def process_frame(sid, data):
+        error, state, detect_args = pipeline.begin(data, sid, time.time())
+        if error is not None:
+            sio.emit('recognition_result', error, to=sid)
+            return
+        frame = pipeline.decode(data['frame'])
+        result, _ = pipeline.finish(state, *pipeline.detect(frame, *detect_args))
+        sio.emit('recognition_result', result, to=sid)
+
+    run_simple('127.0.0.1', port, app, threaded=True)
+
+
+def serve_ingest(port, work_ms, workers):
+    from ingest_service import IngestService
+    IngestService(SyntheticPipeline(work_ms), workers=workers, max_inflight=2 * workers).run('127.0.0.1', port)
+
+
+def process_tree(pid):
+    """pid and all its descendants"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if entry.isdigit():
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, []))
+    return tree
+
+
+def server_usage(pid):
+    """(CPU seconds, RSS MB, threads) summed over the server's process tree"""
+    cpu, rss, threads = 0.0, 0.0, 0
+    for member in process_tree(pid):
+        try:
+            with open(f'/proc/{member}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{member}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        rss += int(status['VmRSS'].split()[0]) / 1024
+        threads += int(status['Threads'])
+    return cpu, rss, threads
+
+
+async def connect_clients(url, count):
+    import socketio
+    clients = []
+    for start in range(0, count, 100):
+        batch = [socketio.AsyncClient(reconnection=False) for _ in range(min(100, count - start))]
+        await asyncio.gather(*(client.connect(url, transports=['websocket']) for client in batch))
+        clients.extend(batch)
+    return clients
+
+
+async def drive(url, pid, idle, active, seconds):
+    idle_clients = await connect_clients(url, idle)
+    await asyncio.sleep(1)
+    _, idle_rss, idle_threads = server_usage(pid)
+
+    clients = await connect_clients(url, active)
+    latencies = []
+
+    async def run_client(client):
+        replies = asyncio.Queue()
+        client.on('recognition_result', replies.put_nowait)
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            sent = time.perf_counter()
+            await client.emit('process_frame', {'frame': FRAME, 'session_id': 1})
+            await replies.get()
+            latencies.append(time.perf_counter() - sent)
+
+    cpu_before = server_usage(pid)[0]
+    started = time.perf_counter()
+    await asyncio.gather(*(run_client(client) for client in clients))
+    elapsed = time.perf_counter() - started
+    cpu_used = server_usage(pid)[0] - cpu_before
+
+    for client in idle_clients + clients:
+        await client.disconnect()
+
+    latencies.sort()
+    return {
+        'idle_rss_mb': idle_rss, 'idle_threads': idle_threads,
+        'frames_per_s': len(latencies) / elapsed,
+        'frames_per_cpu_s': len(latencies) / cpu_used if cpu_used else 0,
+        'p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+    }
+
+
+def wait_for_port(port, timeout=30):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--idle', type=int, default=1000, help='idle camera connections')
+    parser.add_argument('--active', type=int, default=16, help='connections sending frames')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--work-ms', type=float, default=40, help='CPU time per frame')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='ingest process pool size')
+    parser.add_argument('--port', type=int, default=5300)
+    parser.add_argument('--serve', choices=['current', 'ingest'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve == 'current':
+        return serve_current(args.port, args.work_ms)
+    if args.serve == 'ingest':
+        return serve_ingest(args.port, args.work_ms, args.workers)
+
+    print(f"idle={args.idle} active={args.active} work={args.work_ms}ms/frame "
+          f"cores={os.cpu_count()} ingest workers={args.workers}")
+    print(f"{'server':>8} {'idle RSS MB':>12} {'threads':>8} {'frames/s':>9} {'frames/cpu-s':>13} "
+          f"{'p50 ms':>8} {'p95 ms':>8}")
+    for offset, server in enumerate(('current', 'ingest')):
+        port = args.port + offset
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', server,
+                                    '--port', str(port), '--work-ms', str(args.work_ms),
+                                    '--workers', str(args.workers)],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_port(port)
+            result = asyncio.run(drive(f'http://127.0.0.1:{port}', process.pid,
+                                       args.idle, args.active, args.seconds))
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{server:>8} {result['idle_rss_mb']:12.1f} {result['idle_threads']:8d} "
+              f"{result['frames_per_s']:9.1f} {result['frames_per_cpu_s']:13.1f} "
+              f"{result['p50_ms']:8.1f} {result['p95_ms']:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Measure movement_logs vs presence_intervals on synthetic doorway noise
+
+Usage (from the backend directory):
+    python benchmarks/bench_movement.py --sessions 200 --students 60
+
+MySQL isn't needed: both layouts are loaded into an in-memory SQLite
+database and the correlated absence query from calculate_attendance_percentages
+is translated to SQLite date functions. Reported: row counts, time for the
+per-session absence calculation on each layout, and (with --debounce 0)
+whether the interval replay reproduces the old absence minutes exactly.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from movement_intervals import MOVEMENT_DEBOUNCE_SECONDS, absence_minutes, compact_events  # noqa: E402
+
+LEGACY_ABSENCE_QUERY = """
+SELECT ar.id, ar.student_id,
+       (SELECT SUM((strftime('%s', IFNULL((SELECT MIN(ml2.timestamp)
+                  FROM movement_logs ml2
+                  WHERE ml2.student_id = ml1.student_id
+                  AND ml2.session_id = ml1.session_id
+                  AND ml2.movement_type = 'entry'
+                  AND ml2.timestamp > ml1.timestamp), :now)) - strftime('%s', ml1.timestamp)) / 60)
+        FROM movement_logs ml1
+        WHERE ml1.student_id = ar.student_id
+        AND ml1.session_id = ar.session_id
+        AND ml1.movement_type = 'exit') as total_absence_minutes
+FROM attendance_records ar
+WHERE ar.session_id = :session_id
+"""
+
+
+def make_events(n_sessions, n_students, seed=7):
+    """A 60 minute session per student: real breaks plus bursts of entry/exit flicker at the door"""
+    rng = random.Random(seed)
+    events = []
+    for session_id in range(1, n_sessions + 1):
+        start = datetime(2025, 1, 1, 9) + timedelta(days=session_id)
+        for student_id in range(1, n_students + 1):
+            t = start + timedelta(seconds=rng.randint(0, 300))
+            end = start + timedelta(minutes=60)
+            inside = False
+            while t < end:
+                events.append((student_id, session_id, 'exit' if inside else 'entry', t))
+                inside = not inside
+                if not inside:
+                    t += timedelta(seconds=rng.randint(61, 150) if rng.random() < 0.8 else rng.randint(300, 900))
+                else:
+                    t += timedelta(seconds=rng.randint(61, 240) if rng.random() < 0.7 else rng.randint(600, 1500))
+    return events
+
+
+def load(conn, events, debounce):
+    conn.executescript("""
+        CREATE TABLE attendance_records (id INTEGER PRIMARY KEY, student_id INT, session_id INT);
+        CREATE TABLE movement_logs (id INTEGER PRIMARY KEY, student_id INT, session_id INT,
+                                    movement_type TEXT, timestamp TEXT);
+        CREATE INDEX idx_movement_student ON movement_logs(student_id);
+        CREATE INDEX idx_movement_session ON movement_logs(session_id);
+        CREATE TABLE presence_intervals (id INTEGER PRIMARY KEY, student_id INT, session_id INT,
+                                         start_time TEXT, end_time TEXT);
+        CREATE INDEX idx_intervals_session_student ON presence_intervals(session_id, student_id, start_time);
+    """)
+    conn.executemany("INSERT INTO movement_logs (student_id, session_id, movement_type, timestamp) VALUES (?, ?, ?, ?)",
+                     [(s, sess, m, t.isoformat(' ')) for s, sess, m, t in events])
+
+    by_pair = {}
+    for student_id, session_id, movement_type, timestamp in events:
+        by_pair.setdefault((student_id, session_id), []).append((movement_type, timestamp))
+    conn.executemany("INSERT INTO attendance_records (student_id, session_id) VALUES (?, ?)", list(by_pair))
+
+    interval_rows = []
+    for (student_id, session_id), pair_events in by_pair.items():
+        for start, end in compact_events(pair_events, debounce):
+            interval_rows.append((student_id, session_id, start.isoformat(' '), end.isoformat(' ') if end else None))
+    conn.executemany("INSERT INTO presence_intervals (student_id, session_id, start_time, end_time) VALUES (?, ?, ?, ?)",
+                     interval_rows)
+    conn.commit()
+
+
+def legacy_absence(conn, session_id, now):
+    rows = conn.execute(LEGACY_ABSENCE_QUERY, {'session_id': session_id, 'now': now.isoformat(' ')}).fetchall()
+    return {student_id: minutes or 0 for _, student_id, minutes in rows}
+
+
+def interval_absence(conn, session_id, now):
+    intervals = {}
+    for student_id, start, end in conn.execute(
+            "SELECT student_id, start_time, end_time FROM presence_intervals "
+            "WHERE session_id = ? ORDER BY student_id, start_time", (session_id,)):
+        intervals.setdefault(student_id, []).append(
+            (datetime.fromisoformat(start), datetime.fromisoformat(end) if end else None))
+    return {student_id: absence_minutes(student_intervals, now) for student_id, student_intervals in intervals.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--students', type=int, default=60)
+    parser.add_argument('--debounce', type=int, default=MOVEMENT_DEBOUNCE_SECONDS)
+    args = parser.parse_args()
+
+    events = make_events(args.sessions, args.students)
+    conn = sqlite3.connect(':memory:')
+    load(conn, events, args.debounce)
+    raw_rows = conn.execute("SELECT COUNT(*) FROM movement_logs").fetchone()[0]
+    interval_rows = conn.execute("SELECT COUNT(*) FROM presence_intervals").fetchone()[0]
+    print(f"movement_logs rows: {raw_rows}, presence_intervals rows: {interval_rows} "
+          f"({(1 - interval_rows / raw_rows) * 100:.1f}% fewer, debounce {args.debounce}s)")
+
+    now = datetime(2030, 1, 1)
+    session_ids = range(1, args.sessions + 1)
+    results = {}
+    for name, fn in (('movement_logs', legacy_absence), ('presence_intervals', interval_absence)):
+        started = time.perf_counter()
+        results[name] = [fn(conn, session_id, now) for session_id in session_ids]
+        print(f"absence for {args.sessions} sessions via {name:<20} {(time.perf_counter() - started) * 1000:9.1f} ms")
+
+    if args.debounce == 0:
+        print(f"absence minutes match: {results['movement_logs'] == results['presence_intervals']}")
+
+
+if __name__ == '__main__':
+    main()
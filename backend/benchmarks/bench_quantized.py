@@ -0,0 +1,88 @@
+"""Memory, match throughput and decision agreement of reduced-precision galleries
+
+Usage (from the backend directory):
+    python benchmarks/bench_quantized.py --gallery 200000 --probes 600
+
+The gallery is random 128-d encodings at the spread of real dlib encodings
+(different people ~1.0 apart). Probes are a mix of enrolled students seen
+again (~0.35 away), hard cases right around TOLERANCE and strangers. The
+float64 baseline is face_distance + argmin per probe, as in match_face().
+Reported per precision: resident matrix size, build time, probes/s and how
+many match decisions (matched or not, and which student) differ from the
+baseline.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from quantized_gallery import QuantizedGallery  # noqa: E402
+
+TOLERANCE = 0.5
+SPREAD = 0.0625  # per-dimension std; gives ~1.0 between random encodings
+
+
+def make_probes(gallery, count, rng):
+    third = count // 3
+    dim = gallery.shape[1]
+    seen = gallery[rng.integers(0, len(gallery), third)] + rng.normal(0, 0.35 / np.sqrt(dim), (third, dim))
+    # Offsets of exactly TOLERANCE +- 2% in a random direction
+    direction = rng.normal(0, 1, (third, dim))
+    direction /= np.linalg.norm(direction, axis=1, keepdims=True)
+    radius = TOLERANCE * rng.uniform(0.98, 1.02, (third, 1))
+    hard = gallery[rng.integers(0, len(gallery), third)] + direction * radius
+    strangers = rng.normal(0, SPREAD, (count - 2 * third, dim))
+    return np.vstack([seen, hard, strangers])
+
+
+def baseline(gallery, probes):
+    matches = []
+    for probe in probes:
+        distances = np.linalg.norm(gallery - probe, axis=1)
+        best = int(np.argmin(distances))
+        matches.append(best if distances[best] <= TOLERANCE else None)
+    return matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--gallery', type=int, default=200000)
+    parser.add_argument('--probes', type=int, default=600)
+    parser.add_argument('--batch', type=int, default=8, help='probes matched per call (faces per frame)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gallery = rng.normal(0, SPREAD, (args.gallery, 128))
+    probes = make_probes(gallery, args.probes, rng)
+
+    t = time.perf_counter()
+    expected = baseline(gallery, probes)
+    base_seconds = time.perf_counter() - t
+    print(f"gallery={args.gallery} probes={args.probes} ({sum(m is not None for m in expected)} matched in float64)")
+    print(f"{'precision':>9} {'MB':>8} {'build s':>8} {'probes/s':>9} {'speedup':>8} {'disagree':>9}")
+    print(f"{'float64':>9} {gallery.nbytes / 2 ** 20:8.1f} {'-':>8} {args.probes / base_seconds:9.1f} "
+          f"{1.0:8.2f} {0:9d}")
+
+    for precision in ('float16', 'int8'):
+        t = time.perf_counter()
+        matcher = QuantizedGallery(gallery, precision)
+        build_seconds = time.perf_counter() - t
+
+        results = []
+        t = time.perf_counter()
+        for start in range(0, len(probes), args.batch):
+            results.extend(matcher.match(probes[start:start + args.batch], TOLERANCE))
+        seconds = time.perf_counter() - t
+
+        disagree = sum((result[0] if result else None) != want for result, want in zip(results, expected))
+        print(f"{precision:>9} {matcher.nbytes / 2 ** 20:8.1f} {build_seconds:8.2f} {args.probes / seconds:9.1f} "
+              f"{base_seconds / seconds:8.2f} {disagree:9d}   (error bound {matcher.error_bound:.4f})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Benchmark the simple_server.py report endpoints on synthetic data
+
+Usage (from the backend directory):
+    python benchmarks/bench_reports.py --students 1000 --sessions 500
+    python benchmarks/bench_reports.py --students 5000 --sessions 2000 --index
+    python benchmarks/bench_reports.py --students 200 --sessions 100 --legacy
+
+--index also times the per-student hash-index counting that the reports used
+before the attendance matrix, and checks that both agree.
+--legacy also times the original per-(student, session) linear scan and
+checks that both produce the same numbers; it is only practical at small sizes.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEPARTMENTS = ['Computer Science', 'Computer Application', 'Electronics', 'Mechanical']
+SUBJECTS = ['CN', 'CC', 'OS', 'SSS', 'DBMS', 'AI']
+REPORTS = [
+    '/api/reports/low-attendance',
+    '/api/reports/attendance-stats',
+    '/api/reports/departments',
+    '/api/reports/subjects',
+]
+
+
+def make_data(n_students, n_sessions, attendance_rate, seed=42):
+    """Synthetic term: every completed session is attended by ~attendance_rate of its department"""
+    rng = random.Random(seed)
+    students = [{
+        'id': i + 1,
+        'student_id': f"STU{i + 1:05d}",
+        'name': f"Student {i + 1}",
+        'email': f"student{i + 1}@example.edu",
+        'department': DEPARTMENTS[i % len(DEPARTMENTS)],
+        'semester': '5',
+        'batch': '2023-2027',
+        'created_at': '2025-01-01T09:00:00'
+    } for i in range(n_students)]
+
+    sessions = [{
+        'id': i + 1,
+        'subject': SUBJECTS[i % len(SUBJECTS)],
+        'department': DEPARTMENTS[i % len(DEPARTMENTS)],
+        'start_time': '2025-01-01 09:00:00',
+        'end_time': '2025-01-01 10:00:00',
+        'duration_minutes': 60,
+        'status': 'completed' if i < n_sessions * 0.95 else 'scheduled',
+    } for i in range(n_sessions)]
+
+    records = []
+    for session in sessions:
+        if session['status'] != 'completed':
+            continue
+        for student in students:
+            if student['department'] == session['department'] and rng.random() < attendance_rate:
+                records.append({
+                    'id': len(records) + 1,
+                    'student_id': student['id'],
+                    'session_id': session['id'],
+                    'status': 'present',
+                })
+    rng.shuffle(records)
+
+    return {
+        'students': students,
+        'sessions': sessions,
+        'attendance_records': records,
+        'student_images': {},
+        'movement_logs': [],
+    }
+
+
+def legacy_attended(data, student_id, sessions):
+    """The pre-index scan: one linear pass over all records per (student, session)"""
+    attended = 0
+    for session in sessions:
+        record = next((ar for ar in data['attendance_records']
+                       if ar['student_id'] == student_id and ar['session_id'] == session['id']), None)
+        if record and record.get('status') == 'present':
+            attended += 1
+    return attended
+
+
+def legacy_attendance_stats(data):
+    completed = [s for s in data['sessions'] if s.get('status') == 'completed']
+    result = []
+    for student in data['students']:
+        dept = student['department'].strip()
+        dept_sessions = [s for s in completed if s['department'].strip() == dept]
+        result.append((student['id'], len(dept_sessions), legacy_attended(data, student['id'], dept_sessions)))
+    return result
+
+
+def index_attendance_counts(index, data):
+    """The pre-matrix reduction: per-student set lookups against each department's session ids"""
+    from demo_index import session_id_counts
+    dept_session_ids = {}
+    result = []
+    for student in data['students']:
+        dept = (student.get('department') or '').strip()
+        if dept not in dept_session_ids:
+            dept_session_ids[dept] = session_id_counts(index.sessions(status='completed', department=dept))
+        session_ids = dept_session_ids[dept]
+        result.append((student['id'], sum(session_ids.values()), index.count_present(student['id'], session_ids)))
+    return result
+
+
+def install(data):
+    """Swap the synthetic data into the running simple_server module"""
+    import simple_server
+    simple_server.demo_data.clear()
+    simple_server.demo_data.update(data)
+    simple_server.demo_index.rebuild(simple_server.demo_data)
+
+
+def time_call(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--attendance-rate', type=float, default=0.8)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--index', action='store_true', help='also time the per-student index counting')
+    parser.add_argument('--legacy', action='store_true', help='also time the old linear-scan algorithm')
+    args = parser.parse_args()
+
+    data = make_data(args.students, args.sessions, args.attendance_rate)
+    print(f"{args.students} students x {args.sessions} sessions, "
+          f"{len(data['attendance_records'])} attendance records")
+
+    started = time.perf_counter()
+    install(data)
+    print(f"index build: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    import simple_server
+    client = simple_server.app.test_client()
+    for path in REPORTS:
+        seconds = time_call(lambda: client.get(path), args.repeat)
+        print(f"{path:<32} {seconds * 1000:9.1f} ms")
+
+    if args.index:
+        index = simple_server.demo_index
+        seconds = time_call(lambda: index_attendance_counts(index, data), args.repeat)
+        print(f"{'index per-student counting':<32} {seconds * 1000:9.1f} ms")
+        seconds = time_call(simple_server.student_attendance_counts, args.repeat)
+        print(f"{'matrix per-student counting':<32} {seconds * 1000:9.1f} ms")
+
+        matrix_counts = [(student['id'], total, attended)
+                         for student, total, attended in simple_server.student_attendance_counts()]
+        print(f"results match index counting: {matrix_counts == index_attendance_counts(index, data)}")
+
+    if args.legacy:
+        seconds = time_call(lambda: legacy_attendance_stats(data), 1)
+        print(f"{'legacy attendance-stats scan':<32} {seconds * 1000:9.1f} ms")
+
+        indexed = {row['id']: (row['total_classes'], row['attended'])
+                   for row in client.get('/api/reports/attendance-stats').get_json()}
+        mismatches = [row for row in legacy_attendance_stats(data) if indexed[row[0]] != row[1:]]
+        print(f"results match legacy scan: {not mismatches}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Throughput of sharded scatter-gather matching as shards are added
+
+Usage (from the backend directory):
+    python benchmarks/bench_shards.py --gallery 200000 --faces 8 --shards 1 2 4
+
+Each shard is a local `python sharding.py --listen` process standing in for
+a node. For every shard count the gallery is partitioned and loaded, then
+frames of --faces random encodings are matched through the coordinator.
+Reported: load time, frames/s and per-frame latency, next to a single
+in-process scan of the whole gallery; every result is checked against that
+scan.
+"""
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('SHARD_AUTHKEY', secrets.token_hex(16))  # Inherited by the shard processes
+
+from sharding import ShardCoordinator, ShardError  # noqa: E402
+
+TOLERANCE = 0.6
+
+
+def brute_force(gallery, ids, names, probes):
+    matches = []
+    for probe in probes:
+        distances = np.linalg.norm(gallery - probe, axis=1)
+        best = int(np.argmin(distances))
+        matches.append((ids[best], names[best], float(distances[best])) if distances[best] <= TOLERANCE else None)
+    return matches
+
+
+def make_frames(gallery, frames, faces, rng):
+    """Half the faces are noisy copies of enrolled students, half are strangers"""
+    result = []
+    for _ in range(frames):
+        known = gallery[rng.integers(0, len(gallery), faces // 2)] + rng.normal(0, 0.02, (faces // 2, 128))
+        strangers = rng.normal(0, 0.3, (faces - faces // 2, 128))
+        result.append(np.vstack([known, strangers]))
+    return result
+
+
+def start_shards(count, base_port):
+    addresses = [f"127.0.0.1:{base_port + i}" for i in range(count)]
+    processes = [subprocess.Popen([sys.executable, os.path.join(BACKEND_DIR, 'sharding.py'), '--listen', address],
+                                  stdout=subprocess.DEVNULL)
+                 for address in addresses]
+    # Wait until every shard accepts connections
+    deadline = time.time() + 20
+    coordinator = ShardCoordinator(addresses)
+    for shard in range(count):
+        while True:
+            try:
+                with coordinator._connections() as connections:
+                    coordinator._conn(connections, shard)
+                break
+            except ShardError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.1)
+    return coordinator, processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--gallery', type=int, default=200000)
+    parser.add_argument('--faces', type=int, default=8, help='faces per frame')
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--base-port', type=int, default=6100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    gallery = rng.normal(0, 0.1, (args.gallery, 128))
+    ids = list(range(1, args.gallery + 1))
+    names = [f"Student {i}" for i in ids]
+    frames = make_frames(gallery, args.frames, args.faces, rng)
+
+    t = time.perf_counter()
+    expected = [brute_force(gallery, ids, names, frame) for frame in frames]
+    local_seconds = time.perf_counter() - t
+    print(f"gallery={args.gallery} faces/frame={args.faces} frames={args.frames}")
+    print(f"{'mode':>10} {'load_s':>8} {'frames/s':>9} {'ms/frame':>9}  matches")
+    print(f"{'local':>10} {'-':>8} {args.frames / local_seconds:9.1f} {local_seconds / args.frames * 1000:9.1f}  reference")
+
+    for count in args.shards:
+        coordinator, processes = start_shards(count, args.base_port)
+        try:
+            t = time.perf_counter()
+            coordinator.load(gallery, ids, names)
+            load_seconds = time.perf_counter() - t
+
+            t = time.perf_counter()
+            results = [coordinator.match(frame, TOLERANCE) for frame in frames]
+            seconds = time.perf_counter() - t
+
+            same = all((a is None and b is None) or (a is not None and b is not None and a[0] == b[0])
+                       for frame_a, frame_b in zip(results, expected) for a, b in zip(frame_a, frame_b))
+            print(f"{f'{count} shards':>10} {load_seconds:8.2f} {args.frames / seconds:9.1f} "
+                  f"{seconds / args.frames * 1000:9.1f}  {'identical' if same else 'DIFFERENT'}")
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait()
+
+
+if __name__ == '__main__':
+    main()
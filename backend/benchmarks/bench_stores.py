@@ -0,0 +1,102 @@
+"""Compare the journaled JSON demo store with the SQLite backend
+
+Usage (from the backend directory):
+    python benchmarks/bench_stores.py --students 1000 --sessions 500
+
+Each backend runs simple_server.py in its own process (the backend is chosen
+by DEMO_STORE_BACKEND at import time) against the same synthetic data file.
+Reported: startup load time, attendance-mark write throughput until durable,
+and latency of the report endpoints.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'benchmarks'))
+
+from bench_reports import REPORTS, make_data  # noqa: E402
+
+
+def run_child(writes, repeat):
+    """Runs inside the per-backend process; prints one JSON line of timings"""
+    started = time.perf_counter()
+    import simple_server
+    load_seconds = time.perf_counter() - started
+
+    client = simple_server.app.test_client()
+    results = {'load_ms': load_seconds * 1000}
+
+    for path in REPORTS:
+        best = float('inf')
+        for _ in range(repeat):
+            t = time.perf_counter()
+            client.get(path)
+            best = min(best, time.perf_counter() - t)
+        results[path] = best * 1000
+
+    # Writes: one active session, many attendance marks, then wait for durability
+    session = client.post('/api/sessions', json={
+        'subject': 'BENCH', 'department': 'Computer Science',
+        'start_time': '2025-01-01 09:00:00', 'end_time': '2025-01-01 10:00:00'
+    }).get_json()
+    client.post(f"/api/sessions/{session['id']}/start")
+    students = simple_server.demo_data['students'][:writes]
+
+    t = time.perf_counter()
+    for student in students:
+        client.post('/api/attendance/mark', json={'student_id': student['id'], 'session_id': session['id']})
+    simple_server.demo_store.flush()
+    write_seconds = time.perf_counter() - t
+    results['writes_per_s'] = len(students) / write_seconds if write_seconds else 0
+
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--students', type=int, default=1000)
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--attendance-rate', type=float, default=0.8)
+    parser.add_argument('--writes', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.writes, args.repeat)
+        return
+
+    data = make_data(args.students, args.sessions, args.attendance_rate)
+    print(f"{args.students} students x {args.sessions} sessions, "
+          f"{len(data['attendance_records'])} attendance records")
+
+    results = {}
+    for backend in ('json', 'sqlite'):
+        with tempfile.TemporaryDirectory() as workdir:
+            with open(os.path.join(workdir, 'demo_data.json'), 'w') as f:
+                json.dump(data, f)
+
+            env = dict(os.environ, DEMO_STORE_BACKEND=backend, PYTHONPATH=BACKEND_DIR)
+            command = [sys.executable, os.path.abspath(__file__), '--child',
+                       '--writes', str(args.writes), '--repeat', str(args.repeat)]
+            if backend == 'sqlite':
+                # First run imports the JSON file; time the second, steady-state start
+                subprocess.run([sys.executable, '-c', 'import simple_server'],
+                               cwd=workdir, env=env, capture_output=True, check=True)
+
+            output = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True, check=True)
+            results[backend] = json.loads(output.stdout.strip().splitlines()[-1])
+
+    print(f"{'':<32} {'json':>10} {'sqlite':>10}")
+    for key in ['load_ms'] + REPORTS + ['writes_per_s']:
+        print(f"{key:<32} {results['json'][key]:>10.1f} {results['sqlite'][key]:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Throughput and recall of tiled detection against whole-frame detection
+
+Usage (from the backend directory):
+    python benchmarks/bench_tiling.py classroom_4k_*.jpg --layouts 2x2 3x2 4x3 --scale 0.5
+    python benchmarks/bench_tiling.py frames/*.png --truth boxes.json
+
+Each image is detected with:
+  - whole 0.25: the whole frame at a quarter size, as locate_faces() does
+  - whole <scale>: the whole frame at the tiling scale, in one process
+  - tiled CxR: TiledDetector with each --layouts entry at that scale,
+    tiles in --workers processes
+
+Recall is the share of reference faces matched by a detection with IoU of
+at least --iou, in full-resolution coordinates. The reference is --truth
+(JSON of image path -> [[top, right, bottom, left], ...]) when given,
+otherwise the whole frame at full resolution with --reference-upsample
+(slow; computed once per image). "extra" counts detections matching no
+reference face, which is where unmerged duplicates would show up.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import cv2  # noqa: E402
+import face_recognition  # noqa: E402
+
+from tiled_detection import TILE_OVERLAP, TiledDetector  # noqa: E402
+
+
+def iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(bottom - top, 0) * max(right - left, 0)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - intersection
+    return intersection / union if union else 0.0
+
+
+def score(found, reference, threshold):
+    """(matched reference faces, unmatched detections), pairing greedily by IoU"""
+    pairs = sorted(((iou(f, r), i, j) for i, f in enumerate(found) for j, r in enumerate(reference)), reverse=True)
+    used_found, used_reference = set(), set()
+    for overlap, i, j in pairs:
+        if overlap < threshold:
+            break
+        if i not in used_found and j not in used_reference:
+            used_found.add(i)
+            used_reference.add(j)
+    return len(used_reference), len(found) - len(used_found)
+
+
+def to_full(locations, scale):
+    return [tuple(int(round(v / scale)) for v in location) for location in locations]
+
+
+def whole_frame(frame, scale, upsample):
+    small = cv2.resize(frame, (0, 0), fx=scale, fy=scale) if scale != 1 else frame
+    rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+    return to_full(face_recognition.face_locations(rgb, number_of_times_to_upsample=upsample), scale)
+
+
+def tiled(detector, layout, upsample):
+    def detect(frame):
+        small = cv2.resize(frame, (0, 0), fx=layout['scale'], fy=layout['scale'])
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        return to_full(detector.locate(rgb, layout, upsample), layout['scale'])
+    return detect
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--layouts', nargs='+', default=['2x2', '3x2', '4x3'], help='COLSxROWS')
+    parser.add_argument('--scale', type=float, default=0.5, help='frame scale before tiling')
+    parser.add_argument('--overlap', type=float, default=TILE_OVERLAP)
+    parser.add_argument('--upsample', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--truth', help='JSON of image path -> full-resolution face boxes')
+    parser.add_argument('--reference-upsample', type=int, default=1)
+    parser.add_argument('--iou', type=float, default=0.4)
+    args = parser.parse_args()
+
+    frames = {path: cv2.imread(path) for path in args.images}
+    missing = [path for path, frame in frames.items() if frame is None]
+    if missing:
+        parser.error(f"can't read {', '.join(missing)}")
+
+    if args.truth:
+        with open(args.truth) as f:
+            truth = json.load(f)
+        reference = {path: [tuple(box) for box in truth.get(path, [])] for path in frames}
+    else:
+        print(f"Reference: whole frame at full resolution, upsample {args.reference_upsample} ...")
+        reference = {path: whole_frame(frame, 1, args.reference_upsample) for path, frame in frames.items()}
+    total_reference = sum(len(boxes) for boxes in reference.values())
+
+    detector = TiledDetector(workers=args.workers)
+    methods = [('whole 0.25', lambda frame: whole_frame(frame, 0.25, args.upsample)),
+               (f"whole {args.scale:g}", lambda frame: whole_frame(frame, args.scale, args.upsample))]
+    for spec in args.layouts:
+        cols, rows = (int(v) for v in spec.lower().split('x'))
+        layout = {'cols': cols, 'rows': rows, 'overlap': args.overlap, 'scale': args.scale}
+        methods.append((f"tiled {cols}x{rows}", tiled(detector, layout, args.upsample)))
+
+    # Start the tile workers before timing anything
+    methods[-1][1](next(iter(frames.values())))
+
+    height, width = next(iter(frames.values())).shape[:2]
+    print(f"{len(frames)} images ({width}x{height}), {total_reference} reference faces, "
+          f"upsample {args.upsample}, {args.workers} workers")
+    print(f"{'method':>12} {'frames/s':>9} {'ms/frame':>9} {'recall':>7} {'extra':>6}")
+    for name, detect in methods:
+        matched = extra = 0
+        t = time.perf_counter()
+        for _ in range(args.repeat):
+            for frame in frames.values():
+                detect(frame)
+        seconds = (time.perf_counter() - t) / (args.repeat * len(frames))
+        for path, frame in frames.items():
+            hits, misses = score(detect(frame), reference[path], args.iou)
+            matched += hits
+            extra += misses
+        recall = matched / total_reference if total_reference else np.nan
+        print(f"{name:>12} {1 / seconds:9.2f} {1000 * seconds:9.1f} {recall:7.1%} {extra:6d}")
+    detector.close()
+
+
+if __name__ == '__main__':
+    main()
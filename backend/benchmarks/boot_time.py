@@ -0,0 +1,82 @@
+"""Measure time from process start to the first HTTP response of a backend server
+
+Usage (from the backend directory):
+    python benchmarks/boot_time.py app.py
+    python benchmarks/boot_time.py app.py --path /api/ready --until-ok
+
+Any HTTP response counts as "up", including a 500 from /api/health when the
+database is unreachable. --until-ok keeps polling until a 2xx response.
+"""
+import argparse
+import os
+import pty
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def wait_for_response(url, until_ok, timeout):
+    """Poll url until it answers; returns (seconds, status)"""
+    started = time.time()
+    while time.time() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                return time.time() - started, response.status
+        except urllib.error.HTTPError as e:
+            if not until_ok:
+                return time.time() - started, e.code
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('script', help='server script to start, e.g. app.py')
+    parser.add_argument('--path', default='/api/health')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--until-ok', action='store_true', help='wait for a 2xx instead of any response')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    url = f"http://127.0.0.1:{args.port}{args.path}"
+    timings = []
+
+    for run in range(args.runs):
+        # Give the server a tty on stdin (Flask-SocketIO refuses to start the
+        # dev server otherwise) and a new session so the reloader child dies too
+        master_fd, slave_fd = pty.openpty()
+        process = subprocess.Popen(
+            [sys.executable, args.script],
+            stdin=slave_fd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        try:
+            seconds, status = wait_for_response(url, args.until_ok, args.timeout)
+        finally:
+            os.killpg(process.pid, signal.SIGTERM)
+            process.wait()
+            os.close(master_fd)
+            os.close(slave_fd)
+
+        if seconds is None:
+            print(f"run {run + 1}: no response within {args.timeout}s")
+            continue
+
+        timings.append(seconds)
+        print(f"run {run + 1}: {seconds * 1000:.0f} ms (HTTP {status})")
+        time.sleep(0.5)
+
+    if timings:
+        print(f"best {min(timings) * 1000:.0f} ms, mean {sum(timings) / len(timings) * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Two-stage matching: PCA-reduced scoring, then exact distances for a shortlist
+
+With CASCADE_DIMS set (e.g. 32), a PCA projection fitted on the enrolled
+gallery scores every candidate in CASCADE_DIMS dimensions first. The score
+is a lower bound on the true distance: the distance between the projections
+combined with the difference of the residual norms (the part of each
+encoding PCA leaves out). Only the CASCADE_SHORTLIST lowest-scoring
+candidates get the exact 128-d distance, and the decision is made on those.
+
+With CASCADE_CERTIFY=1 the shortlist grows until the bound proves nothing
+outside it could be closer (or within TOLERANCE when nothing matched), so
+results are exact at some cost on strangers; otherwise the miss rate is
+whatever bench_cascade.py measures for the gallery.
+
+The projection is reused when the gallery is reloaded, and refitted once
+the gallery has grown or shrunk by CASCADE_REFIT_FRACTION since the fit,
+or the projection captures noticeably less of its variance.
+"""
+import os
+
+import numpy as np
+
+CASCADE_DIMS = int(os.environ.get('CASCADE_DIMS', 0))
+CASCADE_SHORTLIST = int(os.environ.get('CASCADE_SHORTLIST', 64))
+CASCADE_CERTIFY = os.environ.get('CASCADE_CERTIFY', '0') == '1'
+CASCADE_REFIT_FRACTION = float(os.environ.get('CASCADE_REFIT_FRACTION', 0.2))
+CASCADE_REFIT_VARIANCE_DROP = 0.02  # Refit if the captured variance falls by this much
+FIT_SAMPLE_ROWS = 20000
+
+
+class PCAProjection:
+    """Mean and top principal components of a set of encodings"""
+
+    def __init__(self, encodings, dims, rng=None):
+        encodings = np.asarray(encodings, dtype=np.float64)
+        sample = encodings
+        if len(encodings) > FIT_SAMPLE_ROWS:
+            rng = rng or np.random.default_rng(0)
+            sample = encodings[np.sort(rng.choice(len(encodings), FIT_SAMPLE_ROWS, replace=False))]
+        self.mean = sample.mean(axis=0)
+        _, _, vt = np.linalg.svd(sample - self.mean, full_matrices=False)
+        self.components = vt[:dims]
+        self.fitted_rows = len(encodings)
+        self.fitted_variance = self.captured_variance(encodings)
+
+    @property
+    def dims(self):
+        return len(self.components)
+
+    def captured_variance(self, encodings):
+        """Share of the encodings' variance inside the projected subspace"""
+        centered = np.asarray(encodings, dtype=np.float64) - self.mean
+        total = np.sum(np.square(centered))
+        return float(np.sum(np.square(centered @ self.components.T)) / total) if total else 1.0
+
+    def needs_refit(self, encodings):
+        change = abs(len(encodings) - self.fitted_rows) / max(self.fitted_rows, 1)
+        if change > CASCADE_REFIT_FRACTION:
+            return True
+        return self.captured_variance(encodings) < self.fitted_variance - CASCADE_REFIT_VARIANCE_DROP
+
+
+class CascadeMatcher:
+    """Gallery projected for first-stage scoring; exact re-ranking reads the original rows"""
+
+    def __init__(self, encodings, projection, shortlist=CASCADE_SHORTLIST, certify=CASCADE_CERTIFY):
+        self.source = encodings
+        self.projection = projection
+        self.shortlist = shortlist
+        self.certify = certify
+
+        centered = np.asarray(encodings, dtype=np.float64) - projection.mean
+        reduced = centered @ projection.components.T
+        self.reduced = reduced.astype(np.float32)
+        self._reduced_norms = np.sum(np.square(self.reduced), axis=1)
+        self._residual_norms = np.sqrt(np.maximum(np.sum(np.square(centered), axis=1)
+                                                  - np.sum(np.square(reduced), axis=1), 0)).astype(np.float32)
+
+    def lower_bounds(self, probes):
+        """Lower bound of the distance from each probe to every gallery row"""
+        centered = np.asarray(probes, dtype=np.float64) - self.projection.mean
+        reduced = centered @ self.projection.components.T
+        residual = np.sqrt(np.maximum(np.sum(np.square(centered), axis=1) - np.sum(np.square(reduced), axis=1), 0))
+        reduced = reduced.astype(np.float32)
+
+        squared = self._reduced_norms[None, :] - 2 * (reduced @ self.reduced.T)
+        squared += np.sum(np.square(reduced), axis=1)[:, None]
+        squared += np.square(self._residual_norms[None, :] - residual.astype(np.float32)[:, None])
+        # float32 rounding must not push the bound above the true distance
+        return np.sqrt(np.maximum(squared, 0)) * (1 - 1e-5)
+
+    def match(self, probes, tolerance):
+        """Per probe, (gallery index, distance) of the nearest entry if within tolerance, else None"""
+        if len(probes) == 0:
+            return []
+        rows = len(self.reduced)
+        if rows == 0:
+            return [None] * len(probes)
+
+        matches = []
+        for probe, bounds in zip(np.asarray(probes, dtype=np.float64), self.lower_bounds(probes)):
+            k = min(self.shortlist, rows)
+            while True:
+                candidates = np.argpartition(bounds, k - 1)[:k] if k < rows else np.arange(rows)
+                candidates.sort()  # Ties go to the earlier gallery position, as argmin does
+                exact = np.linalg.norm(np.asarray(self.source[candidates], dtype=np.float64) - probe, axis=1)
+                best = int(np.argmin(exact))
+                if not self.certify or k >= rows:
+                    break
+                # Everything outside the shortlist is at least this far away
+                outside = np.partition(bounds, k)[k]
+                if outside >= min(exact[best], tolerance):
+                    break
+                k = min(k * 4, rows)
+            matches.append((int(candidates[best]), float(exact[best])) if exact[best] <= tolerance else None)
+        return matches
+
+
+_cached = (None, None)
+
+
+def cascade_matcher(encodings, dims=CASCADE_DIMS):
+    """CascadeMatcher for these encodings, reusing the last projection until a refit is due"""
+    global _cached
+    source, matcher = _cached
+    if source is encodings and matcher.projection.dims == dims:
+        return matcher
+
+    projection = matcher.projection if matcher is not None and matcher.projection.dims == dims else None
+    if projection is None or projection.needs_refit(encodings):
+        projection = PCAProjection(encodings, dims)
+        print(f"Cascade projection fitted: {dims} dims capture {projection.fitted_variance:.1%} of the variance")
+    matcher = CascadeMatcher(encodings, projection)
+    _cached = (encodings, matcher)
+    return matcher
@@ -0,0 +1,137 @@
+"""Secondary indexes over the in-memory demo store (students, sessions, attendance)"""
+from collections import Counter, defaultdict
+
+from attendance_matrix import AttendanceMatrix
+
+
+def _clean(value):
+    """Normalise a department/subject value the way the reports compare them"""
+    return (value or '').strip()
+
+
+class DemoIndex:
+    """Hash indexes over demo_data, kept in sync by calling the add_/set_ methods on every mutation
+
+    Bulk rewrites of a collection (clears, cleanup, deletes) should call
+    rebuild() afterwards. Lists returned by the query methods keep the
+    order of the underlying demo_data lists.
+    """
+
+    def __init__(self, demo_data):
+        self.rebuild(demo_data)
+
+    def rebuild(self, demo_data):
+        """Rebuild every index from scratch"""
+        self.demo_data = demo_data
+
+        # Positions keep query results in list order; keyed by object identity
+        # because session ids are not guaranteed unique in the demo data
+        self._session_pos = {}
+        self._session_groups = defaultdict(dict)
+        self._sessions_by_id = {}
+        self._student_pos = {}
+        self._students_by_id = {}
+        self._students_by_department = defaultdict(dict)
+
+        self._records_by_pair = {}
+        self._present_by_student = defaultdict(set)
+        self.matrix = AttendanceMatrix()
+
+        for student in demo_data['students']:
+            self.add_student(student)
+        for session in demo_data['sessions']:
+            self.add_session(session)
+        for record in demo_data['attendance_records']:
+            self.add_record(record)
+
+    def add_student(self, student):
+        """Index a student appended to demo_data['students']"""
+        position = len(self._student_pos)
+        self._student_pos[id(student)] = position
+        # First student with an id wins, matching the old next(...) scans
+        self._students_by_id.setdefault(student['id'], student)
+        self._students_by_department[_clean(student.get('department'))][position] = student
+        self.matrix.add_student(student['id'])
+
+    def add_session(self, session):
+        """Index a session appended to demo_data['sessions']"""
+        position = len(self._session_pos)
+        self._session_pos[id(session)] = position
+        self._sessions_by_id.setdefault(session['id'], session)
+        for key in self._session_keys(session):
+            self._session_groups[key][position] = session
+        self.matrix.add_session(session['id'], session.get('status') == 'completed',
+                                _clean(session.get('department')), _clean(session.get('subject')))
+
+    def set_session_status(self, session, status):
+        """Change a session's status and move it between status groups"""
+        position = self._session_pos[id(session)]
+        self._session_groups[('status', session.get('status'))].pop(position, None)
+        session['status'] = status
+        self._session_groups[('status', status)][position] = session
+        # Matrix columns are in list order too, so the position is the column
+        self.matrix.set_completed(position, status == 'completed')
+
+    def add_record(self, record):
+        """Index an attendance record appended to demo_data['attendance_records']"""
+        pair = (record['student_id'], record['session_id'])
+        # Lookups return the first record for a pair, matching the old next(...) scans
+        if pair in self._records_by_pair:
+            return
+        self._records_by_pair[pair] = record
+        if record.get('status') == 'present':
+            self._present_by_student[record['student_id']].add(record['session_id'])
+            self.matrix.mark(record['student_id'], record['session_id'])
+
+    @staticmethod
+    def _session_keys(session):
+        return (
+            ('status', session.get('status')),
+            ('department', _clean(session.get('department'))),
+            ('subject', _clean(session.get('subject')))
+        )
+
+    def sessions(self, status=None, department=None, subject=None):
+        """Sessions matching every given filter, in list order"""
+        keys = [key for key in (('status', status), ('department', department), ('subject', subject))
+                if key[1] is not None]
+        if not keys:
+            return list(self.demo_data['sessions'])
+
+        groups = sorted((self._session_groups.get(key, {}) for key in keys), key=len)
+        smallest, others = groups[0], groups[1:]
+        positions = [pos for pos in smallest if all(pos in group for group in others)]
+        return [smallest[pos] for pos in sorted(positions)]
+
+    def students_in(self, department):
+        """Students whose (stripped) department matches, in list order"""
+        group = self._students_by_department.get(department, {})
+        return [group[pos] for pos in sorted(group)]
+
+    def student(self, student_id):
+        """First student with this id, or None"""
+        return self._students_by_id.get(student_id)
+
+    def session(self, session_id):
+        """First session with this id, or None"""
+        return self._sessions_by_id.get(session_id)
+
+    def record_for(self, student_id, session_id):
+        """First attendance record for a (student, session) pair, or None"""
+        return self._records_by_pair.get((student_id, session_id))
+
+    def count_present(self, student_id, session_id_counts):
+        """Number of sessions in session_id_counts where the student's record is 'present'
+
+        session_id_counts is a Counter of session ids, so duplicated ids are
+        counted once per session just like the per-session scans were.
+        """
+        present = self._present_by_student.get(student_id, ())
+        if len(present) < len(session_id_counts):
+            return sum(session_id_counts.get(session_id, 0) for session_id in present)
+        return sum(count for session_id, count in session_id_counts.items() if session_id in present)
+
+
+def session_id_counts(sessions):
+    """Counter of session ids, for DemoIndex.count_present"""
+    return Counter(session['id'] for session in sessions)
@@ -0,0 +1,260 @@
+"""JSON demo store backed by an append-only operation journal
+
+Mutations are applied to the in-memory dict immediately and appended to
+``<data file>.journal`` by a single writer thread, which batches everything
+that arrives within JOURNAL_COMMIT_INTERVAL into one write + fsync (group
+commit). Every JOURNAL_COMPACT_OPS operations the writer dumps a snapshot to
+the data file (atomic replace) and truncates the journal.
+
+Each journal line carries a sequence number and the snapshot records the last
+sequence it contains (``_journal_seq``), so recovery is: load the snapshot,
+replay journal lines with a higher sequence, and ignore a torn final line.
+"""
+import atexit
+import copy
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single process is assumed
+    fcntl = None
+
+JOURNAL_COMMIT_INTERVAL = float(os.environ.get('JOURNAL_COMMIT_INTERVAL', 0.05))
+JOURNAL_COMPACT_OPS = int(os.environ.get('JOURNAL_COMPACT_OPS', 1000))
+JOURNAL_COMPACT_SECONDS = float(os.environ.get('JOURNAL_COMPACT_SECONDS', 300))
+SEQ_KEY = '_journal_seq'
+# Dict collections keyed by student id; JSON object keys come back as strings
+INT_KEYED = ('student_images',)
+
+
+def _apply(data, op, key, args):
+    """Apply one journal operation to the data dict"""
+    if op == 'append':
+        data[key].append(args[0])
+    elif op == 'update':
+        position, fields = args
+        data[key][position].update(fields)
+    elif op == 'replace':
+        data[key] = args[0]
+    elif op == 'set_entry':
+        entry_key, value = args
+        data[key][entry_key] = value
+    elif op == 'append_entry':
+        entry_key, item = args
+        data[key].setdefault(entry_key, []).append(item)
+    else:
+        raise ValueError(f"Unknown journal operation: {op}")
+
+
+class DemoStore:
+    """Demo data dict with journaled mutations; read through .data, write through the methods"""
+
+    def __init__(self, data_file, default_data):
+        self.data_file = data_file
+        self.journal_file = data_file + '.journal'
+        self.lock_file = data_file + '.lock'
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._pending = []
+        self._seq = 0
+        self._durable_seq = 0
+        self._ops_since_snapshot = 0
+        self._last_snapshot = time.time()
+        self._writer = None
+        self._lock_handle = None
+        self._journal = None
+        self._closing = False
+
+        self.data = self._recover(default_data)
+
+    def _recover(self, default_data):
+        """Load the snapshot and replay any journal entries written after it"""
+        try:
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = copy.deepcopy(default_data)
+
+        snapshot_seq = data.pop(SEQ_KEY, 0)
+        for key in INT_KEYED:
+            if key in data:
+                data[key] = {int(entry_key): value for entry_key, value in data[key].items()}
+        self._seq = self._durable_seq = snapshot_seq
+        self._journal_valid_bytes = 0
+        replayed = 0
+
+        try:
+            with open(self.journal_file, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash; everything after it is discarded
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    self._journal_valid_bytes += len(line)
+                    if entry['seq'] <= snapshot_seq:
+                        continue
+                    _apply(data, entry['op'], entry['key'], entry['args'])
+                    self._seq = self._durable_seq = entry['seq']
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+
+        self._ops_since_snapshot = replayed
+        if replayed:
+            print(f"Replayed {replayed} journal entries from {self.journal_file}")
+        return data
+
+    # Mutations
+
+    def append(self, key, item):
+        """Append item to the list data[key]"""
+        self._record('append', key, [item])
+
+    def update(self, key, position, fields):
+        """Update the dict at data[key][position] with fields"""
+        self._record('update', key, [position, fields])
+
+    def replace(self, key, value):
+        """Replace data[key] entirely (clears, filtered rewrites)"""
+        self._record('replace', key, [value])
+
+    def set_entry(self, key, entry_key, value):
+        """Set data[key][entry_key] = value on a dict collection"""
+        self._record('set_entry', key, [entry_key, value])
+
+    def append_entry(self, key, entry_key, item):
+        """Append item to the list data[key][entry_key]"""
+        self._record('append_entry', key, [entry_key, item])
+
+    def _record(self, op, key, args):
+        with self._cond:
+            self._ensure_writer()
+            _apply(self.data, op, key, args)
+            self._seq += 1
+            # Serialize now so later in-place edits can't leak into this entry
+            line = json.dumps({'seq': self._seq, 'op': op, 'key': key, 'args': args}, default=str)
+            self._pending.append(line + '\n')
+            self._cond.notify()
+
+    # Writer
+
+    def _ensure_writer(self):
+        """Start the single writer on first mutation (the reloader parent never writes)"""
+        if self._writer is not None:
+            return
+
+        self._lock_handle = open(self.lock_file, 'w')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise RuntimeError(f"{self.data_file} is already being written by another process")
+
+        self._journal = open(self.journal_file, 'ab')
+        # Drop a torn tail left by a crash before appending after it
+        self._journal.truncate(self._journal_valid_bytes)
+
+        self._writer = threading.Thread(target=self._run_writer, daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _run_writer(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closing, timeout=JOURNAL_COMPACT_SECONDS)
+                closing = self._closing
+
+            if not closing:
+                # Let concurrent handlers pile onto the same commit
+                time.sleep(JOURNAL_COMMIT_INTERVAL)
+
+            self._commit()
+
+            snapshot_due = self._ops_since_snapshot >= JOURNAL_COMPACT_OPS or (
+                self._ops_since_snapshot and time.time() - self._last_snapshot >= JOURNAL_COMPACT_SECONDS)
+            if snapshot_due or (closing and self._ops_since_snapshot):
+                self._compact()
+
+            if closing:
+                return
+
+    def _commit(self):
+        """Write all pending entries with a single fsync"""
+        with self._cond:
+            batch, self._pending = self._pending, []
+            batch_seq = self._seq
+        if not batch:
+            return
+
+        self._journal.write(''.join(batch).encode())
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+        with self._cond:
+            self._durable_seq = batch_seq
+            self._ops_since_snapshot += len(batch)
+            self._cond.notify_all()
+
+    def _compact(self):
+        """Write a snapshot atomically, then truncate the journal"""
+        with self._cond:
+            # The dict already reflects every recorded op, including ones still
+            # queued; they are committed to the fresh journal afterwards and
+            # skipped on replay because their seq is <= snapshot_seq
+            snapshot_seq = self._seq
+            snapshot = json.dumps({**self.data, SEQ_KEY: snapshot_seq}, indent=2, default=str)
+
+        tmp_file = f"{self.data_file}.{os.getpid()}.tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.data_file)
+
+        # Entries up to snapshot_seq are now in the snapshot; replay skips them
+        # if we crash before this truncate
+        self._journal.truncate(0)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+
+        self._ops_since_snapshot = 0
+        self._last_snapshot = time.time()
+
+    def flush(self):
+        """Block until every mutation so far is durable in the journal"""
+        with self._cond:
+            if self._writer is None:
+                return
+            target = self._seq
+            self._cond.notify()
+            self._cond.wait_for(lambda: self._durable_seq >= target)
+
+    def close(self):
+        """Commit outstanding entries and write a final snapshot"""
+        with self._cond:
+            if self._writer is None or self._closing:
+                return
+            self._closing = True
+            self._cond.notify()
+        self._writer.join()
+        self._journal.close()
+        self._lock_handle.close()
+
+
+DEMO_STORE_BACKEND = os.environ.get('DEMO_STORE_BACKEND', 'json')
+DEMO_SQLITE_PATH = os.environ.get('DEMO_SQLITE_PATH', 'demo_data.sqlite3')
+
+
+def open_demo_store(data_file, default_data):
+    """Open the configured backend: the journaled JSON file or SQLite (imports data_file on first use)"""
+    if DEMO_STORE_BACKEND == 'sqlite':
+        from sqlite_store import SQLiteStore
+        return SQLiteStore(DEMO_SQLITE_PATH, default_data, import_from=data_file)
+    return DemoStore(data_file, default_data)
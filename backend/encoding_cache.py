@@ -0,0 +1,122 @@
+"""Persistent cache of face encodings keyed by image content and encoder settings"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+ENCODING_CACHE_PATH = os.environ.get('ENCODING_CACHE_PATH', './encoding_cache.db')
+ENCODING_CACHE_MAX_ENTRIES = int(os.environ.get('ENCODING_CACHE_MAX_ENTRIES', 50000))
+
+
+class EncodingCache:
+    """SQLite-backed LRU cache mapping (image hash, encoder config) to a face encoding
+
+    Images in which no face was found are cached too, so they are not
+    re-run through the detector on every rebuild.
+    """
+
+    def __init__(self, path=ENCODING_CACHE_PATH, max_entries=ENCODING_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS encoding_cache (
+                cache_key TEXT PRIMARY KEY,
+                encoding BLOB,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_used ON encoding_cache(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(image_bytes, config):
+        """Build the cache key from the image content hash and encoder configuration"""
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        config_str = ';'.join(f"{k}={config[k]}" for k in sorted(config))
+        return f"{digest}|{config_str}"
+
+    def lookup(self, key):
+        """Return (found, encoding); encoding is None when the image had no face"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT encoding FROM encoding_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return False, None
+
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE encoding_cache SET last_used = ? WHERE cache_key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+
+        if row[0] is None:
+            return True, None
+        return True, np.frombuffer(row[0], dtype=np.float64).copy()
+
+    def store(self, key, encoding):
+        """Store an encoding (or None for 'no face found') and evict old entries if needed"""
+        blob = None if encoding is None else np.asarray(encoding, dtype=np.float64).tobytes()
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO encoding_cache (cache_key, encoding, last_used) VALUES (?, ?, ?)",
+                (key, blob, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def get_or_compute(self, image_bytes, config, compute):
+        """Return the cached encoding for these bytes, calling compute() on a miss"""
+        key = self.make_key(image_bytes, config)
+        found, encoding = self.lookup(key)
+        if found:
+            return encoding
+
+        encoding = compute()
+        self.store(key, encoding)
+        return encoding
+
+    def _evict(self):
+        """Drop least recently used entries once the cache grows past max_entries"""
+        count = self._conn.execute("SELECT COUNT(*) FROM encoding_cache").fetchone()[0]
+        if count <= self.max_entries:
+            return
+
+        # Evict down to 90% so we don't pay for a delete on every insert
+        target = int(self.max_entries * 0.9)
+        excess = count - target
+        self._conn.execute("""
+            DELETE FROM encoding_cache WHERE cache_key IN (
+                SELECT cache_key FROM encoding_cache ORDER BY last_used ASC LIMIT ?
+            )
+        """, (excess,))
+        self.evictions += excess
+
+    def stats(self):
+        """Hit/miss statistics and current size"""
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM encoding_cache").fetchone()[0]
+
+        lookups = self.hits + self.misses
+        return {
+            'entries': size,
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,178 @@
+"""Per-camera rings of decoded frames in shared memory
+
+Passing a decoded frame to another process through a multiprocessing queue
+pickles it, pushes it through a pipe and unpickles it: three copies of
+~6 MB per 1080p frame. A FrameRing is FRAME_RING_SLOTS fixed-size frame
+slots in one shared memory block. The producer writes a frame straight into
+the next slot (decoding into it where the decoder can take an output
+array) and sends consumers a FrameHandle: ring name, frame number and slot,
+about a hundred bytes pickled. Consumers map the ring once and read the
+slot in place.
+
+The producer never waits: slot n % slots is simply overwritten, oldest
+first. Each slot's state is the number of the frame committed in it, or
+-(n + 2) while frame n is being written. A reader checks the state before
+using the slot (read() returns None when the frame is already gone) and,
+because it reads in place, again afterwards (valid()). If the frame was
+overwritten in between, the result is discarded.
+
+One process creates (and unlinks) a ring; any number attach by name.
+Before Python 3.13 an attaching process registers the block with its
+resource tracker, which unlinks it when that process exits, so consumers
+must be forked from the creator (and so share its tracker), as the ingest
+service's process pool is.
+"""
+import os
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+FRAME_RING_SLOTS = int(os.environ.get('FRAME_RING_SLOTS', 4))
+ATTACHED_RINGS = 32  # Rings a consumer keeps mapped
+HEADER_FIELDS = 8  # magic, slots, height, width, channels, next frame, 2 spare
+MAGIC = 0x46524D52  # 'FRMR'
+ALIGN = 64
+
+FrameHandle = namedtuple('FrameHandle', 'ring frame slot')
+
+
+def _layout(slots, shape):
+    """(byte offset of slot states, of commit times, of frame data; bytes per frame; total size)"""
+    states = HEADER_FIELDS * 8
+    times = states + slots * 8
+    data = -(-(times + slots * 8) // ALIGN) * ALIGN
+    frame_bytes = int(np.prod(shape))
+    return states, times, data, frame_bytes, data + slots * frame_bytes
+
+
+class FrameRing:
+    """Fixed-size uint8 frame slots in shared memory, overwritten oldest first"""
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        self.header = np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=shm.buf)
+        if self.header[0] != MAGIC:
+            raise ValueError(f"Shared memory block {shm.name} is not a frame ring")
+        self.slots = int(self.header[1])
+        self.shape = tuple(int(v) for v in self.header[2:5])
+        states, times, data, frame_bytes, _ = _layout(self.slots, self.shape)
+        self.states = np.ndarray(self.slots, dtype=np.int64, buffer=shm.buf, offset=states)
+        self.times = np.ndarray(self.slots, dtype=np.float64, buffer=shm.buf, offset=times)
+        self.frames = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=data)
+        self.frame_bytes = frame_bytes
+
+    @classmethod
+    def create(cls, shape, slots=FRAME_RING_SLOTS, name=None):
+        """New ring for (height, width, channels) frames, owned (and unlinked) by the caller"""
+        shape = tuple(int(v) for v in shape)
+        if len(shape) != 3:
+            raise ValueError('frame rings hold (height, width, channels) frames')
+        shm = shared_memory.SharedMemory(name=name, create=True, size=_layout(slots, shape)[4])
+        header = np.ndarray(HEADER_FIELDS, dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[1], header[2:5] = slots, shape
+        np.ndarray(slots, dtype=np.int64, buffer=shm.buf, offset=HEADER_FIELDS * 8)[:] = -1
+        header[0] = MAGIC
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # No `track` before Python 3.13; forked consumers share the creator's tracker
+            shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def frames_written(self):
+        return int(self.header[5])
+
+    def begin_write(self):
+        """(frame number, slot array) for the next frame; the slot is invalid until commit()"""
+        frame = int(self.header[5])
+        slot = frame % self.slots
+        self.states[slot] = -(frame + 2)
+        return frame, self.frames[slot]
+
+    def commit(self, frame):
+        """Publish a frame written through begin_write(); its handle for consumers"""
+        slot = frame % self.slots
+        self.times[slot] = time.time()
+        self.states[slot] = frame
+        self.header[5] = frame + 1
+        return FrameHandle(self.name, frame, slot)
+
+    def put(self, image):
+        """Copy a decoded frame into the next slot"""
+        frame, slot = self.begin_write()
+        np.copyto(slot, image)
+        return self.commit(frame)
+
+    def read(self, handle):
+        """The frame's slot array (a view, not a copy), or None if it has been overwritten"""
+        return self.frames[handle.slot] if self.states[handle.slot] == handle.frame else None
+
+    def valid(self, handle):
+        """Whether the frame is still in its slot; check after reading in place"""
+        return self.states[handle.slot] == handle.frame
+
+    def committed_at(self, handle):
+        return float(self.times[handle.slot])
+
+    def latest(self):
+        """Handle of the newest committed frame, or None"""
+        frame = int(self.header[5]) - 1
+        if frame < 0:
+            return None
+        handle = FrameHandle(self.name, frame, frame % self.slots)
+        return handle if self.valid(handle) else None
+
+    def close(self):
+        """Unlink the ring if we own it and unmap it; False (still mapped) while a slot view is held"""
+        if self.owner:
+            self.owner = False
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+        # Every view of a slot has `frames` as its base; unmapping under one would crash its next access
+        if self.frames is not None and sys.getrefcount(self.frames) > 2:
+            return False
+        self.header = self.states = self.times = self.frames = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Older numpy versions keep a buffer export for as long as a view lives
+            return False
+        return True
+
+
+_attached = OrderedDict()
+_unclosed = []  # Evicted rings whose slots were still in use, closed on a later call
+
+
+def attached_ring(name):
+    """The ring with this name, mapped once per process (least recently used ones are closed)"""
+    for ring in list(_unclosed):
+        if ring.close():
+            _unclosed.remove(ring)
+
+    ring = _attached.get(name)
+    if ring is None:
+        ring = _attached[name] = FrameRing.attach(name)
+        while len(_attached) > ATTACHED_RINGS:
+            evicted = _attached.popitem(last=False)[1]
+            if not evicted.close():
+                _unclosed.append(evicted)
+    else:
+        _attached.move_to_end(name)
+    return ring
@@ -0,0 +1,125 @@
+"""Versioned on-disk snapshot of the face gallery, opened with memory mapping
+
+Layout of the snapshot directory:
+
+    CURRENT            name of the live generation directory
+    gen-<n>/meta.json  format version, data version stamp, count
+    gen-<n>/encodings.npy, ids.npy, names.npy
+
+A new generation is written next to the old one and CURRENT is swapped
+atomically, so readers never see a half-written gallery. Every process
+that opens the same generation shares its pages through the OS page cache.
+Pointing GALLERY_SNAPSHOT_DIR at a tmpfs such as /dev/shm keeps those pages
+in shared memory with no disk behind them.
+"""
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+GALLERY_SNAPSHOT_DIR = os.environ.get('GALLERY_SNAPSHOT_DIR', './gallery_snapshot')
+SNAPSHOT_FORMAT_VERSION = 1
+ENCODING_DIM = 128
+KEEP_GENERATIONS = 2
+
+
+def current_generation(directory):
+    """Return the name of the live generation directory, or None
+
+    Generation names only ever move forward, so workers compare this
+    against the generation they have mapped to notice a new gallery.
+    """
+    try:
+        with open(os.path.join(directory, 'CURRENT'), 'r') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_gallery_snapshot(directory, data_version):
+    """Open the snapshot if it matches data_version; returns (encodings, ids, names) or None"""
+    current = load_current_gallery(directory, data_version)
+    return current[1] if current else None
+
+
+def load_current_gallery(directory, data_version=None):
+    """Open the live generation; returns (generation, (encodings, ids, names)) or None
+
+    With data_version=None any valid generation is accepted: that is how
+    workers adopt a gallery another process has just published.
+    """
+    generation = current_generation(directory)
+    if not generation:
+        return None
+
+    gen_dir = os.path.join(directory, generation)
+    try:
+        with open(os.path.join(gen_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    if data_version is not None and meta.get('data_version') != data_version:
+        return None
+
+    try:
+        encodings = np.load(os.path.join(gen_dir, 'encodings.npy'), mmap_mode='r')
+        ids = np.load(os.path.join(gen_dir, 'ids.npy'), mmap_mode='r')
+        names = np.load(os.path.join(gen_dir, 'names.npy'), mmap_mode='r')
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Gallery snapshot {gen_dir} is unreadable: {e}")
+        return None
+
+    if len(encodings) != meta.get('count') or len(ids) != len(encodings) or len(names) != len(encodings):
+        return None
+
+    return generation, (encodings, ids, names)
+
+
+def save_gallery_snapshot(directory, encodings, ids, names, data_version):
+    """Write a new snapshot generation and make it current"""
+    os.makedirs(directory, exist_ok=True)
+
+    encodings = np.asarray(encodings, dtype=np.float64).reshape(-1, ENCODING_DIM)
+    ids = np.asarray(ids)
+    # Fixed-width unicode keeps the names array memory-mappable (no pickled objects)
+    names = np.asarray(names, dtype=str) if len(names) else np.empty(0, dtype='<U1')
+
+    generation = f"gen-{time.time_ns()}-{os.getpid()}"
+    gen_dir = os.path.join(directory, generation)
+    os.makedirs(gen_dir)
+
+    np.save(os.path.join(gen_dir, 'encodings.npy'), encodings)
+    np.save(os.path.join(gen_dir, 'ids.npy'), ids)
+    np.save(os.path.join(gen_dir, 'names.npy'), names)
+
+    meta = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'data_version': data_version,
+        'count': len(encodings),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+    with open(os.path.join(gen_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    # Swap the CURRENT pointer atomically
+    pointer_tmp = os.path.join(directory, f"CURRENT.{os.getpid()}.tmp")
+    with open(pointer_tmp, 'w') as f:
+        f.write(generation)
+    os.replace(pointer_tmp, os.path.join(directory, 'CURRENT'))
+
+    _prune_generations(directory, generation)
+
+
+def _prune_generations(directory, current):
+    """Remove old generations; open memory maps stay valid after unlink"""
+    generations = sorted(
+        (name for name in os.listdir(directory) if name.startswith('gen-') and name != current),
+        key=lambda name: os.path.getmtime(os.path.join(directory, name))
+    )
+    for name in generations[:max(0, len(generations) - (KEEP_GENERATIONS - 1))]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
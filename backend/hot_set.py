@@ -0,0 +1,146 @@
+"""Per-room hot sets of recently recognized students
+
+The same few dozen students turn up in a room session after session. With
+HOT_SET_SIZE set, each room (or camera, for frames without a scheduled
+room) keeps the students recognized there most recently, at most
+HOT_SET_SIZE of them and none unseen for longer than HOT_SET_WINDOW_SECONDS.
+A face is matched against those students' gallery rows first and accepted
+there when its distance is at least HOT_SET_MARGIN under TOLERANCE and the
+runner-up is at least HOT_SET_MARGIN further away. Anything else (no close
+hot match, or two close ones) goes to the full gallery matcher.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+HOT_SET_SIZE = int(os.environ.get('HOT_SET_SIZE', 0))
+HOT_SET_WINDOW_SECONDS = float(os.environ.get('HOT_SET_WINDOW_SECONDS', 8 * 24 * 3600))
+HOT_SET_MARGIN = float(os.environ.get('HOT_SET_MARGIN', 0.1))
+
+
+class HotSet:
+    """LRU of student ids with last-seen times, and their gallery rows as one small matrix"""
+
+    def __init__(self, size, window_seconds):
+        self.size = size
+        self.window_seconds = window_seconds
+        self.students = OrderedDict()  # student_id -> last seen, least recent first
+        self.faces = 0
+        self.hits = 0
+        self._matrix = None  # (gallery, version, rows, encodings, student ids)
+        self._version = 0
+
+    def touch(self, student_id, now):
+        self.students[student_id] = now
+        self.students.move_to_end(student_id)
+        while len(self.students) > self.size:
+            self.students.popitem(last=False)
+        self._version += 1
+
+    def expire(self, now):
+        while self.students:
+            student_id, last_seen = next(iter(self.students.items()))
+            if now - last_seen <= self.window_seconds:
+                break
+            del self.students[student_id]
+            self._version += 1
+
+    def rows(self, gallery, gallery_ids, rows_by_student):
+        """(gallery rows, their encodings, their student ids) for the hot students, rebuilt when either changes"""
+        cached = self._matrix
+        if cached is None or cached[0] is not gallery or cached[1] != self._version:
+            rows = np.array([row for student_id in self.students for row in rows_by_student.get(student_id, ())],
+                            dtype=np.int64)
+            rows.sort()
+            cached = self._matrix = (gallery, self._version, rows, np.asarray(gallery[rows], dtype=np.float64),
+                                     np.asarray(gallery_ids)[rows].astype(np.int64))
+        return cached[2:]
+
+
+class HotSetCache:
+    """Hot sets by room, with the gallery-row index they need"""
+
+    def __init__(self, size=HOT_SET_SIZE, window_seconds=HOT_SET_WINDOW_SECONDS, margin=HOT_SET_MARGIN):
+        self.size = size
+        self.window_seconds = window_seconds
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._sets = {}
+        self._index = (None, {})
+        self.stats = {'faces': 0, 'hits': 0, 'candidates': 0}
+
+    def _rows_by_student(self, gallery, gallery_ids):
+        source, rows_by_student = self._index
+        if source is not gallery:
+            rows_by_student = {}
+            for row, student_id in enumerate(gallery_ids):
+                rows_by_student.setdefault(int(student_id), []).append(row)
+            self._index = (gallery, rows_by_student)
+        return rows_by_student
+
+    def match(self, key, face_encodings, gallery, gallery_ids, gallery_names, tolerance, match_full, now=None):
+        """Matches like match_full's, trying the room's hot set first and falling back per face"""
+        now = now or time.time()
+        with self._lock:
+            hot = self._sets.get(key)
+            if hot is None:
+                hot = self._sets[key] = HotSet(self.size, self.window_seconds)
+            hot.expire(now)
+            rows, encodings, row_ids = hot.rows(gallery, gallery_ids, self._rows_by_student(gallery, gallery_ids))
+
+        matches = [None] * len(face_encodings)
+        misses = []
+        for position, face_encoding in enumerate(face_encodings):
+            if len(rows):
+                distances = np.linalg.norm(encodings - face_encoding, axis=1)
+                nearest = int(np.argmin(distances))
+                best = distances[nearest]
+                # The runner-up is the closest other student, not another photo of the same one
+                others = distances[row_ids != row_ids[nearest]]
+                runner_up = others.min() if len(others) else np.inf
+                if best <= tolerance - self.margin and runner_up - best >= self.margin:
+                    row = rows[nearest]
+                    matches[position] = (int(gallery_ids[row]), str(gallery_names[row]), float(best))
+                    continue
+            misses.append(position)
+
+        if misses:
+            for position, match in zip(misses, match_full([face_encodings[i] for i in misses],
+                                                          gallery, gallery_ids, gallery_names)):
+                matches[position] = match
+
+        with self._lock:
+            for match in matches:
+                if match is not None:
+                    hot.touch(match[0], now)
+            hits = len(face_encodings) - len(misses)
+            hot.faces += len(face_encodings)
+            hot.hits += hits
+            self.stats['faces'] += len(face_encodings)
+            self.stats['hits'] += hits
+            self.stats['candidates'] += len(face_encodings) * len(rows) + len(misses) * len(gallery)
+        return matches
+
+    def clear(self):
+        with self._lock:
+            self._sets.clear()
+
+    def summary(self):
+        with self._lock:
+            faces = self.stats['faces']
+            return {
+                'size': self.size,
+                'window_seconds': self.window_seconds,
+                'margin': self.margin,
+                'faces': faces,
+                'hit_rate': round(self.stats['hits'] / faces, 4) if faces else None,
+                'avg_candidates_per_face': round(self.stats['candidates'] / faces, 1) if faces else None,
+                'rooms': {
+                    str(key): {'students': len(hot.students), 'faces': hot.faces,
+                               'hit_rate': round(hot.hits / hot.faces, 4) if hot.faces else None}
+                    for key, hot in self._sets.items()
+                }
+            }
@@ -0,0 +1,320 @@
+"""Asyncio frame-ingestion service, alongside the Flask API
+
+Speaks the same Socket.IO contract as app.py (`process_frame` in,
+`recognition_result` out) on an aiohttp event loop, so an idle camera
+connection costs a coroutine and a socket instead of a thread. Work per
+frame is split four ways:
+
+    begin   readiness, session, gallery, quality level and regions (thread pool)
+    decode  into the connection's FrameRing slot in shared memory (thread pool)
+    detect  face detection/encoding, CPU-bound (process pool of INGEST_WORKERS)
+    finish  matching and attendance writes, or headcounts (thread pool)
+
+Frames take the same path as in app.py's process_frame: the camera's
+quality level, detection regions and tile layout (tiles run inline in each
+worker, the pool already spreads frames over the cores), and frames of
+headcount sessions are only counted, with `headcount` events emitted.
+
+Recognition workers get a FrameHandle (ring name, frame number, slot) and
+read the decoded frame in place, rather than the frame itself being pickled
+through the pool's pipe.
+
+Flow control is per connection: one frame in flight, and while it runs only
+the newest frame is kept, older ones are dropped (counted in /stats). At
+most INGEST_MAX_INFLIGHT frames are queued on the process pool at once.
+
+Run with PRESENCE_OWNER_ADDRESS and PRESENCE_OWNER_AUTHKEY set to the same
+values as the API workers, so the session started through the API is the
+one frames are tracked in:
+    python ingest_service.py --port 5001
+"""
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker
+
+import socketio
+from aiohttp import web
+
+from frame_ring import FrameRing, attached_ring
+
+INGEST_PORT = int(os.environ.get('INGEST_PORT', 5001))
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', os.cpu_count() or 1))
+INGEST_MAX_INFLIGHT = int(os.environ.get('INGEST_MAX_INFLIGHT', 2 * INGEST_WORKERS))
+
+_pipeline = None  # Set in each process pool worker
+
+
+def _init_worker(pipeline):
+    global _pipeline
+    _pipeline = pipeline
+    _pipeline.load()
+
+
+def _detect(handle, args):
+    ring = attached_ring(handle.ring)
+    frame = ring.read(handle)
+    if frame is None:
+        return 'Frame was overwritten before it was processed'
+    detected = _pipeline.detect(frame, *args)
+    # The frame was read in place; if its slot was rewritten meanwhile the result is unreliable
+    if not ring.valid(handle):
+        return 'Frame was overwritten while it was processed'
+    return detected
+
+
+class AppPipeline:
+    """The recognition steps of app.py, imported in each process that needs them"""
+
+    def load(self):
+        # Workers only detect and encode: no background services, presence link or batcher of their own
+        os.environ['START_BACKGROUND_SERVICES'] = '0'
+        os.environ.pop('PRESENCE_OWNER_ADDRESS', None)
+        os.environ['RECOGNITION_BATCHING'] = '0'
+        import app
+        app.load_recognition_stack()
+        if app.tiled_detector is not None:
+            app.tiled_detector.workers = 1
+
+    def begin(self, data, sid, received_at):
+        """(error result or None, state carried to finish, arguments for detect)"""
+        import app
+        if not (app.is_ready('recognition') and app.is_ready('gallery')):
+            return {'error': 'Recognition is still starting up', 'ready': False}, None, None
+
+        session_id = app.tracking.get_current_session()
+        if not session_id:
+            return {'error': 'No active session'}, None, None
+
+        # Headcount sessions only count faces: no gallery, encodings or matching
+        session = app.get_schedule().get(session_id)
+        counted = session if session and session.get('recognition_mode') == 'headcount' else None
+        gallery = None
+        if counted is None:
+            gallery = app.session_gallery(session_id)
+            if len(gallery[0]) == 0:
+                return {'error': 'No student faces registered'}, None, None
+        if 'frame' not in data:
+            return {'error': 'No frame data provided'}, None, None
+
+        camera_id = app.connection_camera(data, sid)
+        started_at = received_at - app.quality.queued(camera_id, data.get('captured_at'), received_at)
+        profile = app.quality.admit(camera_id, received_at)
+        if profile is None:
+            return {'skipped': True}, None, None
+        regions = app.get_region_masks().lookup(app.session_classroom(session_id), camera_id)
+        state = (session_id, counted, gallery, camera_id, profile, started_at)
+        return None, state, (profile, camera_id, regions, counted is None)
+
+    def decode(self, frame_data, into):
+        """Decode a data-URL frame into the array into(shape) returns; ValueError if it doesn't decode"""
+        import app
+        app.decode_frame(frame_data, into=into)
+
+    def detect(self, frame, profile, camera_id, regions, encode):
+        import app
+        rgb_small_frame, face_locations = app.locate_faces(frame, profile, camera_id, regions)
+        if not encode or not face_locations:
+            return face_locations, []
+        return face_locations, app.encode_faces(rgb_small_frame, face_locations, profile)
+
+    def finish(self, state, face_locations, face_encodings):
+        """(recognition_result, [(event, payload) to broadcast])"""
+        import app
+        session_id, counted, gallery, camera_id, profile, started_at = state
+        events = []
+        if counted is not None:
+            result, event = app.record_headcount(counted, camera_id, face_locations, profile)
+            events.append(('headcount', event))
+        elif not face_locations:
+            result = {'recognized': [], 'total_faces': 0, 'message': 'No faces detected', 'quality': profile['name']}
+        else:
+            result = {
+                'recognized': app.recognize_faces(face_encodings, session_id, *gallery),
+                'total_faces': len(face_locations),
+                'quality': profile['name']
+            }
+        app.quality.observe(camera_id, time.time() - started_at)
+        if counted is not None:
+            app.flush_occupancy()
+        return result, events
+
+    def forget(self, sid):
+        import app
+        app.forget_connection(sid)
+
+
+class _Connection:
+    __slots__ = ('busy', 'pending', 'ring')
+
+    def __init__(self):
+        self.busy = False
+        self.pending = None
+        self.ring = None
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+class IngestService:
+    """Socket.IO server handing frames to the pipeline with per-connection flow control"""
+
+    def __init__(self, pipeline, workers=INGEST_WORKERS, max_inflight=INGEST_MAX_INFLIGHT):
+        self.pipeline = pipeline
+        self.sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+        self.web_app = web.Application()
+        self.sio.attach(self.web_app)
+        self.web_app.router.add_get('/stats', self.handle_stats)
+
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self.process_pool = None
+        self.thread_pool = ThreadPoolExecutor(max_workers=max(4, workers))
+        self.inflight = None
+        self.connections = {}
+        self.stats = {'frames': 0, 'dropped': 0, 'errors': 0, 'connections_total': 0}
+        self.started_at = time.time()
+
+        self.sio.on('connect', self.on_connect)
+        self.sio.on('disconnect', self.on_disconnect)
+        self.sio.on('process_frame', self.on_process_frame)
+
+    async def on_connect(self, sid, environ):
+        self.connections[sid] = _Connection()
+        self.stats['connections_total'] += 1
+        await self.sio.emit('status', {'message': 'Connected to server'}, to=sid)
+
+    async def on_disconnect(self, sid):
+        connection = self.connections.pop(sid, None)
+        self.pipeline.forget(sid)
+        # A busy connection's ring is closed once its frame is done
+        if connection is not None and not connection.busy:
+            connection.close()
+
+    async def on_process_frame(self, sid, data):
+        # Stamped on arrival, so the time a frame waits behind the one in flight counts as latency
+        received_at = time.time()
+        connection = self.connections.get(sid)
+        if connection is None:
+            return
+        if connection.busy:
+            # Keep only the newest frame while one is being processed
+            if connection.pending is not None:
+                self.stats['dropped'] += 1
+            connection.pending = (data, received_at)
+            return
+
+        connection.busy = True
+        try:
+            frame = (data, received_at)
+            while frame is not None:
+                result = await self.process(sid, connection, *frame)
+                await self.sio.emit('recognition_result', result, to=sid)
+                frame, connection.pending = connection.pending, None
+        finally:
+            connection.busy = False
+            if self.connections.get(sid) is not connection:
+                connection.close()
+
+    def decode(self, connection, frame_data):
+        """Decode a frame into the connection's ring (made or remade for its size); a FrameHandle or an error"""
+        written = []
+
+        def into(shape):
+            if connection.ring is None or connection.ring.shape != shape:
+                connection.close()
+                connection.ring = FrameRing.create(shape)
+            frame, slot = connection.ring.begin_write()
+            written.append(frame)
+            return slot
+
+        try:
+            self.pipeline.decode(frame_data, into)
+        except ValueError as e:
+            return str(e)
+        return connection.ring.commit(written[0])
+
+    async def process(self, sid, connection, data, received_at):
+        loop = asyncio.get_running_loop()
+        try:
+            error, state, detect_args = await loop.run_in_executor(self.thread_pool, self.pipeline.begin,
+                                                                   data, sid, received_at)
+            if error is not None:
+                return error
+
+            handle = await loop.run_in_executor(self.thread_pool, self.decode, connection, data['frame'])
+            if isinstance(handle, str):
+                return {'error': handle}
+
+            async with self.inflight:
+                detected = await loop.run_in_executor(self.process_pool, _detect, handle, detect_args)
+            if isinstance(detected, str):
+                return {'error': detected}
+
+            result, events = await loop.run_in_executor(self.thread_pool, self.pipeline.finish, state, *detected)
+            for event, payload in events:
+                await self.sio.emit(event, payload)
+            self.stats['frames'] += 1
+            return result
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f"Error in ingest process_frame: {e}")
+            return {'error': f'Processing error: {str(e)}'}
+
+    async def handle_stats(self, request):
+        elapsed = time.time() - self.started_at
+        return web.json_response({
+            **self.stats,
+            'connections': len(self.connections),
+            'workers': self.workers,
+            'frames_per_second': round(self.stats['frames'] / elapsed, 2) if elapsed else 0
+        })
+
+    def start_workers(self):
+        """Start the recognition worker processes; call before this process starts any thread"""
+        # Workers are forked and share this tracker, so a worker mapping a ring can't unlink it on exit
+        resource_tracker.ensure_running()
+        self.process_pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                initargs=(self.pipeline,))
+        # A fork-based pool forks all of its workers on the first submit, not when they are first needed
+        self.process_pool.submit(int).result()
+
+    async def on_startup(self, web_app):
+        self.inflight = asyncio.Semaphore(self.max_inflight)
+
+    async def on_cleanup(self, web_app):
+        self.process_pool.shutdown(wait=False, cancel_futures=True)
+        self.thread_pool.shutdown(wait=False)
+        for connection in self.connections.values():
+            connection.close()
+
+    def run(self, host='0.0.0.0', port=INGEST_PORT):
+        if self.process_pool is None:
+            self.start_workers()
+        self.web_app.on_startup.append(self.on_startup)
+        self.web_app.on_cleanup.append(self.on_cleanup)
+        web.run_app(self.web_app, host=host, port=port, print=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Asyncio frame-ingestion service')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=INGEST_PORT)
+    parser.add_argument('--workers', type=int, default=INGEST_WORKERS)
+    args = parser.parse_args()
+
+    service = IngestService(AppPipeline(), workers=args.workers, max_inflight=2 * args.workers)
+    # Fork the workers (each imports app.py without its threads) before app.py starts any thread here
+    service.start_workers()
+    # Brings up the recognition stack, gallery and presence link as the API does
+    import app  # noqa: F401
+    print(f"Ingest service on {args.host}:{args.port} with {args.workers} recognition workers")
+    service.run(args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
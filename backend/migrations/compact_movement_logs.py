@@ -0,0 +1,146 @@
+"""Compact movement_logs into presence_intervals
+
+Usage (from the backend directory, same MYSQL_* environment as app.py):
+    python migrations/compact_movement_logs.py --dry-run
+    python migrations/compact_movement_logs.py --archive --measure
+
+Each session's entry/exit rows are merged per student with the same
+debounce as the live tracker (MOVEMENT_DEBOUNCE_SECONDS or --debounce),
+written to presence_intervals and then deleted from movement_logs.
+--archive copies the raw rows to movement_logs_archive first, --keep leaves
+them in movement_logs. Sessions that already have intervals are skipped, so
+the script can be re-run. --measure times the old correlated absence query
+against the interval read on the migrated sessions.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mysql.connector  # noqa: E402
+
+from movement_intervals import (ARCHIVE_TABLE_SQL, INTERVALS_TABLE_SQL,  # noqa: E402
+                                MOVEMENT_DEBOUNCE_SECONDS, compact_events)
+
+db_config = {
+    'host': os.environ.get('MYSQL_HOST', 'localhost'),
+    'user': os.environ.get('MYSQL_USER', 'attendance_user'),
+    'password': os.environ.get('MYSQL_PASSWORD', 'attendance_pass'),
+    'database': os.environ.get('MYSQL_DB', 'attendance_db')
+}
+
+# The per-record absence calculation calculate_attendance_percentages used before
+LEGACY_ABSENCE_QUERY = """
+SELECT ar.id, ar.student_id,
+       (SELECT SUM(TIMESTAMPDIFF(MINUTE,
+           ml1.timestamp,
+           IFNULL((SELECT MIN(ml2.timestamp)
+                  FROM movement_logs ml2
+                  WHERE ml2.student_id = ml1.student_id
+                  AND ml2.session_id = ml1.session_id
+                  AND ml2.movement_type = 'entry'
+                  AND ml2.timestamp > ml1.timestamp), NOW())))
+        FROM movement_logs ml1
+        WHERE ml1.student_id = ar.student_id
+        AND ml1.session_id = ar.session_id
+        AND ml1.movement_type = 'exit') as total_absence_minutes
+FROM attendance_records ar
+WHERE ar.session_id = %s
+"""
+
+INTERVAL_QUERY = """
+SELECT student_id, start_time, end_time FROM presence_intervals
+WHERE session_id = %s
+ORDER BY student_id, start_time
+"""
+
+
+def time_query(cursor, query, session_ids):
+    started = time.perf_counter()
+    for session_id in session_ids:
+        cursor.execute(query, (session_id,))
+        cursor.fetchall()
+    return time.perf_counter() - started
+
+
+def compact_session(cursor, session_id, debounce):
+    """Intervals for one session as (student_id, start, end) rows, plus the raw row count"""
+    cursor.execute("""
+        SELECT student_id, movement_type, timestamp FROM movement_logs
+        WHERE session_id = %s
+        ORDER BY student_id, timestamp, id
+    """, (session_id,))
+    events_by_student = {}
+    raw_rows = 0
+    for student_id, movement_type, timestamp in cursor.fetchall():
+        events_by_student.setdefault(student_id, []).append((movement_type, timestamp))
+        raw_rows += 1
+
+    rows = []
+    for student_id, events in events_by_student.items():
+        for start, end in compact_events(events, debounce):
+            rows.append((student_id, session_id, start, end))
+    return rows, raw_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--debounce', type=int, default=MOVEMENT_DEBOUNCE_SECONDS,
+                        help='merge re-entries within this many seconds of an exit')
+    parser.add_argument('--archive', action='store_true', help='copy raw rows to movement_logs_archive')
+    parser.add_argument('--keep', action='store_true', help='leave the raw rows in movement_logs')
+    parser.add_argument('--measure', action='store_true', help='time the old and new absence queries')
+    parser.add_argument('--dry-run', action='store_true', help='report the compaction without writing')
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**db_config)
+    cursor = conn.cursor()
+    cursor.execute(INTERVALS_TABLE_SQL)
+    cursor.execute(ARCHIVE_TABLE_SQL)
+
+    cursor.execute("SELECT DISTINCT session_id FROM movement_logs")
+    pending = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT DISTINCT session_id FROM presence_intervals")
+    done = {row[0] for row in cursor.fetchall()}
+    session_ids = [session_id for session_id in pending if session_id not in done]
+    print(f"{len(session_ids)} sessions to compact ({len(pending) - len(session_ids)} already have intervals)")
+
+    legacy_seconds = time_query(cursor, LEGACY_ABSENCE_QUERY, session_ids) if args.measure else None
+
+    total_raw = total_intervals = 0
+    for session_id in session_ids:
+        rows, raw_rows = compact_session(cursor, session_id, args.debounce)
+        total_raw += raw_rows
+        total_intervals += len(rows)
+        if args.dry_run:
+            continue
+
+        cursor.executemany("""
+            INSERT INTO presence_intervals (student_id, session_id, start_time, end_time)
+            VALUES (%s, %s, %s, %s)
+        """, rows)
+        if args.archive:
+            cursor.execute("""
+                INSERT INTO movement_logs_archive (student_id, session_id, movement_type, timestamp)
+                SELECT student_id, session_id, movement_type, timestamp FROM movement_logs WHERE session_id = %s
+            """, (session_id,))
+        if not args.keep:
+            cursor.execute("DELETE FROM movement_logs WHERE session_id = %s", (session_id,))
+        conn.commit()
+
+    reduction = (1 - total_intervals / total_raw) * 100 if total_raw else 0
+    print(f"movement_logs rows: {total_raw} -> presence_intervals rows: {total_intervals} ({reduction:.1f}% fewer)")
+
+    if args.measure and not args.dry_run:
+        interval_seconds = time_query(cursor, INTERVAL_QUERY, session_ids)
+        print(f"absence query over {len(session_ids)} sessions: "
+              f"{legacy_seconds * 1000:.1f} ms (movement_logs) -> {interval_seconds * 1000:.1f} ms (intervals)")
+
+    cursor.close()
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
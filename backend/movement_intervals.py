@@ -0,0 +1,75 @@
+"""Movement history stored as merged presence intervals instead of raw entry/exit rows
+
+Each (student, session) pair gets one row per continuous stay: start_time,
+and end_time once the exit monitor decides the student has left (NULL
+while they are still in the room). A re-entry within
+MOVEMENT_DEBOUNCE_SECONDS of the last exit reopens the previous interval
+instead of starting a new one, so doorway flip-flops collapse into a single
+row. With MOVEMENT_ARCHIVE_RAW=1 the raw entry/exit events are also
+appended to movement_logs_archive, which nothing on the request path reads.
+"""
+import os
+
+MOVEMENT_DEBOUNCE_SECONDS = int(os.environ.get('MOVEMENT_DEBOUNCE_SECONDS', 120))
+MOVEMENT_ARCHIVE_RAW = os.environ.get('MOVEMENT_ARCHIVE_RAW', '0') == '1'
+
+INTERVALS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS presence_intervals (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT,
+    session_id INT,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NULL,
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (session_id) REFERENCES class_sessions(id) ON DELETE CASCADE,
+    INDEX idx_intervals_session_student (session_id, student_id, start_time)
+)
+"""
+
+ARCHIVE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS movement_logs_archive (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT,
+    session_id INT,
+    movement_type ENUM('entry', 'exit') NOT NULL,
+    timestamp DATETIME NOT NULL,
+    INDEX idx_archive_session (session_id)
+)
+"""
+
+
+def compact_events(events, debounce_seconds=MOVEMENT_DEBOUNCE_SECONDS):
+    """Merge one student's time-ordered (movement_type, timestamp) events into [start, end] intervals
+
+    Repeated entries while inside and exits while outside are dropped; an
+    entry within debounce_seconds of the previous exit extends that interval.
+    The last interval's end is None if no exit followed it.
+    """
+    intervals = []
+    for movement_type, timestamp in events:
+        inside = bool(intervals) and intervals[-1][1] is None
+        if movement_type == 'entry':
+            if inside:
+                continue
+            if intervals and (timestamp - intervals[-1][1]).total_seconds() <= debounce_seconds:
+                intervals[-1][1] = None
+                continue
+            intervals.append([timestamp, None])
+        elif inside:
+            intervals[-1][1] = timestamp
+    return intervals
+
+
+def absence_minutes(intervals, now):
+    """Whole minutes spent outside between a student's intervals, and after the last one if it closed
+
+    Same measure the movement_logs query used: each exit counts until the
+    next entry (or `now`), truncated to whole minutes per gap.
+    """
+    total = 0
+    for position, (_, end) in enumerate(intervals):
+        if end is None:
+            continue
+        next_start = intervals[position + 1][0] if position + 1 < len(intervals) else now
+        total += int((next_start - end).total_seconds() // 60)
+    return total
@@ -0,0 +1,227 @@
+"""Headcount sessions: face counts per camera instead of identities
+
+Sessions created with recognition_mode 'headcount' (exams, large events)
+only run detection on each frame. Nothing is encoded, matched or marked.
+The count is either the number of faces detected or, with
+HEADCOUNT_TRACKING=1, the number of tracks confirmed over
+HEADCOUNT_MIN_HITS frames and kept through misses for
+HEADCOUNT_TRACK_SECONDS. Tracks are matched to detections by box overlap,
+which smooths over faces the detector drops for a frame or two.
+
+Each camera's counts go into one slot per OCCUPANCY_SLOT_SECONDS (a minute
+by default), keeping the highest count seen in the slot. A series is
+stored as little-endian uint16 per slot (0xFFFF for slots without frames),
+which is 2 bytes per minute per camera. The session's occupancy is the sum
+over cameras. The live total only sums cameras that sent a frame in the
+last HEADCOUNT_STALE_SECONDS and drops disconnected ones, so a camera that
+reconnects under a new id isn't counted twice.
+"""
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+HEADCOUNT_TRACKING = os.environ.get('HEADCOUNT_TRACKING', '0') == '1'
+HEADCOUNT_TRACK_SECONDS = float(os.environ.get('HEADCOUNT_TRACK_SECONDS', 3))
+HEADCOUNT_MIN_HITS = int(os.environ.get('HEADCOUNT_MIN_HITS', 2))
+HEADCOUNT_STALE_SECONDS = float(os.environ.get('HEADCOUNT_STALE_SECONDS', 30))
+HEADCOUNT_TRACK_IOU = 0.3
+OCCUPANCY_SLOT_SECONDS = int(os.environ.get('OCCUPANCY_SLOT_SECONDS', 60))
+OCCUPANCY_FLUSH_SECONDS = float(os.environ.get('OCCUPANCY_FLUSH_SECONDS', 60))
+RECOGNITION_MODES = ('identity', 'headcount')
+NO_SAMPLE = 0xFFFF
+
+OCCUPANCY_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS session_occupancy (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    session_id INT,
+    camera_id VARCHAR(100) NOT NULL,
+    slot_seconds INT NOT NULL,
+    slot_count INT NOT NULL,
+    counts BLOB NOT NULL,
+    peak INT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES class_sessions(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_occupancy (session_id, camera_id)
+)
+"""
+
+SESSION_MODE_COLUMN_SQL = "ALTER TABLE class_sessions ADD COLUMN recognition_mode VARCHAR(20) DEFAULT 'identity'"
+
+
+def counts_to_bytes(counts):
+    return np.asarray(counts, dtype='<u2').tobytes()
+
+
+def counts_from_bytes(data):
+    return np.frombuffer(data, dtype='<u2').copy()
+
+
+def series_list(counts):
+    """Counts as a list, None for slots without frames"""
+    return [None if count == NO_SAMPLE else int(count) for count in counts]
+
+
+def total_series(series_by_camera):
+    """Per-slot sum over cameras (None where no camera had frames)"""
+    if not series_by_camera:
+        return []
+    stacked = np.vstack([np.asarray(counts, dtype=np.int64) for counts in series_by_camera.values()])
+    sampled = stacked != NO_SAMPLE
+    totals = np.where(sampled, stacked, 0).sum(axis=0)
+    return [int(total) if any_sample else None for total, any_sample in zip(totals, sampled.any(axis=0))]
+
+
+def _iou(a, b):
+    top, right, bottom, left = max(a[0], b[0]), min(a[1], b[1]), min(a[2], b[2]), max(a[3], b[3])
+    intersection = max(bottom - top, 0) * max(right - left, 0)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - intersection
+    return intersection / union if union else 0.0
+
+
+class CountTracker:
+    """Greedy IoU tracker over one camera's detections; counts confirmed, live tracks"""
+
+    def __init__(self, track_seconds=HEADCOUNT_TRACK_SECONDS, min_hits=HEADCOUNT_MIN_HITS):
+        self.track_seconds = track_seconds
+        self.min_hits = min_hits
+        self.tracks = []  # [location, last seen, hits]
+
+    def update(self, locations, now):
+        self.tracks = [track for track in self.tracks if now - track[1] <= self.track_seconds]
+        pairs = sorted(((_iou(track[0], location), i, j)
+                        for i, track in enumerate(self.tracks) for j, location in enumerate(locations)), reverse=True)
+        matched_tracks, matched_locations = set(), set()
+        for overlap, i, j in pairs:
+            if overlap < HEADCOUNT_TRACK_IOU:
+                break
+            if i not in matched_tracks and j not in matched_locations:
+                track = self.tracks[i]
+                track[0], track[1], track[2] = locations[j], now, track[2] + 1
+                matched_tracks.add(i)
+                matched_locations.add(j)
+        for j, location in enumerate(locations):
+            if j not in matched_locations:
+                self.tracks.append([location, now, 1])
+        return sum(1 for track in self.tracks if track[2] >= self.min_hits)
+
+
+class SessionOccupancy:
+    """Per-camera count series for one headcount session"""
+
+    def __init__(self, session_id, start_time, duration_minutes, slot_seconds=OCCUPANCY_SLOT_SECONDS):
+        self.session_id = session_id
+        self.start_time = start_time
+        self.slot_seconds = slot_seconds
+        self.slot_count = max(1, math.ceil((duration_minutes or 0) * 60 / slot_seconds))
+        self.counts = {}
+        self.latest = {}
+        self.seen_at = {}
+        self.dirty = False
+        self.flushed_at = time.time()
+
+    def record(self, camera_id, count, when):
+        """Keep the highest count per slot; frames outside the session only update the latest count"""
+        self.latest[camera_id] = count
+        self.seen_at[camera_id] = time.time()
+        slot = int((when - self.start_time).total_seconds() // self.slot_seconds)
+        if 0 <= slot < self.slot_count:
+            counts = self.counts.get(camera_id)
+            if counts is None:
+                counts = self.counts[camera_id] = np.full(self.slot_count, NO_SAMPLE, dtype='<u2')
+            if counts[slot] == NO_SAMPLE or count > counts[slot]:
+                counts[slot] = min(count, NO_SAMPLE - 1)
+                self.dirty = True
+
+    def current(self, now):
+        """Latest count per camera, dropping cameras without frames for HEADCOUNT_STALE_SECONDS"""
+        for camera_id, seen_at in list(self.seen_at.items()):
+            if now - seen_at > HEADCOUNT_STALE_SECONDS:
+                del self.seen_at[camera_id], self.latest[camera_id]
+        return self.latest
+
+    def drop(self, camera_id):
+        self.latest.pop(camera_id, None)
+        self.seen_at.pop(camera_id, None)
+
+
+class HeadcountMonitor:
+    """Live occupancy series for headcount sessions, and a tracker per camera"""
+
+    def __init__(self, tracking=HEADCOUNT_TRACKING):
+        self.tracking = tracking
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._trackers = {}
+        self.frames = 0
+
+    def observe(self, session, camera_id, locations, when):
+        """Count the faces in one frame; (this camera's count, the session's current total)"""
+        with self._lock:
+            if self.tracking:
+                tracker = self._trackers.get(camera_id)
+                if tracker is None:
+                    tracker = self._trackers[camera_id] = CountTracker()
+                count = tracker.update(locations, time.time())
+            else:
+                count = len(locations)
+
+            occupancy = self._sessions.get(session['id'])
+            if occupancy is None:
+                occupancy = self._sessions[session['id']] = SessionOccupancy(
+                    session['id'], session['start_time'], session.get('duration_minutes'))
+            occupancy.record(camera_id, count, when)
+            self.frames += 1
+            return count, sum(occupancy.current(time.time()).values())
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def due(self, now=None):
+        """Sessions with counts not written for OCCUPANCY_FLUSH_SECONDS, marked as flushed"""
+        now = now or time.time()
+        with self._lock:
+            due = [occupancy for occupancy in self._sessions.values()
+                   if occupancy.dirty and now - occupancy.flushed_at >= OCCUPANCY_FLUSH_SECONDS]
+            for occupancy in due:
+                occupancy.dirty = False
+                occupancy.flushed_at = now
+            return due
+
+    def snapshot(self, occupancy):
+        """{camera_id: copy of its counts}, safe to write out while frames keep arriving"""
+        with self._lock:
+            return {camera_id: counts.copy() for camera_id, counts in occupancy.counts.items()}
+
+    def finish(self, session_id):
+        """Remove and return a session's occupancy (None if it had no headcount frames)"""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def forget(self, camera_id):
+        """A camera disconnected: drop its tracker and its count from the live totals (its series stay)"""
+        with self._lock:
+            self._trackers.pop(camera_id, None)
+            for occupancy in self._sessions.values():
+                occupancy.drop(camera_id)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._trackers.clear()
+
+    def summary(self):
+        now = time.time()
+        with self._lock:
+            live = {session_id: occupancy.current(now) for session_id, occupancy in self._sessions.items()}
+            return {
+                'tracking': self.tracking,
+                'frames': self.frames,
+                'sessions': {
+                    str(session_id): {'cameras': dict(latest), 'total': sum(latest.values())}
+                    for session_id, latest in live.items()
+                }
+            }
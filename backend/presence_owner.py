@@ -0,0 +1,137 @@
+"""Presence state shared by every worker process through a single owner
+
+Exit tracking (who was seen when), the current session and the live
+presence timelines only make sense once per server, not once per worker.
+With PRESENCE_OWNER_ADDRESS set (host:port), the first worker to bind
+that address becomes the owner: it keeps the state in-process and serves
+it to the other workers through a multiprocessing manager. If the owner
+goes away, the next worker that fails to reach it takes over the address.
+Without the setting everything stays in-process, as for a single worker.
+
+The manager unpickles what connected clients send, so PRESENCE_OWNER_AUTHKEY
+must be set to a secret shared by the workers; there is no default.
+"""
+import os
+import threading
+from multiprocessing.managers import BaseManager
+
+from presence_timeline import PresenceTracker
+
+PRESENCE_OWNER_ADDRESS = os.environ.get('PRESENCE_OWNER_ADDRESS')
+PRESENCE_OWNER_AUTHKEY = os.environ.get('PRESENCE_OWNER_AUTHKEY', '').encode()
+
+
+class SessionTracking:
+    """Last sighting per student in the current session (replaces the per-process session_tracking dict)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_seen = {}
+        self._current_session_id = None
+
+    def get_current_session(self):
+        return self._current_session_id
+
+    def set_current_session(self, session_id):
+        with self._lock:
+            self._current_session_id = session_id
+
+    def seen(self, student_id, when):
+        """Record a sighting; True if the student wasn't being tracked (a new entry)"""
+        with self._lock:
+            entered = student_id not in self._last_seen
+            self._last_seen[student_id] = when
+            return entered
+
+    def expire(self, now, timeout_seconds):
+        """Stop tracking students unseen for timeout_seconds; returns [(student_id, last_seen)]"""
+        with self._lock:
+            expired = [(student_id, last_seen) for student_id, last_seen in self._last_seen.items()
+                       if (now - last_seen).total_seconds() > timeout_seconds]
+            for student_id, _ in expired:
+                del self._last_seen[student_id]
+            return expired
+
+    def drain(self):
+        """Stop tracking every student; returns [(student_id, last_seen)]"""
+        with self._lock:
+            tracked = list(self._last_seen.items())
+            self._last_seen.clear()
+            return tracked
+
+    def clear(self):
+        with self._lock:
+            self._last_seen.clear()
+
+
+_tracking = SessionTracking()
+_timelines = PresenceTracker()
+
+
+class PresenceManager(BaseManager):
+    pass
+
+
+PresenceManager.register('tracking', callable=lambda: _tracking)
+PresenceManager.register('timelines', callable=lambda: _timelines)
+
+
+def _parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+class PresenceLink:
+    """Handles to the shared tracking/timeline objects, local in the owner and proxies elsewhere"""
+
+    def __init__(self, address=PRESENCE_OWNER_ADDRESS, authkey=PRESENCE_OWNER_AUTHKEY):
+        if address and not authkey:
+            raise RuntimeError('PRESENCE_OWNER_AUTHKEY must be set when PRESENCE_OWNER_ADDRESS is')
+        self.address = _parse_address(address) if address else None
+        self.authkey = authkey
+        self.is_owner = self.address is None
+        self._lock = threading.Lock()
+        self.tracking, self.timelines = _tracking, _timelines
+        if self.address is not None:
+            self._connect()
+
+    def _connect(self):
+        """Become the owner if the address is free, otherwise connect to the owner"""
+        try:
+            server = PresenceManager(address=self.address, authkey=self.authkey).get_server()
+        except OSError:
+            manager = PresenceManager(address=self.address, authkey=self.authkey)
+            manager.connect()
+            self.tracking, self.timelines = manager.tracking(), manager.timelines()
+            self.is_owner = False
+            print(f"Presence state served by owner at {self.address[0]}:{self.address[1]}")
+            return
+
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.tracking, self.timelines = _tracking, _timelines
+        self.is_owner = True
+        print(f"This worker (pid {os.getpid()}) owns presence state on {self.address[0]}:{self.address[1]}")
+
+    def shared(self, target):
+        """Object whose method calls go to the owner's tracking or timelines"""
+        return _SharedObject(self, target)
+
+    def call(self, target, method, *args):
+        """Call tracking/timelines method, reconnecting (or taking over) once if the owner has gone"""
+        try:
+            return getattr(getattr(self, target), method)(*args)
+        except (ConnectionError, EOFError, BrokenPipeError):
+            if self.address is None:
+                raise
+            with self._lock:
+                self._connect()
+            return getattr(getattr(self, target), method)(*args)
+
+
+class _SharedObject:
+    def __init__(self, link, target):
+        self._link = link
+        self._target = target
+
+    def __getattr__(self, method):
+        return lambda *args: self._link.call(self._target, method, *args)
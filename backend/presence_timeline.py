@@ -0,0 +1,148 @@
+"""Per-student presence bitmaps for class sessions
+
+Each session is split into slots of PRESENCE_SLOT_SECONDS (one minute by
+default). Every recognition sets the bit for the slot it falls in, so a
+student's timeline is a single integer used as a bitset: bit n means "seen
+during slot n". Time present is a popcount, late arrival is the lowest set
+bit and absence gaps are runs of zero bits; persisted timelines are the
+bitset's little-endian bytes (8 bytes per hour at minute resolution).
+"""
+import math
+import os
+import re
+import threading
+
+PRESENCE_SLOT_SECONDS = int(os.environ.get('PRESENCE_SLOT_SECONDS', 60))
+MAX_ABSENCE_RATIO = 0.1  # 10% rule
+
+PRESENCE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS presence_timelines (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    session_id INT,
+    student_id INT,
+    slot_seconds INT NOT NULL,
+    slot_count INT NOT NULL,
+    bitmap BLOB NOT NULL,
+    slots_present INT DEFAULT 0,
+    first_slot INT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (session_id) REFERENCES class_sessions(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_timeline (session_id, student_id)
+)
+"""
+
+_ZERO_RUN = re.compile('0+')
+
+
+def popcount(bits):
+    return bin(bits).count('1')
+
+
+def bitmap_to_bytes(bits, slot_count):
+    return bits.to_bytes((slot_count + 7) // 8, 'little')
+
+
+def bitmap_from_bytes(data):
+    return int.from_bytes(data, 'little')
+
+
+def slot_string(bits, slot_count):
+    """'1' / '0' per slot, slot 0 first"""
+    return format(bits, f'0{slot_count}b')[::-1] if slot_count else ''
+
+
+def summarize(bits, slot_count, slot_seconds):
+    """Presence figures for one student's timeline
+
+    Absence is every slot without a sighting, including before the first
+    one (late arrival) and after the last one (left early); status follows
+    the same 10% rule as calculate_attendance_percentages.
+    """
+    minutes_per_slot = slot_seconds / 60
+    slots = slot_string(bits, slot_count)
+    slots_present = popcount(bits)
+    first_slot = slots.find('1') if slots_present else None
+
+    gaps = [[round(match.start() * minutes_per_slot, 2), round(match.end() * minutes_per_slot, 2)]
+            for match in _ZERO_RUN.finditer(slots, first_slot or 0)] if slots_present else []
+
+    absent_slots = slot_count - slots_present
+    percentage = round(slots_present / slot_count * 100, 2) if slot_count else 0
+    if not slots_present:
+        status = 'absent'
+    elif absent_slots > slot_count * MAX_ABSENCE_RATIO:
+        status = 'partial'
+    elif percentage >= 90:
+        status = 'present'
+    else:
+        status = 'late'
+
+    return {
+        'minutes_present': round(slots_present * minutes_per_slot, 2),
+        'absence_minutes': round(absent_slots * minutes_per_slot, 2),
+        'late_minutes': round(first_slot * minutes_per_slot, 2) if first_slot is not None else None,
+        'gaps': gaps,
+        'percentage_present': percentage,
+        'status': status
+    }
+
+
+class SessionTimeline:
+    """Presence bitsets for every student seen in one session"""
+
+    def __init__(self, session_id, start_time, duration_minutes, slot_seconds=PRESENCE_SLOT_SECONDS):
+        self.session_id = session_id
+        self.start_time = start_time
+        self.slot_seconds = slot_seconds
+        self.slot_count = max(1, math.ceil(duration_minutes * 60 / slot_seconds))
+        self.bits = {}
+
+    def mark(self, student_id, when):
+        """Set the slot containing `when`; sightings outside the session are ignored"""
+        slot = int((when - self.start_time).total_seconds() // self.slot_seconds)
+        if 0 <= slot < self.slot_count:
+            self.bits[student_id] = self.bits.get(student_id, 0) | (1 << slot)
+
+    def summary(self, student_id):
+        return summarize(self.bits.get(student_id, 0), self.slot_count, self.slot_seconds)
+
+
+class PresenceTracker:
+    """Live timelines for the active sessions, shared by the recognition path and the API"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def get(self, session_id):
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def has(self, session_id):
+        """Whether a session has a live timeline (without copying it out of the owner)"""
+        with self._lock:
+            return session_id in self._sessions
+
+    def add(self, timeline):
+        """Register a session's timeline unless another thread got there first; True if this one was added"""
+        with self._lock:
+            return self._sessions.setdefault(timeline.session_id, timeline) is timeline
+
+    def mark(self, session_id, student_id, when):
+        """Mark a sighting on the session's timeline; False if the session has none yet"""
+        with self._lock:
+            timeline = self._sessions.get(session_id)
+            if timeline is None:
+                return False
+            timeline.mark(student_id, when)
+            return True
+
+    def finish(self, session_id):
+        """Remove and return a session's timeline (None if it was never started)"""
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
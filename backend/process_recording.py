@@ -0,0 +1,221 @@
+"""Attendance from a recorded lecture instead of a live stream
+
+Usage (from the backend directory):
+    python process_recording.py lecture.mp4 --session-id 12
+    python process_recording.py --batch recordings.txt   # lines: <video> <session_id> [YYYY-MM-DD HH:MM:SS]
+
+Frames are sampled every RECORDING_SAMPLE_SECONDS of video by seeking to
+each sample (nothing in between is decoded). Contiguous runs of samples are
+detected and encoded in RECORDING_WORKERS processes, and the results are
+replayed in video order through the live path: the same matching,
+track_attendance() and exit monitor rules, with the clock set to the
+session start (or --started-at) plus the video offset. The attendance
+records, presence intervals and timelines come out as if the lecture had
+been streamed. A recording that starts before the session's latest
+recorded presence is refused, since replaying it would rewrite intervals
+that are already closed.
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# The replay keeps its own exit tracking; it must not join (or become) the live presence owner
+os.environ.pop('PRESENCE_OWNER_ADDRESS', None)
+# main() loads the recognition stack and gallery itself; no exit monitor or session warm-up here
+os.environ['START_BACKGROUND_SERVICES'] = '0'
+
+import app  # noqa: E402
+from presence_owner import SessionTracking  # noqa: E402
+from schedule_index import SESSION_TIME_FORMAT  # noqa: E402
+
+RECORDING_SAMPLE_SECONDS = float(os.environ.get('RECORDING_SAMPLE_SECONDS', 2))
+RECORDING_WORKERS = int(os.environ.get('RECORDING_WORKERS', os.cpu_count() or 1))
+SAMPLES_PER_TASK = 16
+
+
+def video_duration(path):
+    """Length of a video in seconds (0 if it can't be opened)"""
+    capture = app.cv2.VideoCapture(path)
+    try:
+        fps = capture.get(app.cv2.CAP_PROP_FPS) or 0
+        frames = capture.get(app.cv2.CAP_PROP_FRAME_COUNT) or 0
+        return frames / fps if fps else 0
+    finally:
+        capture.release()
+
+
+def sample_offsets(duration, every):
+    return [i * every for i in range(int(duration // every) + 1) if i * every < duration]
+
+
+def detect_samples(path, offsets):
+    """Worker: seek to each offset and detect faces; [(offset, face_count, encodings)]"""
+    cv2 = app.cv2
+    capture = cv2.VideoCapture(path)
+    results = []
+    try:
+        for offset in offsets:
+            capture.set(cv2.CAP_PROP_POS_MSEC, offset * 1000)
+            ok, frame = capture.read()
+            if not ok:
+                continue
+            face_locations, face_encodings = app.detect_faces_in_frame(frame)
+            results.append((offset, len(face_locations), [np.asarray(encoding) for encoding in face_encodings]))
+    finally:
+        capture.release()
+    return results
+
+
+def check_exits_at(session_tracking, session_id, when):
+    conn = app.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        app.record_exits(cursor, session_tracking, session_id, when)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def session_start(session_id):
+    conn = app.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT start_time FROM class_sessions WHERE id = %s", (session_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    return row[0] if row else None
+
+
+def latest_presence(session_id):
+    """Latest interval start or end recorded for a session (None if there are none)"""
+    conn = app.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        app.ensure_tracking_tables(cursor)
+        cursor.execute("""
+            SELECT MAX(GREATEST(start_time, COALESCE(end_time, start_time)))
+            FROM presence_intervals WHERE session_id = %s
+        """, (session_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    return row[0] if row else None
+
+
+def process_recording(pool, path, session_id, started_at=None, sample_seconds=RECORDING_SAMPLE_SECONDS):
+    """Replay one recording into a session's attendance; returns video seconds processed"""
+    started_at = started_at or session_start(session_id)
+    if started_at is None:
+        raise ValueError(f"Session {session_id} not found")
+    recorded_until = latest_presence(session_id)
+    if recorded_until is not None and started_at < recorded_until:
+        raise ValueError(f"Session {session_id} already has presence recorded until {recorded_until}; "
+                         f"a recording starting at {started_at} would be replayed into it")
+
+    duration = video_duration(path)
+    if not duration:
+        raise ValueError(f"Cannot read video {path}")
+
+    offsets = sample_offsets(duration, sample_seconds)
+    tasks = [offsets[i:i + SAMPLES_PER_TASK] for i in range(0, len(offsets), SAMPLES_PER_TASK)]
+    gallery = app.session_gallery(session_id)
+    session_tracking = SessionTracking()
+    next_check = started_at + timedelta(seconds=app.EXIT_CHECK_SECONDS)
+    marked = set()
+
+    print(f"{path}: {duration / 60:.1f} min of video, {len(offsets)} samples, session {session_id} from {started_at}")
+
+    # map() yields in task order, so the replay stays chronological while later tasks run
+    for results in pool.map(detect_samples, [path] * len(tasks), tasks):
+        for offset, face_count, face_encodings in results:
+            when = started_at + timedelta(seconds=offset)
+            # The exit monitor's checks that would have run before this sample
+            while next_check <= when:
+                check_exits_at(session_tracking, session_id, next_check)
+                next_check += timedelta(seconds=app.EXIT_CHECK_SECONDS)
+
+            if not face_count:
+                continue
+            for match in app.include_walk_ins(face_encodings, gallery[0], app.match_faces(face_encodings, *gallery),
+                                              app.match_faces):
+                if match is not None:
+                    app.track_attendance(match[0], session_id, when, session_tracking)
+                    marked.add(match[0])
+
+    # Checks that would have run until the end of the recording
+    ended_at = started_at + timedelta(seconds=duration)
+    while next_check <= ended_at:
+        check_exits_at(session_tracking, session_id, next_check)
+        next_check += timedelta(seconds=app.EXIT_CHECK_SECONDS)
+
+    # Students still in view when the recording ends leave at their last sighting
+    conn = app.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        app.close_open_intervals(cursor, session_tracking, session_id)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+    app.persist_presence_timelines(session_id)
+    print(f"{path}: {len(marked)} students recognized")
+    return duration
+
+
+def _init_worker():
+    app.load_recognition_stack()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mark attendance from recorded lecture videos')
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--session-id', type=int)
+    parser.add_argument('--started-at', help='wall-clock time of the first frame (default: session start time)')
+    parser.add_argument('--batch', help='file with one "<video> <session_id> [<started_at>]" per line')
+    parser.add_argument('--sample-seconds', type=float, default=RECORDING_SAMPLE_SECONDS)
+    parser.add_argument('--workers', type=int, default=RECORDING_WORKERS)
+    args = parser.parse_args()
+
+    jobs = []
+    if args.batch:
+        with open(args.batch) as f:
+            for line in f:
+                parts = line.split(None, 2)
+                if len(parts) >= 2 and not line.startswith('#'):
+                    jobs.append((parts[0], int(parts[1]), parts[2].strip() if len(parts) > 2 else None))
+    elif args.video and args.session_id:
+        jobs.append((args.video, args.session_id, args.started_at))
+    else:
+        parser.error('give a video and --session-id, or --batch')
+
+    app.load_recognition_stack()
+    app.load_student_encodings()
+
+    total_video = 0
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        for path, session_id, started_at in jobs:
+            if started_at:
+                started_at = datetime.strptime(started_at, SESSION_TIME_FORMAT)
+            try:
+                total_video += process_recording(pool, path, session_id, started_at, args.sample_seconds)
+            except Exception as e:
+                print(f"Error processing {path}: {e}")
+    elapsed = time.time() - started
+
+    print(f"Processed {total_video / 60:.1f} video minutes in {elapsed / 60:.2f} wall-clock minutes "
+          f"({total_video / elapsed if elapsed else 0:.1f} video min per wall-clock min, "
+          f"{args.workers} workers, one frame per {args.sample_seconds:g}s)")
+
+
+if __name__ == '__main__':
+    main()
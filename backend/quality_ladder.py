@@ -0,0 +1,165 @@
+"""Load-adaptive recognition quality, per camera
+
+PROFILES is an ordered ladder from most to least expensive; each profile
+sets the detection scale and upsampling, the landmark model, encoding
+jitters and how many frames per second are analysed (the rest are
+skipped). Level 1 is what the server always used before.
+
+Every analysed frame's latency is fed back per camera. It runs from capture
+to result when the client sends captured_at (epoch ms on its own clock): the
+gap between capture and arrival, less the camera's smallest such gap so far
+(clock offset plus network time), is time the frame spent queued on its way
+in and is added to arrival-to-result. Without captured_at it is arrival to
+result.
+QOS_DOWNGRADE_FRAMES consecutive frames over QOS_TARGET_MS move the camera
+one level down; once all its frames have stayed under half the target for
+QOS_UPGRADE_SECONDS it moves one level up, no higher than QOS_BEST_LEVEL.
+Each move resets both counters, so a camera settles on the best level the
+server can keep up with.
+"""
+import os
+import threading
+import time
+
+QOS_TARGET_MS = float(os.environ.get('QOS_TARGET_MS', 1000))
+QOS_START_LEVEL = int(os.environ.get('QOS_START_LEVEL', 1))
+QOS_BEST_LEVEL = int(os.environ.get('QOS_BEST_LEVEL', 1))  # Upgrades stop here; 0 allows 'high'
+QOS_DOWNGRADE_FRAMES = int(os.environ.get('QOS_DOWNGRADE_FRAMES', 3))
+QOS_UPGRADE_SECONDS = float(os.environ.get('QOS_UPGRADE_SECONDS', 15))
+QOS_IDLE_SECONDS = 600  # Cameras silent this long are forgotten
+QOS_CLOCK_JUMP_SECONDS = 60  # A capture-to-arrival gap this far above the camera's smallest means its clock moved
+
+PROFILES = [
+    {'name': 'high', 'scale': 0.5, 'upsample': 1, 'landmarks': 'large', 'jitters': 2, 'max_fps': 4},
+    {'name': 'standard', 'scale': 0.25, 'upsample': 1, 'landmarks': 'small', 'jitters': 1, 'max_fps': 2},
+    {'name': 'reduced', 'scale': 0.25, 'upsample': 0, 'landmarks': 'small', 'jitters': 1, 'max_fps': 1},
+    {'name': 'low', 'scale': 0.2, 'upsample': 0, 'landmarks': 'small', 'jitters': 1, 'max_fps': 0.5},
+    {'name': 'minimal', 'scale': 0.15, 'upsample': 0, 'landmarks': 'small', 'jitters': 1, 'max_fps': 0.25},
+]
+
+
+class _Camera:
+    __slots__ = ('level', 'latency_ms', 'over', 'calm_since', 'changed_at', 'last_analysed', 'last_seen',
+                 'min_transit', 'frames', 'skipped', 'downgrades', 'upgrades')
+
+    def __init__(self, level, now):
+        self.level = level
+        self.latency_ms = None
+        self.over = 0
+        self.calm_since = now
+        self.changed_at = now
+        self.last_analysed = None
+        self.last_seen = now
+        self.min_transit = None
+        self.frames = 0
+        self.skipped = 0
+        self.downgrades = 0
+        self.upgrades = 0
+
+
+class QualityController:
+    """Current ladder level of each camera, moved by observed frame latency"""
+
+    def __init__(self, profiles=PROFILES, target_ms=QOS_TARGET_MS, start_level=QOS_START_LEVEL,
+                 best_level=QOS_BEST_LEVEL, downgrade_frames=QOS_DOWNGRADE_FRAMES,
+                 upgrade_seconds=QOS_UPGRADE_SECONDS):
+        self.profiles = profiles
+        self.target_ms = target_ms
+        self.best_level = min(max(best_level, 0), len(profiles) - 1)
+        self.start_level = min(max(start_level, self.best_level), len(profiles) - 1)
+        self.downgrade_frames = downgrade_frames
+        self.upgrade_seconds = upgrade_seconds
+        self._lock = threading.Lock()
+        self._cameras = {}
+
+    def _camera(self, camera_id, now):
+        camera = self._cameras.get(camera_id)
+        if camera is None:
+            camera = self._cameras[camera_id] = _Camera(self.start_level, now)
+        camera.last_seen = now
+        return camera
+
+    def admit(self, camera_id, now=None):
+        """Profile to analyse this frame with, or None if the camera's frame rate says skip it"""
+        now = now or time.time()
+        with self._lock:
+            camera = self._camera(camera_id, now)
+            profile = self.profiles[camera.level]
+            # A little slack so a camera sending exactly max_fps isn't skipped on jitter
+            if camera.last_analysed is not None and now - camera.last_analysed < 0.9 / profile['max_fps']:
+                camera.skipped += 1
+                return None
+            camera.last_analysed = now
+            camera.frames += 1
+            return profile
+
+    def queued(self, camera_id, captured_at, now=None):
+        """Seconds a frame waited before it arrived, from the client's captured_at (epoch ms); 0 without one"""
+        now = now or time.time()
+        try:
+            transit = now - float(captured_at) / 1000
+        except (TypeError, ValueError):
+            return 0.0
+        with self._lock:
+            camera = self._camera(camera_id, now)
+            if camera.min_transit is None or transit < camera.min_transit \
+                    or transit - camera.min_transit > QOS_CLOCK_JUMP_SECONDS:
+                camera.min_transit = transit
+            return transit - camera.min_transit
+
+    def observe(self, camera_id, latency_seconds, now=None):
+        """Feed back one analysed frame's latency; may move the camera on the ladder"""
+        now = now or time.time()
+        latency_ms = latency_seconds * 1000
+        with self._lock:
+            camera = self._camera(camera_id, now)
+            camera.latency_ms = latency_ms if camera.latency_ms is None else 0.7 * camera.latency_ms + 0.3 * latency_ms
+
+            if latency_ms > self.target_ms:
+                camera.over += 1
+                camera.calm_since = None
+            else:
+                camera.over = 0
+                if latency_ms > self.target_ms / 2:
+                    camera.calm_since = None
+                elif camera.calm_since is None:
+                    camera.calm_since = now
+
+            if camera.over >= self.downgrade_frames and camera.level < len(self.profiles) - 1:
+                self._move(camera, camera.level + 1, now)
+                camera.downgrades += 1
+            elif (camera.calm_since is not None and camera.level > self.best_level
+                  and now - max(camera.calm_since, camera.changed_at) >= self.upgrade_seconds):
+                self._move(camera, camera.level - 1, now)
+                camera.upgrades += 1
+
+    def _move(self, camera, level, now):
+        camera.level = level
+        camera.changed_at = now
+        camera.over = 0
+        camera.calm_since = now
+
+    def forget(self, camera_id):
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def summary(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            for camera_id in [camera_id for camera_id, camera in self._cameras.items()
+                              if now - camera.last_seen > QOS_IDLE_SECONDS]:
+                del self._cameras[camera_id]
+            cameras = {
+                str(camera_id): {
+                    'level': camera.level,
+                    'profile': self.profiles[camera.level]['name'],
+                    'latency_ms': round(camera.latency_ms, 1) if camera.latency_ms is not None else None,
+                    'frames': camera.frames,
+                    'skipped': camera.skipped,
+                    'downgrades': camera.downgrades,
+                    'upgrades': camera.upgrades,
+                    'level_since': round(now - camera.changed_at, 1)
+                }
+                for camera_id, camera in self._cameras.items()
+            }
+        return {'target_ms': self.target_ms, 'profiles': self.profiles, 'cameras': cameras}
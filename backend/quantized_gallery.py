@@ -0,0 +1,112 @@
+"""Reduced-precision copy of the gallery for matching
+
+With GALLERY_PRECISION=float16 or int8, matching scans a compact copy of
+the gallery instead of the float64 encodings: 2 or 1 bytes per value
+instead of 8. int8 uses per-dimension scaling (each dimension's range
+mapped onto -127..127). Scans convert CHUNK_ROWS rows at a time to float32,
+so the temporaries stay in cache and BLAS does the work.
+
+Quantization moves every distance by at most `error_bound`. All candidates
+whose approximate distance is within twice that of the best one are
+re-ranked with exact float32 distances from the original encodings (only
+those rows are read, so a memory-mapped snapshot stays mostly on disk), and
+the match decision is made on the exact distance. Decisions therefore only
+differ from float64 when more than QUANTIZED_SHORTLIST candidates are that
+close to the best.
+"""
+import os
+
+import numpy as np
+
+GALLERY_PRECISION = os.environ.get('GALLERY_PRECISION', 'float64')
+QUANTIZED_SHORTLIST = int(os.environ.get('QUANTIZED_SHORTLIST', 16))
+CHUNK_ROWS = 8192
+PRECISIONS = ('float64', 'float16', 'int8')
+
+if GALLERY_PRECISION not in PRECISIONS:
+    print(f"Unknown GALLERY_PRECISION {GALLERY_PRECISION!r}, matching in float64")
+    GALLERY_PRECISION = 'float64'
+
+
+class QuantizedGallery:
+    """float16 or int8 image of a gallery, matched with an exact re-check of the closest candidates"""
+
+    def __init__(self, encodings, precision):
+        if precision not in ('float16', 'int8'):
+            raise ValueError(f"Unsupported gallery precision {precision!r}")
+        self.source = encodings
+        self.precision = precision
+        source = np.asarray(encodings, dtype=np.float64)
+
+        if precision == 'float16':
+            self.matrix = source.astype(np.float16)
+            self.offset = np.zeros(source.shape[1], dtype=np.float32)
+            self.scale = np.ones(source.shape[1], dtype=np.float32)
+            # Half precision keeps 11 significant bits
+            per_dimension = np.abs(source).max(axis=0) * 2.0 ** -11 if len(source) else 0
+        else:
+            low = source.min(axis=0) if len(source) else np.zeros(source.shape[1])
+            high = source.max(axis=0) if len(source) else np.zeros(source.shape[1])
+            self.offset = ((high + low) / 2).astype(np.float32)
+            self.scale = np.maximum((high - low) / 254, 1e-12).astype(np.float32)
+            self.matrix = np.clip(np.rint((source - self.offset) / self.scale), -127, 127).astype(np.int8)
+            per_dimension = self.scale / 2
+
+        self.error_bound = float(np.sqrt(np.sum(np.square(per_dimension)))) + 1e-6
+        # Squared norms of the dequantized rows, in the scaled space the scan works in
+        weights = np.square(self.scale)
+        self._weights = weights
+        self._norms = np.concatenate([
+            (np.square(self.matrix[start:start + CHUNK_ROWS].astype(np.float32)) @ weights)
+            for start in range(0, len(self.matrix), CHUNK_ROWS)
+        ]) if len(self.matrix) else np.empty(0, dtype=np.float32)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + self._norms.nbytes
+
+    def approximate_distances(self, probes):
+        """Distances from each probe to every row, computed on the quantized matrix"""
+        probes = np.asarray(probes, dtype=np.float32)
+        scaled = (probes - self.offset) / self.scale
+        weighted = (scaled * self._weights).T
+        squared = np.empty((len(probes), len(self.matrix)), dtype=np.float32)
+        for start in range(0, len(self.matrix), CHUNK_ROWS):
+            block = self.matrix[start:start + CHUNK_ROWS].astype(np.float32)
+            squared[:, start:start + len(block)] = -2 * (block @ weighted).T
+        squared += self._norms[None, :]
+        squared += (np.square(scaled) @ self._weights)[:, None]
+        return np.sqrt(np.maximum(squared, 0))
+
+    def match(self, probes, tolerance, shortlist=QUANTIZED_SHORTLIST):
+        """Per probe, (gallery index, exact distance) of the nearest entry if within tolerance, else None"""
+        if len(probes) == 0:
+            return []
+        if len(self.matrix) == 0:
+            return [None] * len(probes)
+
+        approximate = self.approximate_distances(probes)
+        k = min(shortlist, approximate.shape[1])
+        matches = []
+        for probe, distances in zip(np.asarray(probes, dtype=np.float32), approximate):
+            candidates = np.argpartition(distances, k - 1)[:k]
+            candidates = candidates[distances[candidates] <= distances[candidates].min() + 2 * self.error_bound]
+            candidates.sort()  # Ties go to the earlier gallery position, as argmin does
+
+            exact = np.linalg.norm(np.asarray(self.source[candidates], dtype=np.float32) - probe, axis=1)
+            best = int(np.argmin(exact))
+            matches.append((int(candidates[best]), float(exact[best])) if exact[best] <= tolerance else None)
+        return matches
+
+
+_cached = (None, None)
+
+
+def quantized_gallery(encodings, precision=GALLERY_PRECISION):
+    """QuantizedGallery for these encodings, rebuilt only when a different array is passed"""
+    global _cached
+    source, gallery = _cached
+    if source is not encodings or gallery.precision != precision:
+        gallery = QuantizedGallery(encodings, precision)
+        _cached = (encodings, gallery)
+    return gallery
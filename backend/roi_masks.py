@@ -0,0 +1,225 @@
+"""Per-camera regions of interest: where in the frame faces are looked for
+
+Each classroom (and optionally each camera in it) can have polygons in
+frame-relative coordinates, x and y from 0 to 1, so one definition holds
+at any resolution or detection scale. With regions set, detection runs only
+on the bounding boxes of the polygons (padded by ROI_PADDING of the frame
+and merged where they meet), and faces whose centre falls outside every
+polygon are dropped before encoding: the whiteboard and windows are never
+scanned, and people walking past in the corridor are never matched.
+
+Lookup order for a frame is (classroom, camera), then (classroom, any
+camera), then (any classroom, camera); the empty string stands for "any".
+Classrooms are matched as the schedule index matches them (trimmed,
+case-insensitive). Scanned pixels and detection time are counted per
+camera, for cameras without regions too, so the two can be compared.
+Detection CPU time is only measurable for detection in this thread; for
+cameras whose tiles are detected in worker processes the wall time is
+what is reported.
+"""
+import json
+import os
+import threading
+import time
+
+from schedule_index import room_key
+
+ROI_PADDING = float(os.environ.get('ROI_PADDING', 0.05))
+ROI_REFRESH_SECONDS = float(os.environ.get('ROI_REFRESH_SECONDS', 60))
+
+REGIONS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS camera_regions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    classroom VARCHAR(50) NOT NULL DEFAULT '',
+    camera_id VARCHAR(100) NOT NULL DEFAULT '',
+    polygons TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_region (classroom, camera_id)
+)
+"""
+
+
+def parse_polygons(value):
+    """Validated [[(x, y), ...], ...] from a list (or its JSON) of polygons with at least 3 points in 0..1"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, list) or not value:
+        raise ValueError('polygons must be a non-empty list of polygons')
+    polygons = []
+    for polygon in value:
+        if not isinstance(polygon, list) or len(polygon) < 3:
+            raise ValueError('each polygon needs at least 3 [x, y] points')
+        points = []
+        for point in polygon:
+            if not isinstance(point, (list, tuple)) or len(point) != 2:
+                raise ValueError('points must be [x, y] pairs')
+            x, y = float(point[0]), float(point[1])
+            if not (0 <= x <= 1 and 0 <= y <= 1):
+                raise ValueError('point coordinates are fractions of the frame, from 0 to 1')
+            points.append((x, y))
+        polygons.append(points)
+    return polygons
+
+
+def point_in_polygon(x, y, polygon):
+    """Even-odd rule: whether (x, y) lies inside the polygon"""
+    inside = False
+    x1, y1 = polygon[-1]
+    for x2, y2 in polygon:
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+        x1, y1 = x2, y2
+    return inside
+
+
+def crop_boxes(polygons, height, width, padding=ROI_PADDING):
+    """(top, left, bottom, right) pixel boxes covering the polygons, padded and merged where they overlap"""
+    boxes = []
+    for polygon in polygons:
+        xs, ys = [x for x, _ in polygon], [y for _, y in polygon]
+        boxes.append([max(int((min(ys) - padding) * height), 0), max(int((min(xs) - padding) * width), 0),
+                      min(int(round((max(ys) + padding) * height)), height),
+                      min(int(round((max(xs) + padding) * width)), width)])
+
+    # Overlapping crops would scan (and detect) the same pixels twice
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                a, b = boxes[i], boxes[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del boxes[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(box) for box in boxes if box[2] > box[0] and box[3] > box[1]]
+
+
+def centre_inside(location, polygons, height, width):
+    top, right, bottom, left = location
+    x, y = (left + right) / 2 / width, (top + bottom) / 2 / height
+    return any(point_in_polygon(x, y, polygon) for polygon in polygons)
+
+
+class _CameraStats:
+    __slots__ = ('frames', 'masked_frames', 'pixels', 'scanned', 'cpu_frames', 'cpu_seconds', 'wall_seconds',
+                 'faces', 'discarded')
+
+    def __init__(self):
+        self.frames = 0
+        self.masked_frames = 0
+        self.pixels = 0
+        self.scanned = 0
+        self.cpu_frames = 0
+        self.cpu_seconds = 0.0
+        self.wall_seconds = 0.0
+        self.faces = 0
+        self.discarded = 0
+
+
+class RegionMasks:
+    """Configured regions by (classroom, camera id), and per-camera scan statistics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._regions = {}
+        self._cameras = {}
+        self.loaded_at = None
+
+    def rebuild(self, rows):
+        """Replace all regions from (classroom, camera_id, polygons JSON) rows"""
+        regions = {}
+        for classroom, camera_id, polygons in rows:
+            try:
+                regions[(room_key(classroom), camera_id or '')] = parse_polygons(polygons)
+            except ValueError as e:
+                print(f"Ignoring regions for {classroom or '*'}/{camera_id or '*'}: {e}")
+        with self._lock:
+            self._regions = regions
+            self.loaded_at = time.time()
+
+    def set(self, classroom, camera_id, polygons):
+        with self._lock:
+            self._regions[(room_key(classroom), camera_id or '')] = polygons
+
+    def remove(self, classroom, camera_id):
+        with self._lock:
+            return self._regions.pop((room_key(classroom), camera_id or ''), None) is not None
+
+    def lookup(self, classroom, camera_id):
+        """Polygons for a camera in a classroom, or None to scan the whole frame"""
+        classroom, camera_id = room_key(classroom), str(camera_id or '')
+        with self._lock:
+            for key in ((classroom, camera_id), (classroom, ''), ('', camera_id)):
+                if key in self._regions and key != ('', ''):
+                    return self._regions[key]
+        return None
+
+    def locate(self, image, polygons, detect, camera_id, in_process=True):
+        """detect(image) restricted to the polygons' crops, keeping faces centred inside them
+
+        in_process is False when detect() hands the work to other processes,
+        whose CPU time this thread can't see.
+        """
+        height, width = image.shape[:2]
+        started, started_cpu = time.perf_counter(), time.thread_time()
+        if polygons:
+            locations, scanned = [], 0
+            for top, left, bottom, right in crop_boxes(polygons, height, width):
+                scanned += (bottom - top) * (right - left)
+                for t, r, b, l in detect(image[top:bottom, left:right]):
+                    locations.append((t + top, r + left, b + top, l + left))
+            kept = [location for location in locations if centre_inside(location, polygons, height, width)]
+        else:
+            locations = kept = detect(image)
+            scanned = height * width
+        cpu_seconds, wall_seconds = time.thread_time() - started_cpu, time.perf_counter() - started
+
+        with self._lock:
+            stats = self._cameras.get(camera_id)
+            if stats is None:
+                stats = self._cameras[camera_id] = _CameraStats()
+            stats.frames += 1
+            stats.masked_frames += bool(polygons)
+            stats.pixels += height * width
+            stats.scanned += scanned
+            stats.wall_seconds += wall_seconds
+            if in_process:
+                stats.cpu_frames += 1
+                stats.cpu_seconds += cpu_seconds
+            stats.faces += len(kept)
+            stats.discarded += len(locations) - len(kept)
+        return kept
+
+    def forget(self, camera_id):
+        with self._lock:
+            self._cameras.pop(camera_id, None)
+
+    def regions(self):
+        with self._lock:
+            return [{'classroom': classroom, 'camera_id': camera_id, 'polygons': polygons}
+                    for (classroom, camera_id), polygons in sorted(self._regions.items())]
+
+    def summary(self):
+        """Per camera: share of pixels scanned, pixels saved, detection CPU (where measurable) and wall time per frame"""
+        with self._lock:
+            return {
+                'padding': ROI_PADDING,
+                'cameras': {
+                    str(camera_id): {
+                        'frames': stats.frames,
+                        'masked_frames': stats.masked_frames,
+                        'scanned_fraction': round(stats.scanned / stats.pixels, 4) if stats.pixels else None,
+                        'saved_pixels_per_frame': (stats.pixels - stats.scanned) // stats.frames,
+                        'cpu_ms_per_frame': (round(1000 * stats.cpu_seconds / stats.cpu_frames, 2)
+                                             if stats.cpu_frames else None),
+                        'wall_ms_per_frame': round(1000 * stats.wall_seconds / stats.frames, 2),
+                        'faces': stats.faces,
+                        'discarded_outside': stats.discarded,
+                    }
+                    for camera_id, stats in self._cameras.items() if stats.frames
+                }
+            }
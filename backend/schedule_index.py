@@ -0,0 +1,133 @@
+"""In-memory interval index over the class schedule
+
+Answers "which sessions are running in room X at time t" with a centered
+interval tree per classroom (plus one over all rooms): O(log n + k) per
+query, where k is the number of overlapping sessions returned. The trees
+are immutable; rebuild() builds new ones and swaps them in with a single
+assignment, so readers never need a lock.
+"""
+import bisect
+import threading
+import time
+from datetime import datetime
+
+SESSION_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class _Node:
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, center, overlapping, left, right):
+        self.center = center
+        # Entries containing center, sorted both ways so a query can stop early
+        self.by_start = sorted(overlapping, key=lambda entry: entry[0])
+        self.by_end = sorted(overlapping, key=lambda entry: entry[1], reverse=True)
+        self.left = left
+        self.right = right
+
+
+def _build(entries):
+    if not entries:
+        return None
+    endpoints = sorted(point for entry in entries for point in entry[:2])
+    center = endpoints[len(endpoints) // 2]
+
+    left = [entry for entry in entries if entry[1] < center]
+    right = [entry for entry in entries if entry[0] > center]
+    overlapping = [entry for entry in entries if entry[0] <= center <= entry[1]]
+    return _Node(center, overlapping, _build(left), _build(right))
+
+
+def _stab(node, at, found):
+    while node is not None:
+        if at < node.center:
+            for entry in node.by_start:
+                if entry[0] > at:
+                    break
+                found.append(entry)
+            node = node.left
+        elif at > node.center:
+            for entry in node.by_end:
+                if entry[1] < at:
+                    break
+                found.append(entry)
+            node = node.right
+        else:
+            found.extend(node.by_start)
+            return
+
+
+def room_key(room):
+    """Classroom name as rooms are compared: stripped and case-insensitive"""
+    return (room or '').strip().lower()
+
+
+def parse_session_time(value):
+    """datetime for a DB datetime or a 'YYYY-MM-DD HH:MM:SS' string; None if unparseable"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.strptime(value, SESSION_TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+class ScheduleIndex:
+    """Interval trees over sessions, keyed by classroom"""
+
+    def __init__(self):
+        self._all = None
+        self._rooms = {}
+        self._starts = ([], [])
+        self._by_id = {}
+        self._count = 0
+        self._build_lock = threading.Lock()
+        self.built_at = None
+
+    def rebuild(self, sessions):
+        """Index sessions (dicts with start_time, end_time and optionally classroom)"""
+        entries = []
+        for order, session in enumerate(sessions):
+            start = parse_session_time(session.get('start_time'))
+            end = parse_session_time(session.get('end_time'))
+            if start is None or end is None or end < start:
+                continue
+            entries.append((start, end, order, session))
+
+        by_room = {}
+        for entry in entries:
+            by_room.setdefault(room_key(entry[3].get('classroom')), []).append(entry)
+
+        by_start = sorted(entries, key=lambda entry: (entry[0], entry[2]))
+        starts = ([entry[0] for entry in by_start], [entry[3] for entry in by_start])
+
+        by_id = {}
+        for entry in entries:
+            by_id.setdefault(entry[3].get('id'), entry[3])
+
+        with self._build_lock:
+            self._all, self._rooms, self._starts, self._by_id, self._count = (
+                _build(entries), {room: _build(room_entries) for room, room_entries in by_room.items()},
+                starts, by_id, len(entries))
+            self.built_at = time.time()
+
+    def __len__(self):
+        return self._count
+
+    def get(self, session_id):
+        """Indexed session by id, or None"""
+        return self._by_id.get(session_id)
+
+    def active(self, at=None, room=None):
+        """Sessions with start_time <= at <= end_time, latest start first; room=None means every room"""
+        at = at or datetime.now()
+        tree = self._all if room is None else self._rooms.get(room_key(room))
+        found = []
+        _stab(tree, at, found)
+        found.sort(key=lambda entry: (-entry[0].timestamp(), entry[2]))
+        return [entry[3] for entry in found]
+
+    def starting(self, after, before):
+        """Sessions with after <= start_time < before, earliest first"""
+        start_times, sessions = self._starts
+        return sessions[bisect.bisect_left(start_times, after):bisect.bisect_left(start_times, before)]
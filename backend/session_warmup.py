@@ -0,0 +1,172 @@
+"""Ahead-of-time recognition contexts for upcoming class sessions
+
+A background loop looks WARMUP_LOOKAHEAD_SECONDS ahead in the schedule and
+builds each upcoming session's context before it starts: the candidate
+gallery, pre-faulted so the first frame doesn't wait on page faults (the
+gallery rows of the session's roster, or for a session without one a view
+of the shared snapshot mapping, so workers don't each hold a copy), id and
+name lists, the set of students already marked and an empty presence
+timeline. activate() swaps a prepared context in with one dict assignment;
+release() drops it when the session ends.
+
+Prepared contexts are bounded by WARMUP_MAX_CONTEXTS and WARMUP_MAX_MB; when
+over budget the session starting last is evicted (it is rebuilt on the
+next pass, or on demand at activation). The memory budget counts what each
+context holds itself; a view of the shared gallery mapping is not charged
+to every context that uses it.
+"""
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+WARMUP_LOOKAHEAD_SECONDS = int(os.environ.get('WARMUP_LOOKAHEAD_SECONDS', 300))
+WARMUP_POLL_SECONDS = int(os.environ.get('WARMUP_POLL_SECONDS', 30))
+WARMUP_MAX_CONTEXTS = int(os.environ.get('WARMUP_MAX_CONTEXTS', 4))
+WARMUP_MAX_MB = float(os.environ.get('WARMUP_MAX_MB', 256))
+
+
+class SessionContext:
+    """Everything the recognition path needs for one session, built before it starts"""
+
+    def __init__(self, session, gallery, encodings, ids, names, marked, timeline):
+        self.session = session
+        self.session_id = session['id']
+        self.start_time = session['start_time']
+        self.gallery = gallery  # the gallery arrays this was built from, to detect reloads
+        self.shares_gallery = encodings is gallery
+        # Shares the snapshot mapping's pages; touching them now keeps faults off the first frame
+        self.encodings = np.asarray(encodings, dtype=np.float64)
+        if len(self.encodings):
+            self.encodings.sum()
+        self.ids = ids
+        self.names = names
+        self.marked = marked
+        self.timeline = timeline
+        self.built_at = time.time()
+        # A full-gallery context shares the gallery's id/name arrays too
+        self._list_bytes = 0 if self.shares_gallery else sum(
+            sys.getsizeof(values) + sum(map(sys.getsizeof, values)) for values in (ids, names))
+
+    @property
+    def nbytes(self):
+        # Own memory only: a roster's copied encodings and id/name lists, and the marked set
+        encodings = 0 if self.shares_gallery else self.encodings.nbytes
+        return encodings + self._list_bytes + sys.getsizeof(self.marked) + 28 * len(self.marked)
+
+
+class SessionWarmup:
+    """Prepared and active SessionContexts
+
+    build(session) returns a SessionContext; upcoming(after, before) returns
+    the sessions starting in that window; gallery() returns the current
+    gallery object so contexts built from an older one are rebuilt.
+    """
+
+    def __init__(self, build, upcoming, gallery,
+                 lookahead_seconds=WARMUP_LOOKAHEAD_SECONDS, max_contexts=WARMUP_MAX_CONTEXTS,
+                 max_bytes=WARMUP_MAX_MB * 1024 * 1024):
+        self._build = build
+        self._upcoming = upcoming
+        self._gallery = gallery
+        self.lookahead_seconds = lookahead_seconds
+        self.max_contexts = max_contexts
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self._prepared = {}
+        self._active = {}
+        self.stats = {'prepared': 0, 'activated_warm': 0, 'activated_cold': 0, 'evicted': 0}
+
+    def _is_current(self, context):
+        return context.gallery is self._gallery()
+
+    def prepare_upcoming(self, now=None):
+        """Build contexts for sessions starting within the lookahead window, and refresh stale live ones"""
+        now = now or datetime.now()
+        with self._lock:
+            stale = [context.session for context in self._active.values() if not self._is_current(context)]
+        for session in stale:
+            self.activate(session)
+
+        # Only the earliest max_contexts can be kept; building the rest would just evict them again
+        upcoming = self._upcoming(now, now + timedelta(seconds=self.lookahead_seconds))
+        for session in upcoming[:self.max_contexts]:
+            session_id = session['id']
+            with self._lock:
+                existing = self._prepared.get(session_id) or self._active.get(session_id)
+                if existing is not None and self._is_current(existing):
+                    continue
+
+            context = self._build(session)
+            with self._lock:
+                if session_id in self._active:
+                    continue
+                self._prepared[session_id] = context
+                self.stats['prepared'] += 1
+                self._enforce_budget()
+
+    def _enforce_budget(self):
+        """Evict the prepared sessions starting last until within the count and memory limits"""
+        while self._prepared and (
+                len(self._prepared) > self.max_contexts
+                or sum(context.nbytes for context in self._prepared.values()) > self.max_bytes):
+            latest = max(self._prepared.values(), key=lambda context: context.start_time)
+            del self._prepared[latest.session_id]
+            self.stats['evicted'] += 1
+
+    def activate(self, session):
+        """Make a session's context live, building it now if it wasn't prepared (or is stale)"""
+        session_id = session['id']
+        with self._lock:
+            context = self._active.get(session_id)
+            if context is not None and self._is_current(context):
+                return context
+            context = self._prepared.pop(session_id, None)
+
+        warm = context is not None and self._is_current(context)
+        if not warm:
+            context = self._build(session)
+
+        with self._lock:
+            self._active[session_id] = context
+            self.stats['activated_warm' if warm else 'activated_cold'] += 1
+        return context
+
+    def get(self, session_id):
+        """The live context for a session, or None (also None once the gallery has been reloaded)"""
+        context = self._active.get(session_id)
+        if context is not None and self._is_current(context):
+            return context
+        return None
+
+    def release(self, session_id):
+        with self._lock:
+            self._active.pop(session_id, None)
+            self._prepared.pop(session_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._active.clear()
+            self._prepared.clear()
+
+    def summary(self):
+        with self._lock:
+            return {
+                **self.stats,
+                'prepared_sessions': sorted(self._prepared),
+                'active_sessions': sorted(self._active),
+                'prepared_mb': round(sum(c.nbytes for c in self._prepared.values()) / (1024 * 1024), 2)
+            }
+
+    def run(self, poll_seconds=WARMUP_POLL_SECONDS):
+        """Background loop; never returns"""
+        while True:
+            try:
+                self.prepare_upcoming()
+            except Exception as e:
+                print(f"Session warm-up failed: {e}")
+            time.sleep(poll_seconds)
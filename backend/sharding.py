@@ -0,0 +1,319 @@
+"""Scatter-gather face matching across recognition shards
+
+With RECOGNITION_SHARDS set (comma-separated host:port list), the gallery
+is partitioned across shard nodes by rendezvous hashing on student id, so
+adding or removing a shard only moves the students that hash to it. For
+each frame the coordinator sends every face encoding to all shards at once,
+each shard returns its SHARD_TOP_K nearest entries per face, and the
+coordinator keeps the global nearest one, accepted if within tolerance (the
+same rule as compare_faces + argmin over the whole gallery).
+
+Every query names the partition signature the coordinator loaded. A node
+holding anything else (restarted empty, or left behind by a load that
+failed partway) answers 'stale' instead of a possibly wrong nearest list,
+and the coordinator reloads that shard and asks again. Until a load has
+reached every shard the coordinator refuses to match, so callers fall back
+to local matching, and retries the load every SHARD_RETRY_SECONDS.
+
+Concurrent matches each borrow their own set of shard connections from a
+pool, so their round trips overlap; the coordinator's lock only covers
+swapping in and snapshotting the gallery state.
+
+Nodes unpickle what coordinators send, so SHARD_AUTHKEY must be set to a
+shared secret on both sides; there is no default. Run a shard node with:
+    SHARD_AUTHKEY=... python sharding.py --listen 0.0.0.0:6100
+"""
+import argparse
+import hashlib
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+RECOGNITION_SHARDS = [address.strip() for address in os.environ.get('RECOGNITION_SHARDS', '').split(',')
+                      if address.strip()]
+SHARD_AUTHKEY = os.environ.get('SHARD_AUTHKEY', '').encode()
+SHARD_TOP_K = int(os.environ.get('SHARD_TOP_K', 3))
+SHARD_TIMEOUT_SECONDS = float(os.environ.get('SHARD_TIMEOUT_SECONDS', 5))
+SHARD_RETRY_SECONDS = float(os.environ.get('SHARD_RETRY_SECONDS', 30))
+
+
+class ShardError(Exception):
+    """A shard could not be reached or answered with an error"""
+
+
+class StalePartition(ShardError):
+    """A shard holds a different partition than the one it was queried for"""
+
+
+def require_authkey(authkey):
+    if not authkey:
+        raise RuntimeError('SHARD_AUTHKEY must be set for recognition shards')
+
+
+def parse_address(address):
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+
+def _weight(address, student_id):
+    digest = hashlib.md5(f"{address}/{student_id}".encode()).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def assign_shards(ids, addresses):
+    """Shard index for each student id (rendezvous hashing: highest weight wins)"""
+    return np.array([max(range(len(addresses)), key=lambda shard: _weight(addresses[shard], int(student_id)))
+                     for student_id in ids], dtype=np.int64)
+
+
+def partition_signature(encodings, positions, ids):
+    """Stable digest of a partition (its gallery positions, their student ids and encodings)"""
+    digest = hashlib.md5(np.ascontiguousarray(positions, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(ids, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(encodings, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def nearest(encodings, positions, probes, top_k):
+    """Per probe, the top_k (distance, gallery position) pairs of this partition, nearest first"""
+    results = []
+    for probe in probes:
+        if len(encodings) == 0:
+            results.append([])
+            continue
+        # Same computation as face_recognition.face_distance
+        distances = np.linalg.norm(encodings - probe, axis=1)
+        k = min(top_k, len(distances))
+        best = np.argpartition(distances, k - 1)[:k]
+        best = best[np.lexsort((positions[best], distances[best]))]
+        results.append([(float(distances[i]), int(positions[i])) for i in best])
+    return results
+
+
+class ShardNode:
+    """One partition of the gallery, answering load/query messages on a socket"""
+
+    def __init__(self):
+        # (signature, encodings, positions), replaced as a whole so queries never see half a load
+        self.partition = (None, np.empty((0, 128)), np.empty(0, dtype=np.int64))
+
+    def handle(self, message):
+        kind = message[0]
+        if kind == 'signature':
+            return self.partition[0]
+        if kind == 'load':
+            _, signature, encodings, positions = message
+            self.partition = (signature, encodings, positions)
+            return len(positions)
+        if kind == 'query':
+            _, expected, probes, top_k = message
+            signature, encodings, positions = self.partition
+            if signature != expected:
+                raise StalePartition(f"holds partition {signature}, queried for {expected}")
+            return nearest(encodings, positions, probes, top_k)
+        raise ValueError(f"Unknown message {kind!r}")
+
+    def serve(self, address, authkey=SHARD_AUTHKEY):
+        """Accept coordinator connections forever, one thread each"""
+        require_authkey(authkey)
+        with Listener(parse_address(address), authkey=authkey) as listener:
+            print(f"Shard listening on {address}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(('ok', self.handle(message)))
+                except StalePartition as e:
+                    conn.send(('stale', str(e)))
+                except Exception as e:
+                    conn.send(('error', str(e)))
+
+
+class ShardCoordinator:
+    """Keeps the shards loaded with their partitions and scatters queries to them"""
+
+    def __init__(self, addresses, authkey=SHARD_AUTHKEY, top_k=SHARD_TOP_K, timeout=SHARD_TIMEOUT_SECONDS):
+        require_authkey(authkey)
+        self.addresses = list(addresses)
+        self.authkey = authkey
+        self.top_k = top_k
+        self.timeout = timeout
+        # Guards the gallery state only; no network I/O happens under it
+        self._lock = threading.Lock()
+        # Idle connection sets (one slot per shard), each used by one request at a time
+        self._idle = queue.Queue()
+        self.counts = [0] * len(self.addresses)
+        self.loaded = False  # Every shard holds its partition of the current gallery
+        # (encodings, (signature, gallery positions) per shard, ids, names), replaced as a whole by load()
+        self._state = None
+        self._attempted_at = 0.0
+
+    @contextmanager
+    def _connections(self):
+        """Borrow a connection set; on an error it is closed, along with the idle ones (a shard may have restarted)"""
+        try:
+            connections = self._idle.get_nowait()
+        except queue.Empty:
+            connections = [None] * len(self.addresses)
+        try:
+            yield connections
+        except BaseException:
+            self._close(connections)
+            while True:
+                try:
+                    self._close(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+            raise
+        self._idle.put(connections)
+
+    @staticmethod
+    def _close(connections):
+        for conn in connections:
+            if conn is not None:
+                conn.close()
+
+    def _conn(self, connections, shard):
+        if connections[shard] is None:
+            try:
+                connections[shard] = Client(parse_address(self.addresses[shard]), authkey=self.authkey)
+            except OSError as e:
+                raise ShardError(f"Shard {self.addresses[shard]} unreachable: {e}")
+        return connections[shard]
+
+    def _send(self, connections, shard, message):
+        try:
+            self._conn(connections, shard).send(message)
+        except OSError as e:
+            raise ShardError(f"Shard {self.addresses[shard]} failed: {e}")
+
+    def _recv(self, connections, shard):
+        try:
+            # A reply left unread here is never taken for the next request: the whole set is closed on errors
+            if not connections[shard].poll(self.timeout):
+                raise ShardError(f"Shard {self.addresses[shard]} timed out")
+            status, value = connections[shard].recv()
+        except (EOFError, OSError) as e:
+            raise ShardError(f"Shard {self.addresses[shard]} failed: {e}")
+        if status == 'stale':
+            raise StalePartition(f"Shard {self.addresses[shard]} {value}")
+        if status != 'ok':
+            raise ShardError(f"Shard {self.addresses[shard]}: {value}")
+        return value
+
+    def load(self, encodings, ids, names):
+        """Partition the gallery and push it to every shard whose partition changed"""
+        encodings = np.asarray(encodings, dtype=np.float64)
+        ids = np.asarray(ids, dtype=np.int64)
+        owner = assign_shards(ids, self.addresses)
+        partitions = []
+        for shard in range(len(self.addresses)):
+            positions = np.flatnonzero(owner == shard)
+            partitions.append((partition_signature(encodings[positions], positions, ids[positions]), positions))
+        state = (encodings, partitions, [int(student_id) for student_id in ids], [str(name) for name in names])
+        with self._lock:
+            unchanged = self.loaded and [signature for signature, _ in self._state[1]] == [
+                signature for signature, _ in partitions]
+            self._state = state
+            self.counts = [len(positions) for _, positions in partitions]
+            if unchanged:
+                # The shards already hold these partitions (a restarted one answers 'stale' and is reloaded)
+                return
+            # Matches fall back to local matching until every shard holds its new partition
+            self.loaded = False
+            self._attempted_at = time.time()
+        self._push_all(state)
+
+    def _push(self, connections, state, shard, check=True):
+        """Send a shard its partition, unless (when checking first) it already holds it"""
+        encodings, partitions, _, _ = state
+        signature, positions = partitions[shard]
+        if check:
+            self._send(connections, shard, ('signature',))
+            if self._recv(connections, shard) == signature:
+                return
+        self._send(connections, shard, ('load', signature, encodings[positions], positions))
+        self._recv(connections, shard)
+
+    def _push_all(self, state):
+        with self._connections() as connections:
+            for shard in range(len(self.addresses)):
+                self._push(connections, state, shard)
+        with self._lock:
+            # A newer load may have replaced the state while this one was being pushed
+            if self._state is state:
+                self.loaded = True
+
+    def match(self, face_encodings, tolerance):
+        """(student_id, name, distance) or None per face, over the whole sharded gallery"""
+        probes = np.asarray(face_encodings, dtype=np.float64)
+        with self._lock:
+            state = self._state
+            retry = not self.loaded
+            if retry:
+                # Positions from a load that failed partway may not match the ids and names here
+                if state is None or time.time() - self._attempted_at < SHARD_RETRY_SECONDS:
+                    raise ShardError('Shards are not loaded with the current gallery')
+                # Only this caller retries; the others keep falling back until it is done
+                self._attempted_at = time.time()
+        if retry:
+            self._push_all(state)
+
+        _, partitions, ids, names = state
+        with self._connections() as connections:
+            # Scatter to every shard before waiting on any of them
+            for shard in range(len(self.addresses)):
+                self._send(connections, shard, ('query', partitions[shard][0], probes, self.top_k))
+            gathered = []
+            for shard in range(len(self.addresses)):
+                try:
+                    gathered.append(self._recv(connections, shard))
+                except StalePartition as e:
+                    if self._state is not state:
+                        raise ShardError(f"{e}; the gallery was reloaded meanwhile")
+                    print(f"{e}; reloading it")
+                    self._push(connections, state, shard, check=False)
+                    self._send(connections, shard, ('query', partitions[shard][0], probes, self.top_k))
+                    gathered.append(self._recv(connections, shard))
+
+        matches = []
+        for face in range(len(probes)):
+            candidates = [candidate for shard_results in gathered for candidate in shard_results[face]]
+            if not candidates:
+                matches.append(None)
+                continue
+            # Ties go to the earlier gallery position, as argmin does
+            distance, position = min(candidates)
+            if distance <= tolerance:
+                matches.append((ids[position], names[position], distance))
+            else:
+                matches.append(None)
+        return matches
+
+    def summary(self):
+        return [{'address': address, 'students': count, 'loaded': self.loaded}
+                for address, count in zip(self.addresses, self.counts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a recognition shard node')
+    parser.add_argument('--listen', required=True, help='host:port to listen on')
+    args = parser.parse_args()
+    ShardNode().serve(args.listen)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-import json
 import os
 from datetime import datetime, timedelta
+from demo_index import DemoIndex
+from demo_store import DEMO_STORE_BACKEND, open_demo_store
 
 app = Flask(__name__)
 CORS(app)
@@ -12,29 +13,21 @@ socketio = SocketIO(app, cors_allowed_origins="*")
 # Storage file for persistence
 DATA_FILE = 'demo_data.json'
 
-# Load or initialize demo data
-def load_demo_data():
-    try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {
-            "students": [],
-            "sessions": [],
-            "attendance_records": [],
-            "student_images": {},
-            "movement_logs": []
-        }
-
-def save_demo_data():
-    with open(DATA_FILE, 'w') as f:
-        json.dump(demo_data, f, indent=2, default=str)
-
-demo_data = load_demo_data()
+# Load or initialize demo data (snapshot + journal replay); all writes go through demo_store
+demo_store = open_demo_store(DATA_FILE, {
+    "students": [],
+    "sessions": [],
+    "attendance_records": [],
+    "student_images": {},
+    "movement_logs": []
+})
+demo_data = demo_store.data
+# The SQLite backend answers index lookups with SQL instead of holding a copy
+demo_index = demo_store.index if DEMO_STORE_BACKEND == 'sqlite' else DemoIndex(demo_data)
 
 @app.route('/api/students', methods=['GET'])
 def get_students():
-    return jsonify(demo_data['students'])
+    return jsonify(list(demo_data['students']))
 
 @app.route('/api/students', methods=['POST'])
 def create_student():
@@ -52,13 +45,13 @@ def create_student():
         'batch': student_data.get('batch'),
         'created_at': datetime.now().isoformat()
     }
-    demo_data['students'].append(student)
-    save_demo_data()
+    demo_store.append('students', student)
+    demo_index.add_student(student)
     return jsonify(student), 201
 
 @app.route('/api/sessions', methods=['GET'])
 def get_sessions():
-    return jsonify(demo_data['sessions'])
+    return jsonify(list(demo_data['sessions']))
 
 @app.route('/api/sessions', methods=['POST'])
 def create_session():
@@ -89,13 +82,13 @@ def create_session():
         'status': 'scheduled',
         'created_at': datetime.now().isoformat()
     }
-    demo_data['sessions'].append(session)
-    save_demo_data()
+    demo_store.append('sessions', session)
+    demo_index.add_session(session)
     return jsonify(session), 201
 
 @app.route('/api/attendance', methods=['GET'])
 def get_attendance():
-    return jsonify(demo_data['attendance_records'])
+    return jsonify(list(demo_data['attendance_records']))
 
 @app.route('/api/sessions/filters', methods=['GET'])
 def get_session_filters():
@@ -113,27 +106,27 @@ def get_session_filters():
 @app.route('/api/sessions/<int:session_id>/start', methods=['POST'])
 def start_session(session_id):
     """Start a session by changing its status to active"""
-    for session in demo_data['sessions']:
+    for position, session in enumerate(demo_data['sessions']):
         if session['id'] == session_id:
-            session['status'] = 'active'
-            save_demo_data()
+            demo_index.set_session_status(session, 'active')
+            demo_store.update('sessions', position, {'status': 'active'})
             return jsonify({'message': 'Session started successfully', 'session': session})
     return jsonify({'error': 'Session not found'}), 404
 
 @app.route('/api/sessions/<int:session_id>/stop', methods=['POST'])
 def stop_session(session_id):
     """Stop a session by changing its status to completed"""
-    for session in demo_data['sessions']:
+    for position, session in enumerate(demo_data['sessions']):
         if session['id'] == session_id:
-            session['status'] = 'completed'
-            save_demo_data()
+            demo_index.set_session_status(session, 'completed')
+            demo_store.update('sessions', position, {'status': 'completed'})
             return jsonify({'message': 'Session stopped successfully', 'session': session})
     return jsonify({'error': 'Session not found'}), 404
 
 @app.route('/api/sessions/active', methods=['GET'])
 def get_active_sessions():
     # Return all active sessions (multiple can be active simultaneously)
-    active_sessions = [s for s in demo_data['sessions'] if s.get('status') == 'active']
+    active_sessions = demo_index.sessions(status='active')
     return jsonify(active_sessions)
 
 @app.route('/api/sessions/active/<string:department>', methods=['GET'])
@@ -150,16 +143,59 @@ def cleanup_sessions():
     
     # Keep only sessions that match valid classes or are currently active and needed
     original_count = len(demo_data['sessions'])
-    demo_data['sessions'] = [s for s in demo_data['sessions'] 
-                            if (s.get('className') in valid_classes or 
-                                s.get('subject') in valid_classes or
-                                (s.get('department') == 'Computer Science' and s.get('status') == 'active'))]
+    demo_store.replace('sessions', [s for s in demo_data['sessions'] 
+                                    if (s.get('className') in valid_classes or 
+                                        s.get('subject') in valid_classes or
+                                        (s.get('department') == 'Computer Science' and s.get('status') == 'active'))])
     
     removed_count = original_count - len(demo_data['sessions'])
-    save_demo_data()
+    demo_index.rebuild(demo_data)
     
     return jsonify({'message': f'Cleaned up {removed_count} old sessions'})
 
+def student_attendance_counts():
+    """(student, completed classes in the student's department, classes attended) for every student"""
+    if DEMO_STORE_BACKEND == 'sqlite':
+        return demo_store.student_attendance_counts()
+    
+    # One row-slice reduction of the attendance matrix per department
+    students = demo_data['students']
+    positions_by_dept = {}
+    for position, student in enumerate(students):
+        positions_by_dept.setdefault((student.get('department') or '').strip(), []).append(position)
+    
+    counts = [None] * len(students)
+    for dept, positions in positions_by_dept.items():
+        mask = demo_index.matrix.session_mask(department=dept)
+        total_classes = int(mask.sum())
+        attended = demo_index.matrix.attended([students[position]['id'] for position in positions], mask)
+        for position, attended_count in zip(positions, attended):
+            counts[position] = (students[position], total_classes, int(attended_count))
+    
+    return counts
+
+def subject_attendance_counts():
+    """[(subject, department, total classes, [(student, attended), ...]), ...] over completed sessions"""
+    if DEMO_STORE_BACKEND == 'sqlite':
+        return demo_store.subject_attendance_counts()
+    
+    # Each subject is reported against the department of its first completed session
+    subjects = {}
+    for session in demo_index.sessions(status='completed'):
+        subject = (session.get('subject') or '').strip()
+        if subject:
+            subjects.setdefault(subject, (session.get('department') or '').strip())
+    
+    counts = []
+    for subject, dept in subjects.items():
+        mask = demo_index.matrix.session_mask(subject=subject)
+        students = demo_index.students_in(dept)
+        attended = demo_index.matrix.attended([student['id'] for student in students], mask)
+        counts.append((subject, dept, int(mask.sum()),
+                       [(student, int(attended_count)) for student, attended_count in zip(students, attended)]))
+    
+    return counts
+
 @app.route('/api/reports/low-attendance', methods=['GET'])
 def get_low_attendance():
     threshold = int(request.args.get('threshold', 75))
@@ -167,34 +203,15 @@ def get_low_attendance():
     # Calculate real attendance data from actual sessions and attendance records
     low_attendance_students = []
     
-    # Get all completed sessions (classes that have been conducted)
-    completed_sessions = [s for s in demo_data['sessions'] if s.get('status') == 'completed']
-    
-    if not completed_sessions:
+    if not demo_index.sessions(status='completed'):
         # No classes completed yet, so no attendance data
         return jsonify([])
     
     # Calculate attendance for each student
-    for student in demo_data['students']:
-        student_id = student['id']
-        student_dept = student.get('department', '').strip()
-        
-        # Get sessions for this student's department
-        dept_sessions = [s for s in completed_sessions if s.get('department', '').strip() == student_dept]
-        total_classes = len(dept_sessions)
-        
+    for student, total_classes, attended_count in student_attendance_counts():
         if total_classes == 0:
             continue  # No classes in this department yet
         
-        # Count attendance for this student
-        attended_sessions = []
-        for session in dept_sessions:
-            attendance_record = next((ar for ar in demo_data['attendance_records'] 
-                                   if ar['student_id'] == student_id and ar['session_id'] == session['id']), None)
-            if attendance_record and attendance_record.get('status') == 'present':
-                attended_sessions.append(session)
-        
-        attended_count = len(attended_sessions)
         attendance_percentage = round((attended_count / total_classes) * 100, 2) if total_classes > 0 else 0
         
         if attendance_percentage < threshold:
@@ -218,28 +235,8 @@ def get_attendance_stats():
     # Calculate real attendance statistics from actual data
     students_stats = []
     
-    # Get all completed sessions (classes that have been conducted)
-    completed_sessions = [s for s in demo_data['sessions'] if s.get('status') == 'completed']
-    
     # Calculate attendance for each student
-    for student in demo_data['students']:
-        student_id = student['id']
-        student_dept = student.get('department', '').strip()
-        
-        # Get sessions for this student's department
-        dept_sessions = [s for s in completed_sessions if s.get('department', '').strip() == student_dept]
-        total_classes = len(dept_sessions)
-        
-        # Count attendance for this student
-        attended_sessions = []
-        if total_classes > 0:
-            for session in dept_sessions:
-                attendance_record = next((ar for ar in demo_data['attendance_records'] 
-                                       if ar['student_id'] == student_id and ar['session_id'] == session['id']), None)
-                if attendance_record and attendance_record.get('status') == 'present':
-                    attended_sessions.append(session)
-        
-        attended_count = len(attended_sessions)
+    for student, total_classes, attended_count in student_attendance_counts():
         attendance_percentage = round((attended_count / total_classes) * 100, 2) if total_classes > 0 else 0
         
         student_stat = {
@@ -259,8 +256,8 @@ def get_attendance_stats():
 
 @app.route('/api/students/<int:student_id>', methods=['DELETE'])
 def delete_student(student_id):
-    demo_data['students'] = [s for s in demo_data['students'] if s['id'] != student_id]
-    save_demo_data()
+    demo_store.replace('students', [s for s in demo_data['students'] if s['id'] != student_id])
+    demo_index.rebuild(demo_data)
     return jsonify({'message': 'Student deleted successfully'})
 
 @app.route('/api/students/<int:student_id>/upload-images', methods=['POST'])
@@ -270,140 +267,85 @@ def upload_student_images(student_id):
 
 @app.route('/api/clear/sessions', methods=['DELETE'])
 def clear_sessions():
-    demo_data['sessions'] = []
-    save_demo_data()
+    demo_store.replace('sessions', [])
+    demo_index.rebuild(demo_data)
     return jsonify({'message': 'Sessions cleared successfully'})
 
 @app.route('/api/clear/all-session-data', methods=['DELETE'])
 def clear_all_session_data():
-    demo_data['sessions'] = []
-    demo_data['attendance_records'] = []
-    save_demo_data()
+    demo_store.replace('sessions', [])
+    demo_store.replace('attendance_records', [])
+    demo_index.rebuild(demo_data)
     return jsonify({'message': 'All session data cleared successfully'})
 
 @app.route('/api/clear/reports', methods=['DELETE'])
 def clear_reports():
-    demo_data['attendance_records'] = []
-    save_demo_data()
+    demo_store.replace('attendance_records', [])
+    demo_index.rebuild(demo_data)
     return jsonify({'message': 'Reports cleared successfully'})
 
 @app.route('/api/reports/departments', methods=['GET'])
 def get_department_reports():
     """Get department-wise attendance summary"""
-    # Get all completed sessions
-    completed_sessions = [s for s in demo_data['sessions'] if s.get('status') == 'completed']
-    
-    if not completed_sessions:
+    if not demo_index.sessions(status='completed'):
         return jsonify([])
     
-    # Group by department
+    # Group by department, in order of first appearance among students
     departments = {}
     
-    # First, get all departments from students
-    for student in demo_data['students']:
-        dept = student.get('department', '').strip()
-        if dept and dept not in departments:
+    for student, total_classes, attended_count in student_attendance_counts():
+        dept = (student.get('department') or '').strip()
+        if not dept:
+            continue
+        
+        if dept not in departments:
             departments[dept] = {
                 'department': dept,
                 'total_students': 0,
-                'total_classes_conducted': 0,
+                'total_classes_conducted': total_classes,
                 'students': []
             }
-    
-    # Calculate stats for each department
-    for dept_name, dept_data in departments.items():
-        # Get sessions for this department
-        dept_sessions = [s for s in completed_sessions if s.get('department', '').strip() == dept_name]
-        dept_data['total_classes_conducted'] = len(dept_sessions)
+        dept_data = departments[dept]
+        dept_data['total_students'] += 1
         
-        # Get students in this department
-        dept_students = [s for s in demo_data['students'] if s.get('department', '').strip() == dept_name]
-        dept_data['total_students'] = len(dept_students)
-        
-        # Calculate attendance for each student in this department
-        for student in dept_students:
-            student_id = student['id']
-            
-            # Count attendance for this student in dept sessions
-            attended_count = 0
-            for session in dept_sessions:
-                attendance_record = next((ar for ar in demo_data['attendance_records'] 
-                                       if ar['student_id'] == student_id and ar['session_id'] == session['id']), None)
-                if attendance_record and attendance_record.get('status') == 'present':
-                    attended_count += 1
-            
-            attendance_percentage = round((attended_count / len(dept_sessions)) * 100, 2) if len(dept_sessions) > 0 else 0
-            
-            student_data = {
-                'id': student['id'],
-                'name': student['name'],
-                'student_id': student['student_id'],
-                'email': student['email'],
-                'total_classes': len(dept_sessions),
-                'attended': attended_count,
-                'attendance_percentage': attendance_percentage
-            }
-            dept_data['students'].append(student_data)
+        attendance_percentage = round((attended_count / total_classes) * 100, 2) if total_classes > 0 else 0
         
-        # Calculate department average
-        if dept_data['students']:
-            dept_data['average_attendance'] = round(
-                sum(s['attendance_percentage'] for s in dept_data['students']) / len(dept_data['students']), 2
-            )
-        else:
-            dept_data['average_attendance'] = 0
+        student_data = {
+            'id': student['id'],
+            'name': student['name'],
+            'student_id': student['student_id'],
+            'email': student['email'],
+            'total_classes': total_classes,
+            'attended': attended_count,
+            'attendance_percentage': attendance_percentage
+        }
+        dept_data['students'].append(student_data)
+    
+    # Calculate department averages
+    for dept_data in departments.values():
+        dept_data['average_attendance'] = round(
+            sum(s['attendance_percentage'] for s in dept_data['students']) / len(dept_data['students']), 2
+        )
     
     return jsonify(list(departments.values()))
 
 @app.route('/api/reports/subjects', methods=['GET'])
 def get_subject_reports():
     """Get subject-wise attendance summary (CN, CC, OS, SSS)"""
-    # Get all completed sessions
-    completed_sessions = [s for s in demo_data['sessions'] if s.get('status') == 'completed']
-    
-    if not completed_sessions:
+    if not demo_index.sessions(status='completed'):
         return jsonify([])
     
-    # Group by subject
-    subjects = {}
+    subjects = []
     
-    for session in completed_sessions:
-        subject = session.get('subject', '').strip()
-        dept = session.get('department', '').strip()
-        
-        if not subject:
-            continue
-            
-        if subject not in subjects:
-            subjects[subject] = {
-                'subject': subject,
-                'department': dept,
-                'total_classes_conducted': 0,
-                'students_attendance': []
-            }
-        
-        subjects[subject]['total_classes_conducted'] += 1
-    
-    # Calculate student attendance for each subject
-    for subject_name, subject_data in subjects.items():
-        # Get all sessions for this subject
-        subject_sessions = [s for s in completed_sessions if s.get('subject', '').strip() == subject_name]
-        
-        # Get students from the department of this subject
-        dept_students = [s for s in demo_data['students'] if s.get('department', '').strip() == subject_data['department']]
+    for subject, dept, total_classes, students in subject_attendance_counts():
+        subject_data = {
+            'subject': subject,
+            'department': dept,
+            'total_classes_conducted': total_classes,
+            'students_attendance': []
+        }
         
-        for student in dept_students:
-            student_id = student['id']
-            
-            # Count attendance for this student in this subject
-            attended_count = 0
-            for session in subject_sessions:
-                attendance_record = next((ar for ar in demo_data['attendance_records'] 
-                                       if ar['student_id'] == student_id and ar['session_id'] == session['id']), None)
-                if attendance_record and attendance_record.get('status') == 'present':
-                    attended_count += 1
-            
-            total_classes = len(subject_sessions)
+        for student, attended_count in students:
             attendance_percentage = round((attended_count / total_classes) * 100, 2) if total_classes > 0 else 0
             
             student_data = {
@@ -424,8 +366,10 @@ def get_subject_reports():
             )
         else:
             subject_data['average_attendance'] = 0
+        
+        subjects.append(subject_data)
     
-    return jsonify(list(subjects.values()))
+    return jsonify(subjects)
 
 @app.route('/api/attendance/mark', methods=['POST'])
 def mark_attendance():
@@ -435,29 +379,22 @@ def mark_attendance():
     session_id = data.get('session_id')
     
     # Check if session exists and is active
-    active_session = None
-    for session in demo_data['sessions']:
-        if session['id'] == session_id and session['status'] == 'active':
-            active_session = session
-            break
+    active_session = next((session for session in demo_index.sessions(status='active')
+                           if session['id'] == session_id), None)
     
     if not active_session:
         return jsonify({'error': 'No active session found'}), 404
     
     # Check if student exists
-    student = None
-    for s in demo_data['students']:
-        if s['id'] == student_id:
-            student = s
-            break
+    student = demo_index.student(student_id)
     
     if not student:
         return jsonify({'error': 'Student not found'}), 404
     
     # Check if attendance already marked
-    for record in demo_data['attendance_records']:
-        if record['student_id'] == student_id and record['session_id'] == session_id:
-            return jsonify({'message': 'Attendance already marked', 'status': record['status']})
+    record = demo_index.record_for(student_id, session_id)
+    if record:
+        return jsonify({'message': 'Attendance already marked', 'status': record['status']})
     
     # Create attendance record
     attendance_record = {
@@ -471,8 +408,8 @@ def mark_attendance():
         'marked_at': datetime.now().isoformat()
     }
     
-    demo_data['attendance_records'].append(attendance_record)
-    save_demo_data()
+    demo_store.append('attendance_records', attendance_record)
+    demo_index.add_record(attendance_record)
     
     return jsonify({'message': 'Attendance marked successfully', 'record': attendance_record})
 
@@ -522,7 +459,7 @@ def get_dashboard_stats():
     total_departments = len(departments)
     total_students = len(demo_data['students'])
     total_sessions = len(demo_data['sessions'])
-    active_sessions = len([s for s in demo_data['sessions'] if s.get('status') == 'active'])
+    active_sessions = len(demo_index.sessions(status='active'))
     
     return jsonify({
         'total_departments': total_departments,
@@ -617,10 +554,7 @@ def handle_process_frame(data):
                     confidence = random.uniform(0.75, 0.85)  # Lower confidence for others
                 
                 # Check if attendance already marked
-                already_marked = any(
-                    record['student_id'] == student['id'] and record['session_id'] == session_id
-                    for record in demo_data['attendance_records']
-                )
+                already_marked = demo_index.record_for(student['id'], session_id) is not None
                 
                 if not already_marked:
                     # Auto-mark attendance
@@ -635,8 +569,8 @@ def handle_process_frame(data):
                         'marked_at': datetime.now().isoformat(),
                         'recognition_confidence': confidence
                     }
-                    demo_data['attendance_records'].append(attendance_record)
-                    save_demo_data()
+                    demo_store.append('attendance_records', attendance_record)
+                    demo_index.add_record(attendance_record)
                 
                 recognized_students.append({
                     'id': student['id'],
@@ -0,0 +1,457 @@
+"""Embedded SQLite storage backend for the standalone demo servers
+
+Implements the init.sql tables (plus the extra columns the demo servers use,
+such as session department/status) with indexes, WAL journaling and a small
+connection pool. It exposes the same mutation API as DemoStore, but nothing is kept in memory: ``data`` is a
+read-through view whose collections query SQLite on every access, lookups go
+through SQLiteIndex instead of DemoIndex, and the report queries run as SQL
+aggregations with DemoIndex's first-record-wins rule for duplicated
+attendance records.
+
+Every row also stores its original dict in a ``doc`` column so the demo API
+returns exactly what was written. Demo ids are assigned by the servers and
+are not guaranteed to be unique, so rows are keyed by an internal row_id.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+from collections.abc import Mapping, Sequence
+from contextlib import contextmanager
+
+from demo_store import DemoStore
+
+SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 4))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    row_id INTEGER PRIMARY KEY,
+    id INTEGER,
+    student_id TEXT,
+    name TEXT,
+    email TEXT,
+    department TEXT,
+    semester TEXT,
+    batch TEXT,
+    created_at TEXT,
+    doc TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS student_images (
+    row_id INTEGER PRIMARY KEY,
+    student_id INTEGER NOT NULL,
+    image_path TEXT,
+    encoding_data TEXT,
+    doc TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS class_sessions (
+    row_id INTEGER PRIMARY KEY,
+    id INTEGER,
+    subject TEXT,
+    instructor TEXT,
+    classroom TEXT,
+    department TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    duration_minutes INTEGER,
+    status TEXT,
+    created_at TEXT,
+    doc TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS attendance_records (
+    row_id INTEGER PRIMARY KEY,
+    id INTEGER,
+    student_id INTEGER,
+    session_id INTEGER,
+    entry_time TEXT,
+    exit_time TEXT,
+    status TEXT DEFAULT 'absent',
+    total_time_present INTEGER DEFAULT 0,
+    percentage_present REAL DEFAULT 0,
+    marked_at TEXT,
+    doc TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS movement_logs (
+    row_id INTEGER PRIMARY KEY,
+    student_id INTEGER,
+    session_id INTEGER,
+    movement_type TEXT,
+    timestamp TEXT,
+    doc TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_students_id ON students(id);
+CREATE INDEX IF NOT EXISTS idx_students_department ON students(TRIM(COALESCE(department, '')));
+CREATE INDEX IF NOT EXISTS idx_images_student ON student_images(student_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_id ON class_sessions(id);
+CREATE INDEX IF NOT EXISTS idx_sessions_status_department ON class_sessions(status, TRIM(COALESCE(department, '')));
+CREATE INDEX IF NOT EXISTS idx_sessions_status_subject ON class_sessions(status, TRIM(COALESCE(subject, '')));
+CREATE INDEX IF NOT EXISTS idx_sessions_time ON class_sessions(start_time, end_time);
+CREATE INDEX IF NOT EXISTS idx_attendance_pair ON attendance_records(student_id, session_id);
+CREATE INDEX IF NOT EXISTS idx_attendance_session ON attendance_records(session_id);
+CREATE INDEX IF NOT EXISTS idx_movement_pair ON movement_logs(student_id, session_id);
+"""
+
+# collection -> (table, columns copied from the dict; doc holds the full dict)
+COLLECTIONS = {
+    'students': ('students', ['id', 'student_id', 'name', 'email', 'department', 'semester', 'batch', 'created_at']),
+    'sessions': ('class_sessions', ['id', 'subject', 'instructor', 'classroom', 'department', 'start_time',
+                                    'end_time', 'duration_minutes', 'status', 'created_at']),
+    'attendance_records': ('attendance_records', ['id', 'student_id', 'session_id', 'entry_time', 'exit_time',
+                                                  'status', 'total_time_present', 'percentage_present',
+                                                  'marked_at']),
+    'movement_logs': ('movement_logs', ['student_id', 'session_id', 'movement_type', 'timestamp']),
+}
+
+# Completed sessions with the trimmed department/subject the reports group on
+COMPLETED_SESSIONS = """
+completed AS (
+    SELECT row_id, id, TRIM(COALESCE(department, '')) AS dept, TRIM(COALESCE(subject, '')) AS subject
+    FROM class_sessions
+    WHERE status = 'completed'
+),
+present AS MATERIALIZED (
+    -- Only the first record of a (student, session) pair counts, like DemoIndex.record_for;
+    -- materialized so the MIN(row_id) grouping runs once, not per joined session
+    SELECT student_id, session_id
+    FROM attendance_records
+    WHERE row_id IN (SELECT MIN(row_id) FROM attendance_records GROUP BY student_id, session_id)
+      AND status = 'present'
+)
+"""
+
+STUDENT_ATTENDANCE_QUERY = f"""
+WITH {COMPLETED_SESSIONS},
+dept_totals AS (
+    SELECT dept, COUNT(*) AS total FROM completed GROUP BY dept
+),
+attended AS (
+    SELECT s.row_id, COUNT(*) AS attended
+    FROM present p
+    JOIN students s ON s.id = p.student_id
+    JOIN completed c ON c.id = p.session_id AND c.dept = TRIM(COALESCE(s.department, ''))
+    GROUP BY s.row_id
+)
+SELECT s.doc, COALESCE(dt.total, 0), COALESCE(a.attended, 0)
+FROM students s
+LEFT JOIN dept_totals dt ON dt.dept = TRIM(COALESCE(s.department, ''))
+LEFT JOIN attended a ON a.row_id = s.row_id
+ORDER BY s.row_id
+"""
+
+SUBJECT_TOTALS_QUERY = f"""
+WITH {COMPLETED_SESSIONS}
+SELECT subject,
+       (SELECT c2.dept FROM completed c2 WHERE c2.subject = c.subject ORDER BY c2.row_id LIMIT 1) AS dept,
+       COUNT(*) AS total
+FROM completed c
+WHERE subject != ''
+GROUP BY subject
+ORDER BY MIN(row_id)
+"""
+
+SUBJECT_ATTENDANCE_QUERY = f"""
+WITH {COMPLETED_SESSIONS}
+SELECT c.subject, s.row_id, COUNT(*)
+FROM present p
+JOIN completed c ON c.id = p.session_id
+JOIN students s ON s.id = p.student_id
+WHERE c.subject != ''
+GROUP BY c.subject, s.row_id
+"""
+
+
+class SQLiteStore:
+    """SQLite-backed demo store with the DemoStore mutation API"""
+
+    def __init__(self, path, default_data, import_from=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pool = queue.Queue()
+
+        for _ in range(SQLITE_POOL_SIZE):
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=OFF")
+            self._pool.put(conn)
+
+        with self.connection() as conn:
+            conn.executescript(SCHEMA)
+            empty = all(
+                conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0
+                for table, _ in COLLECTIONS.values()
+            )
+
+        # First start on SQLite: migrate the JSON data file, replaying any
+        # journal entries that were never compacted into it
+        if empty and import_from and (os.path.exists(import_from) or os.path.exists(import_from + '.journal')):
+            self._import(DemoStore(import_from, default_data).data)
+            print(f"Imported {import_from} into {path}")
+
+        self.data = SQLiteData(self)
+        self.index = SQLiteIndex(self)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection from the pool"""
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _import(self, data):
+        with self.connection() as conn:
+            for key in COLLECTIONS:
+                self._insert_rows(conn, key, data.get(key, []))
+            for student_id, images in data.get('student_images', {}).items():
+                self._insert_images(conn, student_id, images)
+            conn.commit()
+
+    def query(self, sql, params=()):
+        """Run a read query on a pooled connection and return all rows"""
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _row_values(columns, item):
+        return [item.get(column) for column in columns] + [json.dumps(item, default=str)]
+
+    def _insert_rows(self, conn, key, items):
+        table, columns = COLLECTIONS[key]
+        placeholders = ', '.join('?' * (len(columns) + 1))
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}, doc) VALUES ({placeholders})",
+            [self._row_values(columns, item) for item in items]
+        )
+
+    @staticmethod
+    def _insert_images(conn, student_id, images):
+        conn.executemany(
+            "INSERT INTO student_images (student_id, image_path, encoding_data, doc) VALUES (?, ?, ?, ?)",
+            [(int(student_id), image.get('path'), json.dumps(image.get('encoding')), json.dumps(image))
+             for image in images]
+        )
+
+    # Mutations (same API as DemoStore)
+
+    def append(self, key, item):
+        with self._lock, self.connection() as conn:
+            self._insert_rows(conn, key, [item])
+            conn.commit()
+
+    def update(self, key, position, fields):
+        table, columns = COLLECTIONS[key]
+        with self._lock, self.connection() as conn:
+            # Positions follow row_id order, like the list view in data[key]
+            row = conn.execute(f"SELECT row_id, doc FROM {table} ORDER BY row_id LIMIT 1 OFFSET ?",
+                               (position,)).fetchone()
+            if row is None:
+                raise IndexError(f"{key} has no item at position {position}")
+            item = {**json.loads(row[1]), **fields}
+            assignments = ', '.join(f"{column} = ?" for column in columns)
+            conn.execute(
+                f"UPDATE {table} SET {assignments}, doc = ? WHERE row_id = ?",
+                self._row_values(columns, item) + [row[0]]
+            )
+            conn.commit()
+
+    def replace(self, key, value):
+        # Materialize first: value is usually built from this store's own views
+        value = dict(value) if key == 'student_images' else list(value)
+        with self._lock, self.connection() as conn:
+            if key == 'student_images':
+                conn.execute("DELETE FROM student_images")
+                for student_id, images in value.items():
+                    self._insert_images(conn, student_id, images)
+            else:
+                conn.execute(f"DELETE FROM {COLLECTIONS[key][0]}")
+                self._insert_rows(conn, key, value)
+            conn.commit()
+
+    def set_entry(self, key, entry_key, value):
+        # Only student_images is a keyed collection in the demo data
+        with self._lock, self.connection() as conn:
+            conn.execute("DELETE FROM student_images WHERE student_id = ?", (int(entry_key),))
+            self._insert_images(conn, entry_key, value)
+            conn.commit()
+
+    def append_entry(self, key, entry_key, item):
+        with self._lock, self.connection() as conn:
+            self._insert_images(conn, entry_key, [item])
+            conn.commit()
+
+    def flush(self):
+        """Writes are committed synchronously; nothing to wait for"""
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get().close()
+
+    # Report aggregations
+
+    def student_attendance_counts(self):
+        """(student, completed classes in their department, classes attended) per student"""
+        with self.connection() as conn:
+            rows = conn.execute(STUDENT_ATTENDANCE_QUERY).fetchall()
+        return [(json.loads(doc), total, attended) for doc, total, attended in rows]
+
+    def subject_attendance_counts(self):
+        """[(subject, department, total classes, [(student, attended), ...]), ...]"""
+        with self.connection() as conn:
+            subjects = conn.execute(SUBJECT_TOTALS_QUERY).fetchall()
+            attended = {(subject, row_id): count
+                        for subject, row_id, count in conn.execute(SUBJECT_ATTENDANCE_QUERY)}
+            students = conn.execute(
+                "SELECT row_id, TRIM(COALESCE(department, '')), doc FROM students ORDER BY row_id"
+            ).fetchall()
+
+        by_department = {}
+        for row_id, department, doc in students:
+            by_department.setdefault(department, []).append((row_id, json.loads(doc)))
+
+        return [
+            (subject, department, total,
+             [(student, attended.get((subject, row_id), 0)) for row_id, student in by_department.get(department, [])])
+            for subject, department, total in subjects
+        ]
+
+
+class TableView(Sequence):
+    """Read-only list view of one collection, in insertion (row_id) order; every access queries SQLite"""
+
+    def __init__(self, store, key):
+        self._store = store
+        self._table = COLLECTIONS[key][0]
+
+    def __len__(self):
+        return self._store.query(f"SELECT COUNT(*) FROM {self._table}")[0][0]
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return list(self)[position]
+        if position < 0:
+            position += len(self)
+        rows = self._store.query(f"SELECT doc FROM {self._table} ORDER BY row_id LIMIT 1 OFFSET ?",
+                                 (position,)) if position >= 0 else []
+        if not rows:
+            raise IndexError(f"{self._table} index out of range")
+        return json.loads(rows[0][0])
+
+    def __iter__(self):
+        # Fetched up front so the loop body can write through the store
+        rows = self._store.query(f"SELECT doc FROM {self._table} ORDER BY row_id")
+        return (json.loads(doc) for doc, in rows)
+
+
+class ImagesView(Mapping):
+    """Read-only student_images view: student id -> list of image dicts"""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, student_id):
+        rows = self._store.query("SELECT doc FROM student_images WHERE student_id = ? ORDER BY row_id",
+                                 (int(student_id),))
+        if not rows:
+            raise KeyError(student_id)
+        return [json.loads(doc) for doc, in rows]
+
+    def __iter__(self):
+        rows = self._store.query(
+            "SELECT student_id FROM student_images GROUP BY student_id ORDER BY MIN(row_id)")
+        return (student_id for student_id, in rows)
+
+    def __len__(self):
+        return self._store.query("SELECT COUNT(DISTINCT student_id) FROM student_images")[0][0]
+
+    def items(self):
+        """All entries in one query instead of one per student"""
+        images = {}
+        for student_id, doc in self._store.query("SELECT student_id, doc FROM student_images ORDER BY row_id"):
+            images.setdefault(student_id, []).append(json.loads(doc))
+        return images.items()
+
+
+class SQLiteData(Mapping):
+    """The demo_data dict shape over SQLite: data[key] returns a view, not a copy"""
+
+    def __init__(self, store):
+        self._views = {key: TableView(store, key) for key in COLLECTIONS}
+        self._views['student_images'] = ImagesView(store)
+
+    def __getitem__(self, key):
+        return self._views[key]
+
+    def __iter__(self):
+        return iter(self._views)
+
+    def __len__(self):
+        return len(self._views)
+
+
+class SQLiteIndex:
+    """DemoIndex's query API answered by indexed SQL, so the SQLite backend keeps no in-memory copy
+
+    The add_/set_/rebuild hooks exist for API compatibility: rows are
+    indexed by SQLite as soon as the store writes them.
+    """
+
+    def __init__(self, store):
+        self._store = store
+
+    def rebuild(self, demo_data):
+        """Nothing to rebuild; SQLite maintains its own indexes"""
+
+    def add_student(self, student):
+        """Already indexed by the store's INSERT"""
+
+    def add_session(self, session):
+        """Already indexed by the store's INSERT"""
+
+    def add_record(self, record):
+        """Already indexed by the store's INSERT"""
+
+    def set_session_status(self, session, status):
+        """Change the status on the caller's dict; the caller persists it through the store"""
+        session['status'] = status
+
+    def _first(self, sql, params):
+        rows = self._store.query(sql + " ORDER BY row_id LIMIT 1", params)
+        return json.loads(rows[0][0]) if rows else None
+
+    def sessions(self, status=None, department=None, subject=None):
+        """Sessions matching every given filter, in list order"""
+        filters = [(sql, value) for sql, value in (
+            ("status = ?", status),
+            ("TRIM(COALESCE(department, '')) = ?", department),
+            ("TRIM(COALESCE(subject, '')) = ?", subject)
+        ) if value is not None]
+        where = f"WHERE {' AND '.join(sql for sql, _ in filters)}" if filters else ""
+        rows = self._store.query(f"SELECT doc FROM class_sessions {where} ORDER BY row_id",
+                                 [value for _, value in filters])
+        return [json.loads(doc) for doc, in rows]
+
+    def students_in(self, department):
+        """Students whose (stripped) department matches, in list order"""
+        rows = self._store.query(
+            "SELECT doc FROM students WHERE TRIM(COALESCE(department, '')) = ? ORDER BY row_id", (department,))
+        return [json.loads(doc) for doc, in rows]
+
+    def student(self, student_id):
+        """First student with this id, or None"""
+        return self._first("SELECT doc FROM students WHERE id = ?", (student_id,))
+
+    def session(self, session_id):
+        """First session with this id, or None"""
+        return self._first("SELECT doc FROM class_sessions WHERE id = ?", (session_id,))
+
+    def record_for(self, student_id, session_id):
+        """First attendance record for a (student, session) pair, or None"""
+        return self._first("SELECT doc FROM attendance_records WHERE student_id = ? AND session_id = ?",
+                           (student_id, session_id))
@@ -0,0 +1,189 @@
+"""Face detection on overlapping tiles, for high-resolution cameras
+
+Shrinking a 4K frame to a quarter (what locate_faces() does) leaves the
+back rows a few pixels wide; running the detector on the whole frame at a
+usable size is too slow for one core. Cameras listed in TILE_LAYOUTS are
+instead scaled by their layout's `scale`, cut into `cols` x `rows` tiles
+that overlap their neighbours by `overlap` of a tile, and the tiles are
+detected in parallel in TILE_WORKERS processes.
+
+A face crossing a tile border is found twice (whole in one tile, often cut
+off in the other). Detections are ranked by how far they sit from the
+inner tile borders, and any that overlaps a better one by more than
+TILE_NMS_OVERLAP of the smaller box is dropped, so the whole copy wins.
+The overlap must be wider than the largest face for that copy to exist.
+
+TILE_LAYOUTS is JSON keyed by camera id, '*' for every other camera:
+    TILE_LAYOUTS='{"room-101-ceiling": {"cols": 3, "rows": 2}, "*": {"cols": 2, "rows": 2, "scale": 0.4}}'
+"""
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+TILE_SCALE = float(os.environ.get('TILE_SCALE', 0.5))
+TILE_OVERLAP = float(os.environ.get('TILE_OVERLAP', 0.2))
+TILE_NMS_OVERLAP = float(os.environ.get('TILE_NMS_OVERLAP', 0.5))
+TILE_WORKERS = int(os.environ.get('TILE_WORKERS', os.cpu_count() or 1))
+
+
+def parse_layouts(text):
+    """{camera id: {'cols', 'rows', 'overlap', 'scale'}} from TILE_LAYOUTS JSON, defaults filled in"""
+    if not text:
+        return {}
+    try:
+        layouts = {}
+        for camera_id, layout in json.loads(text).items():
+            layouts[str(camera_id)] = {
+                'cols': max(int(layout.get('cols', 2)), 1),
+                'rows': max(int(layout.get('rows', 2)), 1),
+                'overlap': min(max(float(layout.get('overlap', TILE_OVERLAP)), 0.0), 0.5),
+                'scale': float(layout.get('scale', TILE_SCALE)),
+            }
+        return layouts
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"Ignoring TILE_LAYOUTS, expected JSON of camera id -> layout: {e}")
+        return {}
+
+
+TILE_LAYOUTS = parse_layouts(os.environ.get('TILE_LAYOUTS', ''))
+
+
+def tile_layout(camera_id, layouts=None):
+    """The camera's tile layout, or None to detect on the whole frame"""
+    layouts = TILE_LAYOUTS if layouts is None else layouts
+    return layouts.get(str(camera_id)) or layouts.get('*')
+
+
+def _spans(length, count, overlap):
+    if count == 1:
+        return [(0, length)]
+    size = min(int(np.ceil(length / (count - overlap * (count - 1)))), length)
+    step = (length - size) / (count - 1)
+    return [(int(round(i * step)), int(round(i * step)) + size) for i in range(count)]
+
+
+def tile_boxes(height, width, cols, rows, overlap):
+    """(top, left, bottom, right) of cols x rows tiles covering the frame, neighbours sharing `overlap` of a tile"""
+    return [(top, left, bottom, right)
+            for top, bottom in _spans(height, rows, overlap)
+            for left, right in _spans(width, cols, overlap)]
+
+
+def border_margin(location, tile, height, width):
+    """Distance from a detection to the nearest tile border that is not also a frame border"""
+    top, right, bottom, left = location
+    tile_top, tile_left, tile_bottom, tile_right = tile
+    margins = [np.inf]
+    if tile_top > 0:
+        margins.append(top - tile_top)
+    if tile_left > 0:
+        margins.append(left - tile_left)
+    if tile_bottom < height:
+        margins.append(tile_bottom - bottom)
+    if tile_right < width:
+        margins.append(tile_right - right)
+    return min(margins)
+
+
+def suppress(locations, scores, max_overlap=TILE_NMS_OVERLAP):
+    """Indices of the locations to keep, best score first; overlap is intersection over the smaller box"""
+    if not locations:
+        return []
+    boxes = np.array(locations, dtype=np.float64)  # top, right, bottom, left
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 1] - boxes[:, 3])
+    keep = []
+    for i in np.argsort(-np.asarray(scores, dtype=np.float64), kind='stable'):
+        if keep:
+            kept = boxes[keep]
+            height = np.minimum(kept[:, 2], boxes[i, 2]) - np.maximum(kept[:, 0], boxes[i, 0])
+            width = np.minimum(kept[:, 1], boxes[i, 1]) - np.maximum(kept[:, 3], boxes[i, 3])
+            intersection = np.maximum(height, 0) * np.maximum(width, 0)
+            smaller = np.maximum(np.minimum(areas[keep], areas[i]), 1)
+            if np.any(intersection / smaller > max_overlap):
+                continue
+        keep.append(int(i))
+    return keep
+
+
+def _init_worker():
+    global face_recognition
+    import face_recognition
+
+
+def _detect_tile(tile_image, upsample, model):
+    return face_recognition.face_locations(tile_image, number_of_times_to_upsample=upsample, model=model)
+
+
+class TiledDetector:
+    """Tiles an RGB frame, detects on the tiles in a process pool and merges the detections"""
+
+    def __init__(self, workers=TILE_WORKERS, max_overlap=TILE_NMS_OVERLAP):
+        self.workers = workers
+        self.max_overlap = max_overlap
+        self._pool = None
+        self._lock = threading.Lock()
+        self.stats = {'frames': 0, 'tiles': 0, 'detections': 0, 'faces': 0, 'seconds': 0.0}
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawned rather than forked: the server process is running other threads
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+            return self._pool
+
+    def locate(self, rgb_frame, layout, upsample=1, model='hog'):
+        """face_locations() for the whole frame, found tile by tile"""
+        started = time.perf_counter()
+        height, width = rgb_frame.shape[:2]
+        tiles = tile_boxes(height, width, layout['cols'], layout['rows'], layout['overlap'])
+
+        if len(tiles) == 1 or self.workers <= 1:
+            _init_worker()
+            found = [_detect_tile(rgb_frame[top:bottom, left:right], upsample, model)
+                     for top, left, bottom, right in tiles]
+        else:
+            pool = self._executor()
+            found = [future.result() for future in [
+                pool.submit(_detect_tile, np.ascontiguousarray(rgb_frame[top:bottom, left:right]), upsample, model)
+                for top, left, bottom, right in tiles]]
+
+        locations, scores = [], []
+        for tile, tile_locations in zip(tiles, found):
+            top_offset, left_offset = tile[0], tile[1]
+            for top, right, bottom, left in tile_locations:
+                location = (top + top_offset, right + left_offset, bottom + top_offset, left + left_offset)
+                locations.append(location)
+                scores.append(border_margin(location, tile, height, width))
+        merged = [locations[i] for i in suppress(locations, scores, self.max_overlap)]
+
+        with self._lock:
+            self.stats['frames'] += 1
+            self.stats['tiles'] += len(tiles)
+            self.stats['detections'] += len(locations)
+            self.stats['faces'] += len(merged)
+            self.stats['seconds'] += time.perf_counter() - started
+        return merged
+
+    def summary(self):
+        with self._lock:
+            frames = self.stats['frames']
+            return {
+                'workers': self.workers,
+                'frames': frames,
+                'avg_tiles_per_frame': round(self.stats['tiles'] / frames, 2) if frames else None,
+                'duplicates_merged': self.stats['detections'] - self.stats['faces'],
+                'avg_faces_per_frame': round(self.stats['faces'] / frames, 2) if frames else None,
+                'avg_detection_ms': round(1000 * self.stats['seconds'] / frames, 1) if frames else None,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -34,6 +34,7 @@ CREATE TABLE IF NOT EXISTS class_sessions (
     start_time DATETIME NOT NULL,
     end_time DATETIME NOT NULL,
     duration_minutes INT,
+    recognition_mode VARCHAR(20) DEFAULT 'identity',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -53,7 +54,7 @@ CREATE TABLE IF NOT EXISTS attendance_records (
     UNIQUE KEY unique_attendance (student_id, session_id)
 );
 
--- Student movement tracking (entry/exit during class)
+-- Student movement tracking (entry/exit during class); legacy, compacted into presence_intervals
 CREATE TABLE IF NOT EXISTS movement_logs (
     id INT AUTO_INCREMENT PRIMARY KEY,
     student_id INT,
@@ -64,6 +65,68 @@ CREATE TABLE IF NOT EXISTS movement_logs (
     FOREIGN KEY (session_id) REFERENCES class_sessions(id) ON DELETE CASCADE
 );
 
+-- Merged presence intervals (one row per continuous stay; end_time NULL while inside)
+CREATE TABLE IF NOT EXISTS presence_intervals (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT,
+    session_id INT,
+    start_time DATETIME NOT NULL,
+    end_time DATETIME NULL,
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (session_id) REFERENCES class_sessions(id) ON DELETE CASCADE,
+    INDEX idx_intervals_session_student (session_id, student_id, start_time)
+);
+
+-- Raw entry/exit events, only written when MOVEMENT_ARCHIVE_RAW=1
+CREATE TABLE IF NOT EXISTS movement_logs_archive (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT,
+    session_id INT,
+    movement_type ENUM('entry', 'exit') NOT NULL,
+    timestamp DATETIME NOT NULL,
+    INDEX idx_archive_session (session_id)
+);
+
+-- Per-student presence bitmaps, one bit per time slot of a session
+CREATE TABLE IF NOT EXISTS presence_timelines (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    session_id INT,
+    student_id INT,
+    slot_seconds INT NOT NULL,
+    slot_count INT NOT NULL,
+    bitmap BLOB NOT NULL,
+    slots_present INT DEFAULT 0,
+    first_slot INT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (session_id) REFERENCES class_sessions(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_timeline (session_id, student_id)
+);
+
+-- Polygons (frame fractions) faces are detected in, per classroom and optionally per camera
+CREATE TABLE IF NOT EXISTS camera_regions (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    classroom VARCHAR(50) NOT NULL DEFAULT '',
+    camera_id VARCHAR(100) NOT NULL DEFAULT '',
+    polygons TEXT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_region (classroom, camera_id)
+);
+
+-- Per-minute face counts per camera for headcount sessions (uint16 per slot)
+CREATE TABLE IF NOT EXISTS session_occupancy (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    session_id INT,
+    camera_id VARCHAR(100) NOT NULL,
+    slot_seconds INT NOT NULL,
+    slot_count INT NOT NULL,
+    counts BLOB NOT NULL,
+    peak INT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES class_sessions(id) ON DELETE CASCADE,
+    UNIQUE KEY unique_occupancy (session_id, camera_id)
+);
+
 -- Monthly attendance summary
 CREATE TABLE IF NOT EXISTS monthly_attendance (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -107,6 +170,7 @@ CREATE TABLE IF NOT EXISTS attendance_alerts (
 -- Create indexes for better performance
 CREATE INDEX idx_attendance_student ON attendance_records(student_id);
 CREATE INDEX idx_attendance_session ON attendance_records(session_id);
+CREATE INDEX idx_sessions_schedule ON class_sessions(start_time, end_time);
 CREATE INDEX idx_movement_student ON movement_logs(student_id);
 CREATE INDEX idx_movement_session ON movement_logs(session_id);
 CREATE INDEX idx_monthly_student ON monthly_attendance(student_id);